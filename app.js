@@ -5,14 +5,49 @@ const AuthManager = {
         return user ? JSON.parse(user) : null;
     },
 
-    login(email, password) {
-        const user = { email, name: email.split('@')[0], loginTime: Date.now() };
-        localStorage.setItem('user', JSON.stringify(user));
+    // Access token from the backend's login/signup; null when logged in locally
+    getToken() {
+        return localStorage.getItem('token');
+    },
+
+    authHeaders() {
+        const token = this.getToken();
+        return token ? { 'Authorization': `Bearer ${token}` } : {};
+    },
+
+    // POST credentials to the backend; keeps the returned user and token.
+    // Returns false (after a toast) when the backend rejects them.
+    async authenticate(path, body) {
+        const response = await fetch(`${API_BASE_URL}/auth/${path}`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(body)
+        });
+        const data = await response.json();
+        if (!response.ok || !data.token) {
+            showToast(data.error || 'Authentication failed', 'error');
+            return false;
+        }
+
+        localStorage.setItem('user', JSON.stringify(data.user));
+        localStorage.setItem('token', data.token);
+        return true;
+    },
+
+    async login(email, password) {
+        try {
+            if (!await this.authenticate('login', { email, password })) return false;
+        } catch (error) {
+            console.log('Backend not available, logging in locally');
+            const user = { email, name: email.split('@')[0], loginTime: Date.now() };
+            localStorage.setItem('user', JSON.stringify(user));
+            localStorage.removeItem('token');
+        }
         this.updateUI();
         return true;
     },
 
-    signup(name, email, password) {
+    async signup(name, email, password) {
         // Validate password strength
         const validation = this.validatePasswordStrength(password);
         if (!validation.isValid) {
@@ -20,8 +55,14 @@ const AuthManager = {
             return false;
         }
 
-        const user = { name, email, signupTime: Date.now() };
-        localStorage.setItem('user', JSON.stringify(user));
+        try {
+            if (!await this.authenticate('signup', { name, email, password })) return false;
+        } catch (error) {
+            console.log('Backend not available, signing up locally');
+            const user = { name, email, signupTime: Date.now() };
+            localStorage.setItem('user', JSON.stringify(user));
+            localStorage.removeItem('token');
+        }
         this.updateUI();
         return true;
     },
@@ -52,7 +93,15 @@ const AuthManager = {
     },
 
     logout() {
+        // Revoke the token on the backend; the local session ends either way
+        if (this.getToken()) {
+            fetch(`${API_BASE_URL}/auth/logout`, {
+                method: 'POST',
+                headers: this.authHeaders()
+            }).catch(() => console.log('Backend not available for logout'));
+        }
         localStorage.removeItem('user');
+        localStorage.removeItem('token');
         this.updateUI();
     },
 
@@ -94,8 +143,13 @@ const HistoryManager = {
         if (!user) return [];
         
         try {
-            // Try to get from backend first
-            const response = await fetch(`${API_BASE_URL}/history`);
+            // Try to get from backend first (needs the login's access token)
+            if (!AuthManager.getToken()) {
+                throw new Error('Not logged in to the backend');
+            }
+            const response = await fetch(`${API_BASE_URL}/history/${user.user_id}`, {
+                headers: AuthManager.authHeaders()
+            });
             const data = await response.json();
             
             if (data.success) {
@@ -127,7 +181,8 @@ const HistoryManager = {
                 for (const item of history) {
                     if (item.document_id) {
                         await fetch(`${API_BASE_URL}/history/${item.document_id}`, {
-                            method: 'DELETE'
+                            method: 'DELETE',
+                            headers: AuthManager.authHeaders()
                         });
                     }
                 }
@@ -285,7 +340,7 @@ function goToPage(pageName) {
 }
 
 // Authentication Forms
-function handleLogin(event) {
+async function handleLogin(event) {
     event.preventDefault();
     const email = document.getElementById('loginEmail').value;
     const password = document.getElementById('loginPassword').value;
@@ -302,7 +357,7 @@ function handleLogin(event) {
         return;
     }
 
-    if (AuthManager.login(email, password)) {
+    if (await AuthManager.login(email, password)) {
         showToast('Login successful!', 'success');
         document.getElementById('loginEmail').value = '';
         document.getElementById('loginPassword').value = '';
@@ -356,7 +411,7 @@ function resetLoginPasswordRequirements() {
     document.getElementById('login-req-special').className = '';
 }
 
-function handleSignup(event) {
+async function handleSignup(event) {
     event.preventDefault();
     const name = document.getElementById('signupName').value;
     const email = document.getElementById('signupEmail').value;
@@ -375,7 +430,7 @@ function handleSignup(event) {
         return;
     }
 
-    if (AuthManager.signup(name, email, password)) {
+    if (await AuthManager.signup(name, email, password)) {
         showToast('Account created successfully!', 'success');
         document.getElementById('signupName').value = '';
         document.getElementById('signupEmail').value = '';
@@ -515,6 +570,7 @@ async function processImage() {
 
             const response = await fetch(`${API_BASE_URL}/ocr`, {
                 method: 'POST',
+                headers: AuthManager.authHeaders(),
                 body: formData
             });
 
@@ -546,6 +602,7 @@ async function processImage() {
                 
                 const response = await fetch(`${API_BASE_URL}/ocr`, {
                     method: 'POST',
+                    headers: AuthManager.authHeaders(),
                     body: formData
                 });
                 
@@ -681,7 +738,6 @@ async function toggleHistory() {
     }
 }
 
-<<<<<<< HEAD
 // Login Modal Functions
 function showLoginModal() {
     const modal = document.getElementById('loginModal');
@@ -707,8 +763,6 @@ function escapeHtml(text) {
     return div.innerHTML;
 }
 
-=======
->>>>>>> 12cecc9ca26b745370ce5db6b4f17987d5d46110
 function setActiveNav(link) {
     document.querySelectorAll('.nav-links a')
         .forEach(a => a.classList.remove('active'));
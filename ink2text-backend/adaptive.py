@@ -0,0 +1,142 @@
+"""
+Adaptive Multi-Pass OCR for Ink2Text
+Clean printed pages are read fine by one quick Tesseract pass on a small
+image; adaptive mode starts there and only escalates while the confidence
+stays below a threshold:
+
+1. fast: long side shrunk to FAST_MAX_SIDE, read as one uniform block
+2. full: full resolution (up to preprocess.MAX_SIDE), automatic segmentation
+3. regions: lines still below the threshold are cropped from the
+   full-resolution image, denoised and binarized, and re-read as single lines
+4. sparse: the whole page denoised and binarized, read as sparse text
+
+Every pass after the first runs only if the best result so far is still
+below the threshold. The passes taken are returned with the result. This
+runs inside an OCR worker process.
+"""
+
+import time
+
+import ocr_layout
+import preprocess
+
+FAST_MAX_SIDE = 1000
+FAST_CONFIG = "--psm 6 -c tessedit_do_invert=0"
+FULL_CONFIG = ""
+LINE_CONFIG = "--psm 7"
+SPARSE_CONFIG = "--psm 11"
+
+# Pixels of context kept around a line crop, and the most lines re-read per page
+REGION_PADDING = 6
+MAX_REGIONS = 40
+
+
+def _score(words):
+    value = ocr_layout.confidence(words)
+    return -1.0 if value is None else value
+
+
+def _enhance(gray):
+    return preprocess.threshold(preprocess.denoise(gray))
+
+
+def _move_boxes(words, factor=1.0, dx=0, dy=0):
+    for name in ("left", "top", "width", "height"):
+        words[name] = [int(round(value * factor)) for value in words[name]]
+    words["left"] = [value + dx for value in words["left"]]
+    words["top"] = [value + dy for value in words["top"]]
+    return words
+
+
+def _read_scaled(gray, recognize, max_side, config):
+    """OCR ``gray`` shrunk to ``max_side``; boxes come back in ``gray``'s coordinates."""
+    factor = min(1.0, max_side / max(gray.shape[:2]))
+    image = preprocess._resize(gray, factor) if factor < 1.0 else gray
+    return _move_boxes(recognize(image, config), 1.0 / factor)
+
+
+def _merge(words, replacements):
+    """Swap the words of the lines in ``replacements`` (line -> word columns)."""
+    merged = {name: [] for name in words}
+    i, count = 0, len(words["text"])
+    while i < count:
+        line = words["line"][i]
+        j = i
+        while j < count and words["line"][j] == line:
+            j += 1
+        source, start, stop = words, i, j
+        if line in replacements:
+            source = replacements[line]
+            start, stop = 0, len(source["text"])
+        for name in ("left", "top", "width", "height", "conf", "text"):
+            merged[name].extend(source[name][start:stop])
+        merged["par"].extend([words["par"][i]] * (stop - start))
+        merged["line"].extend([line] * (stop - start))
+        i = j
+    return merged
+
+
+def _read_regions(gray, words, recognize, threshold):
+    """Re-read the weakest lines one by one; returns ``(words, tried, improved)``."""
+    line_boxes = ocr_layout.lines(words)
+    line_ids = list(dict.fromkeys(words["line"]))
+    weak = sorted(
+        (conf, index) for index, conf in enumerate(line_boxes["conf"]) if conf < threshold * 100
+    )[:MAX_REGIONS]
+
+    height, width = gray.shape[:2]
+    replacements = {}
+    for conf, index in weak:
+        left = max(0, line_boxes["left"][index] - REGION_PADDING)
+        top = max(0, line_boxes["top"][index] - REGION_PADDING)
+        right = min(width, line_boxes["left"][index] + line_boxes["width"][index] + REGION_PADDING)
+        bottom = min(height, line_boxes["top"][index] + line_boxes["height"][index] + REGION_PADDING)
+        if right - left < 2 or bottom - top < 2:
+            continue
+
+        candidate = _move_boxes(recognize(_enhance(gray[top:bottom, left:right]), LINE_CONFIG), dx=left, dy=top)
+        if candidate["text"] and _score(candidate) * 100 > conf:
+            replacements[line_ids[index]] = candidate
+
+    return _merge(words, replacements), len(weak), len(replacements)
+
+
+def run(gray, recognize, threshold):
+    """Adaptive OCR of ``gray``.
+
+    ``recognize(image, config)`` runs Tesseract and returns word columns
+    (see ocr_layout.from_tsv). Returns ``(words, timings, passes)`` where
+    ``passes`` lists each pass taken with its confidence and time in ms.
+    """
+    timings, passes = {}, []
+    best = None
+
+    def attempt(name, read):
+        nonlocal best
+        start = time.perf_counter()
+        words = read()
+        elapsed = round((time.perf_counter() - start) * 1000, 2)
+        timings[f"pass_{name}"] = elapsed
+        if best is None or _score(words) > _score(best):
+            best = words
+        passes.append({"pass": name, "confidence": ocr_layout.confidence(words), "ms": elapsed})
+        return _score(best) >= threshold
+
+    if attempt("fast", lambda: _read_scaled(gray, recognize, FAST_MAX_SIDE, FAST_CONFIG)):
+        return best, timings, passes
+    if attempt("full", lambda: _read_scaled(gray, recognize, preprocess.MAX_SIDE, FULL_CONFIG)):
+        return best, timings, passes
+
+    regions = {}
+
+    def read_regions():
+        words, regions["tried"], regions["improved"] = _read_regions(gray, best, recognize, threshold)
+        return words
+
+    done = attempt("regions", read_regions)
+    passes[-1].update(regions)
+    if done:
+        return best, timings, passes
+
+    attempt("sparse", lambda: recognize(_enhance(gray), SPARSE_CONFIG))
+    return best, timings, passes
@@ -1,23 +1,46 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from config import Config
-from extensions import db
-import pytesseract
-import cv2
-import numpy as np
-from PIL import Image, UnidentifiedImageError
+from extensions import db, ocr_pool, ocr_cache, blob_store, rate_limiter, job_queue, write_buffer, text_codec, readiness, token_auth
+from ocr_pool import PoolBusyError, OCRTimeoutError
+from jobs import CallbackURLError, JobQueueFullError, public_job
+import ocr_service
+import ocr_layout
+import ingest
+import preprocess
+import schema
+import search
+import httpcache
+import export
+import retention
+import reprocess
+import metrics
+import lazy
+import time
+from contextlib import closing
+from ocr_service import InvalidImageError
+from ocr_cache import image_hash
+from textcodec import prefix_bytes
+from persistence import touch_history
+from pagination import InvalidCursorError, encode_cursor, decode_cursor, parse_limit
+from readiness import HEAVY_MODULES
+from auth import admin_required, authenticated, user_scoped
+import click
+import json
 import os
+import shutil
+from datetime import datetime
 import sys
 
 # Tesseract Configuration
 # For Windows: Update this path to your Tesseract installation
 # Default Windows path: C:\Program Files\Tesseract-OCR\tesseract.exe
 # For Linux/Mac: Usually auto-detected, no need to set
-if sys.platform == "win32":
-    # Change this to your actual Tesseract installation path
+if sys.platform == "win32" and not Config.TESSERACT_CMD:
+    # Change this to your actual Tesseract installation path (or set TESSERACT_CMD)
     tesseract_path = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
     if os.path.exists(tesseract_path):
-        pytesseract.pytesseract.tesseract_cmd = tesseract_path
+        Config.TESSERACT_CMD = tesseract_path
     else:
         print("⚠️  WARNING: Tesseract not found at:", tesseract_path)
         print("Please install Tesseract OCR or update the path in app.py")
@@ -32,34 +55,114 @@ def create_app():
         r"/api/*": {
             "origins": "*",
             "methods": ["GET", "POST", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type"]
+            "allow_headers": ["Content-Type", "Authorization"]
         }
     })
     
     db.init_app(app)
-
-    from models import User, Document, OCRText
-
-    with app.app_context():
-        try:
-            # Test database connection
-            db.engine.connect()
-            print("✅ Database connected successfully!")
-            
-            # Create tables
-            db.create_all()
-            print("✅ Database tables created!")
-            print("   - users")
-            print("   - documents")
-            print("   - ocr_text")
-        except Exception as e:
-            print("❌ Database connection failed!")
-            print(f"Error: {e}")
-            print("\nPlease check:")
-            print("1. PostgreSQL is running")
-            print("2. Database 'ink2text_db' exists")
-            print("3. Username and password are correct")
-            print("4. Connection string in config.py is correct")
+    text_codec.init_app(app)
+    ingest.init_app(app)
+    ocr_pool.init_app(app)
+    ocr_cache.init_app(app)
+    blob_store.init_app(app)
+    rate_limiter.init_app(app)
+    httpcache.init_app(app)
+    write_buffer.init_app(app)
+    metrics.init_app(app, ocr_pool, ocr_cache, job_queue)
+    job_queue.init_app(app, handler=ocr_service.process_job)
+    readiness.init_app(app)
+    token_auth.init_app(app)
+
+    from models import User, Document, OCRText, OCRLayout
+
+    def init_db():
+        db.create_all()
+        print("✅ Database tables created!")
+        print("   - users")
+        print("   - documents")
+        print("   - ocr_text")
+        print("   - ocr_layout")
+        schema.upgrade(db.engine)
+
+        search.setup(db.engine)
+        print("✅ Full-text search index ready!")
+
+    @app.cli.command("init-db")
+    def init_db_command():
+        """Create missing tables, columns and the search index."""
+        init_db()
+
+    @app.cli.command("rebuild-search")
+    def rebuild_search_command():
+        """Reindex all OCR text (SQLite), e.g. after editing ocr_text by hand."""
+        if db.engine.dialect.name != "sqlite":
+            raise click.ClickException("Only the SQLite index is kept by the application")
+        with db.engine.begin() as conn:
+            search.rebuild(conn)
+        print("✅ Full-text search index rebuilt!")
+
+    # With LAZY_INIT the database and the OCR stack are left alone until
+    # the warm-up (readiness.py); the schema comes from `flask init-db`
+    if not app.config.get("LAZY_INIT"):
+        with app.app_context():
+            try:
+                # Test database connection (and hand it straight back to the pool)
+                with db.engine.connect() as conn:
+                    conn.execute(db.text("SELECT 1"))
+                print("✅ Database connected successfully!")
+
+                init_db()
+            except Exception as e:
+                print("❌ Database connection failed!")
+                print(f"Error: {e}")
+                print("\nPlease check:")
+                print("1. PostgreSQL is running")
+                print("2. Database 'ink2text_db' exists")
+                print("3. Username and password are correct")
+                print("4. Connection string in config.py is correct")
+        lazy.load(*HEAVY_MODULES)
+
+    # Periodic retention purge (disabled unless RETENTION_DAYS is set)
+    scheduler = retention.RetentionScheduler(app)
+    scheduler.start()
+    app.extensions["retention"] = scheduler
+
+    @app.cli.command("purge-history")
+    @click.option("--days", type=int, default=lambda: app.config.get("RETENTION_DAYS") or None,
+                  help="Delete documents older than this many days")
+    @click.option("--chunk-size", type=int, default=lambda: app.config.get("RETENTION_CHUNK_SIZE", 500))
+    def purge_history_command(days, chunk_size):
+        """Delete old history in small transactions."""
+        if not days:
+            raise click.UsageError("Pass --days or set RETENTION_DAYS")
+        deleted = retention.purge_expired(days, chunk_size)
+        print(f"🧹 Removed {deleted} documents older than {days} days")
+
+    # flask reprocess start|resume|pause|status|swap|revert
+    reprocess.init_app(app)
+
+    @app.cli.command("gc-blobs")
+    @click.option("--grace", type=int, default=lambda: app.config.get("BLOB_GC_GRACE", 3600),
+                  help="Keep unreferenced blobs younger than this many seconds")
+    def gc_blobs_command(grace):
+        """Delete stored originals and thumbnails of deleted documents."""
+        removed = retention.collect_blobs(grace)
+        print(f"🧹 Removed {removed} unreferenced blobs")
+
+    def limit_rate(cost=1):
+        """Charge this request to its token's user, or to the client address
+        without a token (never to a user_id the client sent); 429 when exhausted."""
+        claims = token_auth.claims()
+        rate_limiter.hit(rate_limiter.key(claims and claims["uid"], request.remote_addr), cost, request.endpoint)
+
+    def ocr_settings():
+        """Preprocessing stages and OCR mode for this request."""
+        stages = preprocess.parse(request.form.get('preprocess') or app.config.get('OCR_PREPROCESS'))
+        mode = ocr_service.parse_mode(request.form.get('mode') or app.config.get('OCR_MODE'))
+        return stages, mode
+
+    def thumbnail_url(row):
+        return f"/api/history/{row.document_id}/thumbnail" if row.thumbnail_blob else None
 
     # ---------------- HOME ----------------
     @app.route("/")
@@ -93,7 +196,8 @@ def create_app():
             return jsonify({
                 "success": True,
                 "message": "User registered successfully",
-                "user": user.to_dict()
+                "user": user.to_dict(),
+                **token_auth.issue(user)
             }), 201
 
         except Exception as e:
@@ -120,22 +224,56 @@ def create_app():
             return jsonify({
                 "success": True,
                 "message": "Login successful",
-                "user": user.to_dict()
+                "user": user.to_dict(),
+                **token_auth.issue(user)
             })
 
         except Exception as e:
             return jsonify({"error": f"Login failed: {str(e)}"}), 500
 
+    # ---------------- LOGOUT ----------------
+    @app.route("/api/auth/logout", methods=["POST"])
+    def logout():
+        claims = token_auth.claims()
+        if claims is None:
+            return jsonify({"error": "No access token provided"}), 400
+
+        try:
+            token_auth.revoke(claims)
+            db.session.commit()
+            return jsonify({"success": True, "message": "Logged out"})
+
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({"error": f"Logout failed: {str(e)}"}), 500
+
+    # ---------------- CURRENT USER ----------------
+    @app.route("/api/auth/me", methods=["GET"])
+    def current_user():
+        claims = token_auth.claims()
+        if claims is None:
+            return jsonify({"error": "No access token provided"}), 401
+
+        user = dict(token_auth.user(claims["uid"]))
+        del user["tokens_valid_after"]
+        return jsonify({"success": True, "user": user})
+
     # ---------------- OCR ----------------
     @app.route("/api/ocr", methods=["POST"])
     def ocr_image():
-        if 'image' not in request.files:
+        started = time.perf_counter()
+        timings = {}
+        # The body is received, sniffed and spooled while the form is parsed
+        # (see ingest.py): the first access to the files reads the upload
+        with metrics.stage("upload_read", timings):
+            files = request.files
+        if 'image' not in files:
             return jsonify({"error": "No image file provided"}), 400
         
-        # Get user_id from request (optional for guest users)
-        user_id = request.form.get('user_id')
+        # The token's user; requests without a token and user_id are guests
+        user_id = token_auth.authorize(request.form.get('user_id'), guest_ok=True)
         
-        # If no user_id, this is a guest conversion - don't save to database
+        # No user, this is a guest conversion - don't save to database
         if not user_id:
             return jsonify({
                 "success": True,
@@ -143,73 +281,387 @@ def create_app():
                 "text": "Guest mode - text not saved to database"
             })
             
-        file = request.files.get("image")
+        file = files.get("image")
 
         if not file or file.filename == "":
             return jsonify({"error": "No image uploaded"}), 400
+
+        limit_rate()
         
         # Validate file extension
         allowed_extensions = app.config.get('ALLOWED_EXTENSIONS', {'png', 'jpg', 'jpeg', 'gif', 'webp'})
-        file_ext = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
-        if file_ext not in allowed_extensions:
+        if not ocr_service.allowed_file(file.filename, allowed_extensions):
             return jsonify({"error": f"Invalid file type. Allowed: {', '.join(allowed_extensions)}"}), 400
-        
+
         try:
-            # Validate image
-            image = Image.open(file.stream)
-            image.verify()
-            file.stream.seek(0)
-            image = Image.open(file.stream).convert("RGB")
-        except UnidentifiedImageError:
-            return jsonify({"error": "Invalid image file"}), 400
-        except Exception as e:
-            return jsonify({"error": f"Error processing image: {str(e)}"}), 400
+            stages, mode = ocr_settings()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
+        # The body was already sniffed and size-checked while it was received
+        # (see ingest.py); decode straight from the spooled upload
         try:
-            # Convert to numpy array for OpenCV
-            img = np.array(image)
-            gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+            with ingest.upload_buffer(file) as data:
+                with metrics.stage("decode", timings):
+                    upload_bytes = len(data)
+                    gray = ocr_service.decode_image(data)
+                with metrics.stage("store", timings):
+                    blobs = ocr_service.store_images(gray, data)
+        except InvalidImageError as e:
+            return jsonify({"error": str(e)}), 400
+        metrics.record_image(upload_bytes, gray)
 
-            # Extract text using Tesseract
-            extracted_text = pytesseract.image_to_string(gray)
+        try:
+            with metrics.stage("hash", timings):
+                digest = image_hash(gray)
+
+            # Same user uploading the same image again: reuse the stored document
+            if app.config.get('OCR_CACHE_DEDUP'):
+                duplicate = ocr_service.find_duplicate(user_id, digest)
+                if duplicate and duplicate.ocr_texts:
+                    return jsonify({
+                        "success": True,
+                        "message": "Identical image already processed",
+                        "document_id": duplicate.document_id,
+                        "text": duplicate.ocr_texts[0].text,
+                        "confidence": duplicate.ocr_texts[0].confidence_score,
+                        "cached": True,
+                        "duplicate": True
+                    })
+
+            result, cached, ocr_timings = ocr_service.run_ocr(gray, digest, stages, mode, owner=user_id)
+            timings.update(ocr_timings)
 
             # Save to database with user_id
-            document = Document(user_id=user_id, file_name=file.filename)
-            db.session.add(document)
-            db.session.commit()
+            with metrics.stage("db_write", timings):
+                document_id = ocr_service.save_result(user_id, file.filename, result, digest, blobs)
 
-            ocr_entry = OCRText(
-                document_id=document.document_id,
-                extracted_text=extracted_text,
-                confidence_score=0.90
+            timings["total"] = round((time.perf_counter() - started) * 1000, 2)
+            metrics.log_timings(
+                "ocr", timings, document_id=document_id, user_id=user_id, cached=cached,
+                megapixels=round(gray.size / 1e6, 2), upload_bytes=upload_bytes
             )
-            db.session.add(ocr_entry)
-            db.session.commit()
-
-            print(f"✅ Saved to database: Document ID {document.document_id}, User ID {user_id}")
+            print(f"✅ Saved to database: Document ID {document_id}, User ID {user_id}")
 
             return jsonify({
                 "success": True,
                 "message": "OCR processed successfully",
-                "document_id": document.document_id,
-                "text": extracted_text
+                "document_id": document_id,
+                "text": result.text,
+                "confidence": result.confidence,
+                "cached": cached,
+                "preprocess": stages,
+                "mode": mode,
+                "passes": result.passes,
+                "timings": timings
             })
+
+        except PoolBusyError as e:
+            return jsonify({"error": str(e)}), 503
+
+        except OCRTimeoutError as e:
+            return jsonify({"error": str(e)}), 504
         
         except Exception as e:
             db.session.rollback()
             print(f"❌ Database error: {str(e)}")
             return jsonify({"error": f"OCR processing failed: {str(e)}"}), 500
 
+    # ---------------- OCR BATCH ----------------
+    @app.route("/api/ocr/batch", methods=["POST"])
+    def ocr_batch():
+        files = [f for f in request.files.getlist("images") if f and f.filename]
+        if not files:
+            return jsonify({"error": "No image files provided"}), 400
+
+        user_id = token_auth.authorize(request.form.get('user_id'))
+
+        limit_rate(cost=len(files))
+
+        allowed_extensions = app.config.get('ALLOWED_EXTENSIONS', {'png', 'jpg', 'jpeg', 'gif', 'webp'})
+        batch_extensions = allowed_extensions | app.config.get('BATCH_EXTENSIONS', set())
+        for file in files:
+            if not ocr_service.allowed_file(file.filename, batch_extensions):
+                return jsonify({"error": f"Invalid file type: {file.filename}. Allowed: {', '.join(sorted(batch_extensions))}"}), 400
+
+        try:
+            stages, mode = ocr_settings()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        max_pages = app.config.get('BATCH_MAX_PAGES', 100)
+        max_page_bytes = app.config.get('BATCH_MAX_PAGE_BYTES', app.config.get('MAX_CONTENT_LENGTH'))
+        blobs = {}
+
+        def stored(index, load, original):
+            # Thumbnail from the decoded page while we have it; archive
+            # pages have no single original file to keep
+            def load_and_store():
+                gray = load()
+                blobs[index] = ocr_service.store_images(gray, original)
+                return gray
+            return load_and_store
+
+        def pages():
+            # Each upload is read from its spool (see ingest.py) only when
+            # its pages are reached; pages are decoded as they are pulled
+            count = 0
+            for file in files:
+                with ingest.upload_buffer(file) as data, closing(ocr_service.iter_pages(
+                    file.filename, data, allowed_extensions, max_pages, max_page_bytes
+                )) as file_pages:
+                    original = data if ocr_service.allowed_file(file.filename, allowed_extensions) else None
+                    for page_name, load in file_pages:
+                        count += 1
+                        if count > max_pages:
+                            raise InvalidImageError(f"Too many pages, the limit is {max_pages}")
+                        yield page_name, stored(count - 1, load, original)
+
+        def generate():
+            results = {}
+            failed = 0
+            try:
+                for index, page_name, digest, result, error in ocr_service.ocr_pages(
+                    pages(), ocr_pool.workers * 2, stages, mode, owner=user_id
+                ):
+                    if error:
+                        failed += 1
+                        yield json.dumps({"page": index + 1, "file_name": page_name, "error": error}) + "\n"
+                    else:
+                        results[index] = (page_name, result, digest, blobs.get(index))
+                        yield json.dumps({
+                            "page": index + 1,
+                            "file_name": page_name,
+                            "text": result.text,
+                            "confidence": result.confidence,
+                            "passes": result.passes
+                        }) + "\n"
+            except InvalidImageError as e:
+                yield json.dumps({"done": True, "success": False, "error": str(e)}) + "\n"
+                return
+
+            try:
+                document_ids = ocr_service.save_results(user_id, [results[i] for i in sorted(results)])
+            except Exception as e:
+                db.session.rollback()
+                yield json.dumps({"done": True, "success": False, "error": f"Failed to save results: {str(e)}"}) + "\n"
+                return
+
+            print(f"✅ Saved batch to database: {len(document_ids)} documents, User ID {user_id}")
+            yield json.dumps({
+                "done": True,
+                "success": True,
+                "pages": len(results) + failed,
+                "failed": failed,
+                "document_ids": document_ids
+            }) + "\n"
+
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+    # ---------------- OCR JOBS (Async) ----------------
+    @app.route("/api/ocr/jobs", methods=["POST"])
+    def submit_ocr_job():
+        if 'image' not in request.files:
+            return jsonify({"error": "No image file provided"}), 400
+
+        user_id = token_auth.authorize(request.form.get('user_id'))
+
+        limit_rate()
+
+        file = request.files.get("image")
+        if not file or file.filename == "":
+            return jsonify({"error": "No image uploaded"}), 400
+
+        allowed_extensions = app.config.get('ALLOWED_EXTENSIONS', {'png', 'jpg', 'jpeg', 'gif', 'webp'})
+        if not ocr_service.allowed_file(file.filename, allowed_extensions):
+            return jsonify({"error": f"Invalid file type. Allowed: {', '.join(allowed_extensions)}"}), 400
+
+        callback_url = request.form.get('callback_url')
+        if callback_url:
+            try:
+                job_queue.check_callback(callback_url)
+            except CallbackURLError as e:
+                return jsonify({"error": str(e)}), 400
+
+        try:
+            stages, mode = ocr_settings()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # Empty parts get past the upload checks (ingest.py) to be turned away here
+        data = file.read()
+        if not data:
+            return jsonify({"error": "No image uploaded"}), 400
+
+        try:
+            job = job_queue.submit(
+                {
+                    "user_id": user_id,
+                    "file_name": file.filename,
+                    "preprocess": stages,
+                    "mode": mode,
+                    "data": data
+                },
+                callback_url=callback_url,
+                owner=user_id
+            )
+        except JobQueueFullError as e:
+            return jsonify({"error": str(e)}), 503
+
+        return jsonify({
+            "success": True,
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "status_url": f"/api/ocr/jobs/{job['job_id']}",
+            "result_url": f"/api/ocr/jobs/{job['job_id']}/result"
+        }), 202
+
+    @app.route("/api/ocr/jobs/<job_id>", methods=["GET"])
+    @authenticated
+    def get_ocr_job(job_id):
+        job = job_queue.get(job_id)
+        if not job or not token_auth.owns(job.get("user_id")):
+            return jsonify({"error": "Job not found"}), 404
+
+        job = public_job(job)
+        job.pop("result")
+        return jsonify({"success": True, "job": job})
+
+    @app.route("/api/ocr/jobs/<job_id>/result", methods=["GET"])
+    @authenticated
+    def get_ocr_job_result(job_id):
+        job = job_queue.get(job_id)
+        if not job or not token_auth.owns(job.get("user_id")):
+            return jsonify({"error": "Job not found"}), 404
+
+        if job["status"] == "failed":
+            return jsonify({"error": f"OCR processing failed: {job['error']}", "status": "failed"}), 500
+
+        if job["status"] != "done":
+            return jsonify({"success": True, "status": job["status"]}), 202
+
+        return jsonify({
+            "success": True,
+            "status": "done",
+            "message": "OCR processed successfully",
+            "document_id": job["result"]["document_id"],
+            "text": job["result"]["text"],
+            "confidence": job["result"].get("confidence"),
+            "passes": job["result"].get("passes")
+        })
+
+    # ---------------- OCR CACHE STATS ----------------
+    @app.route("/api/ocr/cache", methods=["GET"])
+    def ocr_cache_stats():
+        return jsonify({"success": True, "cache": ocr_cache.stats()})
+
     # ---------------- HISTORY (User-specific) ----------------
     @app.route("/api/history/<int:user_id>", methods=["GET"])
+    @user_scoped
+    @httpcache.history_cached
     def get_user_history(user_id):
+        # Without paging parameters, keep returning the full list for older clients
+        if not any(key in request.args for key in ("limit", "cursor", "view")):
+            return get_full_history(user_id)
+
+        view = request.args.get("view", "full")
+        if view not in ("full", "summary"):
+            return jsonify({"error": "view must be 'full' or 'summary'"}), 400
+
+        try:
+            limit = parse_limit(
+                request.args.get("limit"),
+                app.config.get("HISTORY_PAGE_SIZE", 50),
+                app.config.get("HISTORY_MAX_PAGE_SIZE", 200)
+            )
+            cursor = request.args.get("cursor")
+            position = decode_cursor(cursor) if cursor else None
+        except (ValueError, InvalidCursorError) as e:
+            return jsonify({"error": str(e)}), 400
+
+        try:
+            snippet_length = app.config.get("HISTORY_SNIPPET_LENGTH", 120)
+            snippet_bytes = prefix_bytes(snippet_length)
+            if view == "summary":
+                # Only the start of the text leaves the database: the first
+                # characters of plain text, the first bytes of compressed text
+                text_columns = (
+                    db.func.substr(OCRText.extracted_text, 1, snippet_length).label("extracted_text"),
+                    db.func.substr(OCRText.text_data, 1, snippet_bytes, type_=db.LargeBinary).label("text_data")
+                )
+            else:
+                text_columns = (OCRText.extracted_text, OCRText.text_data)
+
+            query = (
+                db.session.query(
+                    Document.document_id,
+                    Document.file_name,
+                    Document.uploaded_at,
+                    Document.thumbnail_blob,
+                    *text_columns
+                )
+                .join(OCRText, Document.document_id == OCRText.document_id)
+                .filter(Document.user_id == user_id)
+            )
+            if position:
+                query = query.filter(db.tuple_(Document.uploaded_at, Document.document_id) < position)
+
+            # One extra row tells us whether there is a next page
+            results = (
+                query
+                .order_by(Document.uploaded_at.desc(), Document.document_id.desc())
+                .limit(limit + 1)
+                .all()
+            )
+
+            has_more = len(results) > limit
+            results = results[:limit]
+
+            if view == "summary":
+                texts = [text_codec.decode(row.extracted_text, row.text_data, snippet_length) for row in results]
+                # Compressed text whose snippet needs more than the bytes read
+                # (zstd decodes whole blocks only) is read in full
+                cut = {
+                    row.document_id: i for i, (row, snippet) in enumerate(zip(results, texts))
+                    if row.text_data is not None and len(row.text_data) == snippet_bytes
+                    and len(snippet) < snippet_length
+                }
+                if cut:
+                    for row in db.session.query(
+                        OCRText.document_id, OCRText.extracted_text, OCRText.text_data
+                    ).filter(OCRText.document_id.in_(cut)):
+                        texts[cut[row.document_id]] = text_codec.decode(row.extracted_text, row.text_data, snippet_length)
+            else:
+                texts = [text_codec.decode(row.extracted_text, row.text_data) for row in results]
+
+            text_key = "snippet" if view == "summary" else "text"
+            history = []
+            for row, text in zip(results, texts):
+                history.append({
+                    "document_id": row.document_id,
+                    "file_name": row.file_name,
+                    "uploaded_at": row.uploaded_at.strftime("%Y-%m-%d %H:%M:%S"),
+                    "thumbnail_url": thumbnail_url(row),
+                    text_key: text
+                })
+
+            next_cursor = encode_cursor(results[-1].uploaded_at, results[-1].document_id) if has_more else None
+
+            return jsonify({"success": True, "history": history, "next_cursor": next_cursor})
+
+        except Exception as e:
+            return jsonify({"error": f"Failed to fetch history: {str(e)}"}), 500
+
+    def get_full_history(user_id):
         try:
             results = (
                 db.session.query(
                     Document.document_id,
                     Document.file_name,
                     Document.uploaded_at,
-                    OCRText.extracted_text
+                    Document.thumbnail_blob,
+                    OCRText.extracted_text,
+                    OCRText.text_data
                 )
                 .join(OCRText, Document.document_id == OCRText.document_id)
                 .filter(Document.user_id == user_id)
@@ -223,7 +675,8 @@ def create_app():
                     "document_id": row.document_id,
                     "file_name": row.file_name,
                     "uploaded_at": row.uploaded_at.strftime("%Y-%m-%d %H:%M:%S"),
-                    "text": row.extracted_text
+                    "thumbnail_url": thumbnail_url(row),
+                    "text": text_codec.decode(row.extracted_text, row.text_data)
                 })
 
             return jsonify({"success": True, "history": history})
@@ -231,15 +684,149 @@ def create_app():
         except Exception as e:
             return jsonify({"error": f"Failed to fetch history: {str(e)}"}), 500
 
+    # ---------------- HISTORY COUNT ----------------
+    @app.route("/api/history/<int:user_id>/count", methods=["GET"])
+    @user_scoped
+    @httpcache.history_cached
+    def get_history_count(user_id):
+        try:
+            count = (
+                db.session.query(db.func.count(Document.document_id))
+                .filter(Document.user_id == user_id)
+                .scalar()
+            )
+            return jsonify({"success": True, "count": count})
+
+        except Exception as e:
+            return jsonify({"error": f"Failed to count history: {str(e)}"}), 500
+
+    # ---------------- HISTORY EXPORT ----------------
+    @app.route("/api/history/<int:user_id>/export", methods=["GET"])
+    @user_scoped
+    def export_history(user_id):
+        fmt = request.args.get("format", "ndjson")
+        if fmt not in export.FORMATS:
+            return jsonify({"error": f"format must be one of: {', '.join(export.FORMATS)}"}), 400
+
+        content_type, extension = export.FORMATS[fmt]
+        chunks = export.export(
+            user_id, fmt,
+            batch_size=app.config.get("EXPORT_BATCH_SIZE", 500),
+            chunk_bytes=app.config.get("EXPORT_CHUNK_BYTES", 64 * 1024)
+        )
+        return Response(
+            stream_with_context(chunks),
+            content_type=content_type,
+            headers={"Content-Disposition": f"attachment; filename=ink2text-history-{user_id}.{extension}"}
+        )
+
+    # ---------------- HISTORY SEARCH ----------------
+    @app.route("/api/history/<int:user_id>/search", methods=["GET"])
+    @user_scoped
+    @httpcache.history_cached
+    def search_history(user_id):
+        query = (request.args.get("q") or "").strip()
+        if not query:
+            return jsonify({"error": "Search query 'q' is required"}), 400
+
+        try:
+            limit = parse_limit(request.args.get("limit"), 20, app.config.get("HISTORY_MAX_PAGE_SIZE", 200))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        try:
+            results = search.search(db.session, user_id, query, limit)
+            return jsonify({"success": True, "query": query, "results": results})
+
+        except Exception as e:
+            return jsonify({"error": f"Search failed: {str(e)}"}), 500
+
+    # ---------------- DOCUMENT LAYOUT ----------------
+    @app.route("/api/history/<int:document_id>/layout", methods=["GET"])
+    @authenticated
+    def get_document_layout(document_id):
+        level = request.args.get("level", "word")
+        if level not in ("word", "line"):
+            return jsonify({"error": "level must be 'word' or 'line'"}), 400
+
+        # Only return boxes at or below this confidence (0-1), e.g. to re-run weak regions
+        try:
+            max_confidence = float(request.args["max_confidence"]) if "max_confidence" in request.args else None
+        except ValueError:
+            return jsonify({"error": "max_confidence must be a number between 0 and 1"}), 400
+
+        try:
+            row = (
+                db.session.query(OCRText.confidence_score, OCRLayout.data, Document.user_id)
+                .join(Document, Document.document_id == OCRText.document_id)
+                .outerjoin(OCRLayout, OCRLayout.document_id == OCRText.document_id)
+                .filter(OCRText.document_id == document_id)
+                .first()
+            )
+            # Someone else's document looks the same as a missing one
+            if row is None or not token_auth.owns(row.user_id):
+                return jsonify({"error": "Document not found"}), 404
+
+            words = ocr_layout.unpack(row.data) if row.data else ocr_layout.from_tsv("")
+            columns = ocr_layout.lines(words) if level == "line" else {
+                name: words[name] for name in ("left", "top", "width", "height", "conf", "line", "text")
+            }
+            if max_confidence is not None:
+                columns = ocr_layout.select(columns, [
+                    i for i, conf in enumerate(columns["conf"]) if conf <= max_confidence * 100
+                ])
+
+            return jsonify({
+                "success": True,
+                "document_id": document_id,
+                "confidence": row.confidence_score,
+                "level": level,
+                "count": len(columns["text"]),
+                # Column-wise: item i is (left[i], top[i], width[i], height[i], conf[i], text[i]);
+                # conf is Tesseract's 0-100 score, -1 where it has none
+                level + "s": columns
+            })
+
+        except Exception as e:
+            return jsonify({"error": f"Failed to fetch layout: {str(e)}"}), 500
+
+    # ---------------- DOCUMENT IMAGES ----------------
+    def send_blob(document_id, column, download=False):
+        document = db.session.get(Document, document_id)
+        if not document or not token_auth.owns(document.user_id):
+            return jsonify({"error": "Document not found"}), 404
+
+        digest = getattr(document, column)
+        if not digest:
+            return jsonify({"error": "No stored image for this document"}), 404
+        try:
+            return blob_store.send(digest, download_name=document.file_name if download else None)
+        except FileNotFoundError:
+            return jsonify({"error": "Stored image is missing"}), 404
+
+    @app.route("/api/history/<int:document_id>/thumbnail", methods=["GET"])
+    @authenticated
+    def get_document_thumbnail(document_id):
+        return send_blob(document_id, "thumbnail_blob")
+
+    @app.route("/api/history/<int:document_id>/original", methods=["GET"])
+    @authenticated
+    def get_document_original(document_id):
+        return send_blob(document_id, "original_blob", download=request.args.get("download") == "1")
+
     # ---------------- DELETE HISTORY ----------------
     @app.route("/api/history/<int:document_id>", methods=["DELETE"])
+    @authenticated
     def delete_history(document_id):
         try:
-            document = Document.query.get(document_id)
-            if not document:
+            document = db.session.get(Document, document_id)
+            if not document or not token_auth.owns(document.user_id):
                 return jsonify({"error": "Document not found"}), 404
             
+            search.unindex_documents(db.session, [document_id])
             db.session.delete(document)
+            if document.user_id is not None:
+                touch_history([document.user_id])
             db.session.commit()
             
             return jsonify({"success": True, "message": "Document deleted successfully"})
@@ -248,8 +835,50 @@ def create_app():
             db.session.rollback()
             return jsonify({"error": f"Failed to delete document: {str(e)}"}), 500
 
+    # ---------------- BULK DELETE HISTORY ----------------
+    @app.route("/api/history/<int:user_id>/bulk-delete", methods=["POST"])
+    @user_scoped
+    def bulk_delete_history(user_id):
+        data = request.get_json(silent=True) or {}
+        document_ids = data.get('document_ids')
+        delete_all = data.get('all') is True
+
+        try:
+            before = datetime.fromisoformat(data['before']) if data.get('before') else None
+            after = datetime.fromisoformat(data['after']) if data.get('after') else None
+        except (TypeError, ValueError):
+            return jsonify({"error": "before/after must be ISO dates, e.g. 2024-01-31"}), 400
+
+        if document_ids is not None and (
+            not isinstance(document_ids, list) or not all(isinstance(i, int) for i in document_ids)
+        ):
+            return jsonify({"error": "document_ids must be a list of integers"}), 400
+
+        if document_ids is None and before is None and after is None and not delete_all:
+            return jsonify({"error": "Provide document_ids, a before/after date range, or all: true"}), 400
+
+        # Everything is scoped to the user; the other criteria narrow it further
+        selected = db.select(Document.document_id).where(Document.user_id == user_id)
+        if document_ids is not None:
+            selected = selected.where(Document.document_id.in_(document_ids))
+        if before is not None:
+            selected = selected.where(Document.uploaded_at < before)
+        if after is not None:
+            selected = selected.where(Document.uploaded_at >= after)
+
+        try:
+            deleted = retention.delete_documents(selected)
+            db.session.commit()
+
+            return jsonify({"success": True, "deleted": deleted, "message": f"Deleted {deleted} documents"})
+
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({"error": f"Failed to delete documents: {str(e)}"}), 500
+
     # ---------------- GET ALL USERS (Admin) ----------------
     @app.route("/api/users", methods=["GET"])
+    @admin_required
     def get_all_users():
         try:
             users = User.query.all()
@@ -261,19 +890,21 @@ def create_app():
             return jsonify({"error": f"Failed to fetch users: {str(e)}"}), 500
 
     # ---------------- HEALTH CHECK ----------------
+    # Liveness only; /api/ready (readiness.py) says whether the process is warm
     @app.route("/api/health", methods=["GET"])
     def health_check():
         try:
             # Check database connection
-            db.session.execute("SELECT 1")
+            db.session.execute(db.text("SELECT 1"))
             db_status = "connected"
-        except:
+        except Exception:
             db_status = "disconnected"
-        
+
         return jsonify({
             "status": "running",
             "database": db_status,
-            "tesseract": "configured" if pytesseract.pytesseract.tesseract_cmd else "not configured"
+            "tesseract": "configured" if shutil.which(ocr_pool.tesseract_cmd or "tesseract") else "not configured",
+            "warm": readiness.warm
         })
 
     return app
@@ -287,7 +918,8 @@ if __name__ == "__main__":
     print("="*50)
     print(f"📍 Server: http://localhost:5000")
     print(f"🗄️  Database: {Config.SQLALCHEMY_DATABASE_URI}")
+    print("ℹ️  Development server - use `python serve.py` in production")
     print("="*50 + "\n")
     
-    app.run(debug=True, host="0.0.0.0", port=5000)
+    app.run(debug=Config.DEBUG, host=Config.SERVER_HOST, port=Config.SERVER_PORT)
 
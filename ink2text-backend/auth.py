@@ -0,0 +1,289 @@
+"""
+Access Tokens for Ink2Text
+Signup and login hand out a signed, expiring access token. Clients send it
+as ``Authorization: Bearer <token>``, and the user a request acts for is
+taken from the token instead of a ``user_id`` the client made up.
+
+Checking a token normally takes no database query:
+
+- the signature and age are checked with SECRET_KEY (itsdangerous)
+- user records come from a small per-process TTL cache
+- revoked tokens (logout) are kept in memory and refreshed from the
+  revoked_tokens table at most every AUTH_REVOCATION_REFRESH seconds, so
+  another process sees a logout within that time
+- ``flask revoke-tokens USER_ID`` ends all of a user's sessions through
+  users.tokens_valid_after, within AUTH_USER_CACHE_TTL seconds
+
+Every route that acts for a user needs a token; only guest OCR, which
+saves nothing, works without one. Users listed in ADMIN_USER_IDS may
+also list all users.
+"""
+
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+
+import click
+from flask import current_app, g, jsonify, request
+from itsdangerous import BadSignature, SignatureExpired, URLSafeTimedSerializer
+from werkzeug.exceptions import HTTPException
+
+from extensions import db
+
+DEFAULT_SECRET_KEY = "your-secret-key-change-in-production"
+
+
+class AuthError(HTTPException):
+    code = 401
+
+    def __init__(self, description, code=401):
+        super().__init__(description)
+        self.code = code
+
+
+class TTLCache:
+    """Small LRU whose entries expire ``ttl`` seconds after they were stored."""
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class TokenAuth:
+    def __init__(self, app=None):
+        self.ttl = 12 * 3600
+        self.admin_ids = set()
+        self.revocation_refresh = 30
+        self.users = TTLCache(60, 10000)
+        self._serializer = None
+        self._revoked = {}  # jti -> expiry (epoch seconds)
+        self._revoked_since = None  # revoked_at of the newest entry loaded
+        self._refreshed = 0.0
+        self._refresh_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get("AUTH_TOKEN_TTL", self.ttl)
+        self.admin_ids = {int(i) for i in app.config.get("ADMIN_USER_IDS", "").split(",") if i.strip()}
+        self.revocation_refresh = app.config.get("AUTH_REVOCATION_REFRESH", self.revocation_refresh)
+        self.users = TTLCache(app.config.get("AUTH_USER_CACHE_TTL", 60), app.config.get("AUTH_USER_CACHE_SIZE", 10000))
+        self._serializer = URLSafeTimedSerializer(app.config["SECRET_KEY"], salt="ink2text-access-token")
+        if app.config["SECRET_KEY"] == DEFAULT_SECRET_KEY and not app.debug:
+            app.logger.warning("SECRET_KEY is the default; anyone can forge access tokens. Set SECRET_KEY.")
+        app.extensions["token_auth"] = self
+
+        @app.errorhandler(AuthError)
+        def auth_error(e):
+            response = jsonify({"error": e.description})
+            response.status_code = e.code
+            if e.code == 401:
+                response.headers["WWW-Authenticate"] = "Bearer"
+            return response
+
+        @app.cli.command("revoke-tokens")
+        @click.argument("user_id", type=int)
+        def revoke_tokens_command(user_id):
+            """End every session of a user: tokens issued so far stop working."""
+            if not self.revoke_user(user_id):
+                raise click.ClickException(f"User {user_id} not found")
+            db.session.commit()
+            print(f"🔒 Revoked all tokens of user {user_id} "
+                  f"(other processes within {app.config.get('AUTH_USER_CACHE_TTL', 60)}s)")
+
+    # ---------------- TOKENS ----------------
+    def issue(self, user):
+        """New access token for ``user``: ``{"token", "token_type", "expires_in"}``."""
+        token = self._serializer.dumps({"uid": user.user_id, "jti": secrets.token_urlsafe(12)})
+        # Cache the user now: the client's next request comes with this token
+        self.users.put(user.user_id, _user_record(user))
+        return {"token": token, "token_type": "Bearer", "expires_in": self.ttl}
+
+    def _bearer_token(self):
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not token.strip():
+            return None
+        return token.strip()
+
+    def verify(self, token):
+        """Claims of a valid token (uid, jti, iat); raises AuthError otherwise."""
+        try:
+            claims, issued = self._serializer.loads(token, max_age=self.ttl, return_timestamp=True)
+        except SignatureExpired:
+            raise AuthError("Access token expired; log in again")
+        except BadSignature:
+            raise AuthError("Invalid access token")
+
+        self._refresh_revoked()
+        if claims.get("jti") in self._revoked:
+            raise AuthError("Access token revoked; log in again")
+
+        user = self.user(claims.get("uid"))
+        if user is None:
+            raise AuthError("Invalid access token")
+        issued = issued.replace(tzinfo=None)
+        if user["tokens_valid_after"] and issued < user["tokens_valid_after"]:
+            raise AuthError("Access token revoked; log in again")
+        return {**claims, "iat": issued}
+
+    def claims(self):
+        """Claims of this request's token, None when it has none. Checked
+        once per request."""
+        if "auth_claims" not in g:
+            token = self._bearer_token()
+            g.auth_claims = self.verify(token) if token else None
+        return g.auth_claims
+
+    def authorize(self, user_id=None, guest_ok=False):
+        """The user this request acts for: the token's user. ``user_id``
+        (from the URL or the form), when given, has to match it.
+
+        Without a token this is a 401, except that with ``guest_ok`` a
+        request naming no user goes through as a guest (None).
+        """
+        claims = self.claims()
+        if claims is None:
+            if guest_ok and not user_id:
+                return None
+            raise AuthError("Authentication required")
+        if user_id not in (None, "") and str(user_id) != str(claims["uid"]):
+            raise AuthError("Not allowed for this user", 403)
+        return claims["uid"]
+
+    def owns(self, owner_id):
+        """Whether this request's user owns something of ``owner_id``.
+        Use with ``authenticated``, which turns away requests without a
+        token before the view runs."""
+        claims = self.claims()
+        return claims is not None and owner_id == claims["uid"]
+
+    # ---------------- USERS ----------------
+    def user(self, user_id):
+        """Cached record of a user (to_dict() plus tokens_valid_after), or None."""
+        record = self.users.get(user_id)
+        if record is None:
+            from models import User
+
+            user = db.session.get(User, user_id) if isinstance(user_id, int) else None
+            if user is None:
+                return None
+            record = _user_record(user)
+            self.users.put(user_id, record)
+        return record
+
+    # ---------------- REVOCATION ----------------
+    def revoke(self, claims):
+        """Revoke one token (by its claims). Runs in the caller's transaction."""
+        from models import RevokedToken
+
+        expires_at = claims["iat"] + timedelta(seconds=self.ttl)
+        db.session.merge(RevokedToken(jti=claims["jti"], user_id=claims["uid"], expires_at=expires_at))
+        # Expired tokens fail on their own; their entries are no longer needed
+        db.session.execute(db.delete(RevokedToken).where(RevokedToken.expires_at < datetime.utcnow()))
+        self._revoked[claims["jti"]] = expires_at.replace(tzinfo=timezone.utc).timestamp()
+
+    def revoke_user(self, user_id):
+        """Revoke every token of a user issued until now."""
+        from models import User
+
+        user = db.session.get(User, user_id)
+        if user is None:
+            return False
+        # Token timestamps have whole seconds; a token issued within this second is revoked too
+        user.tokens_valid_after = datetime.utcnow().replace(microsecond=0) + timedelta(seconds=1)
+        self.users.pop(user_id)
+        return True
+
+    def _refresh_revoked(self):
+        if time.monotonic() - self._refreshed < self.revocation_refresh:
+            return
+        # One thread refreshes; the others keep using the current list
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            from models import RevokedToken
+
+            query = db.select(RevokedToken.jti, RevokedToken.expires_at, RevokedToken.revoked_at)
+            if self._revoked_since is not None:
+                # Overlap a little: revoked_at comes from other processes' clocks
+                query = query.where(RevokedToken.revoked_at >= self._revoked_since - timedelta(minutes=1))
+            now = time.time()
+            for jti, expires_at, revoked_at in db.session.execute(query):
+                self._revoked[jti] = expires_at.replace(tzinfo=timezone.utc).timestamp()
+                if self._revoked_since is None or revoked_at > self._revoked_since:
+                    self._revoked_since = revoked_at
+            if self._revoked_since is None:
+                self._revoked_since = datetime.utcnow()
+            self._revoked = {jti: expires for jti, expires in self._revoked.items() if expires > now}
+            self._refreshed = time.monotonic()
+        finally:
+            self._refresh_lock.release()
+
+
+def _user_record(user):
+    return {**user.to_dict(), "tokens_valid_after": user.tokens_valid_after}
+
+
+def authenticated(view):
+    """Require a valid token before the view runs, so views can call
+    TokenAuth.owns() inside their own error handling."""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        current_app.extensions["token_auth"].authorize()
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+def user_scoped(view):
+    """For routes taking ``user_id`` from the URL: only that user's token
+    may call them (see TokenAuth.authorize)."""
+
+    @wraps(view)
+    def wrapper(user_id, *args, **kwargs):
+        current_app.extensions["token_auth"].authorize(user_id)
+        return view(user_id, *args, **kwargs)
+
+    return wrapper
+
+
+def admin_required(view):
+    """Only users listed in ADMIN_USER_IDS may call the view."""
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        auth = current_app.extensions["token_auth"]
+        if auth.authorize() not in auth.admin_ids:
+            raise AuthError("Admins only", 403)
+        return view(*args, **kwargs)
+
+    return wrapper
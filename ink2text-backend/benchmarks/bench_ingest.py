@@ -0,0 +1,134 @@
+"""
+Upload Ingest Benchmark for Ink2Text
+Compares the old upload path (PIL verify -> re-decode -> RGB -> numpy ->
+grayscale -> PNG temp file for pytesseract) with the current one
+(header check -> single grayscale decode -> PGM temp file).
+
+Each variant runs in a fresh process so peak RSS is not shared between them.
+
+Usage:
+    python benchmarks/bench_ingest.py
+    python benchmarks/bench_ingest.py --megapixels 1 4 12 --format jpg --json results.json
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_image(megapixels, fmt):
+    """Photo-like test image: paper texture with dark strokes, 4:3."""
+    width = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    rng = np.random.default_rng(0)
+    img = rng.integers(180, 230, size=(height, width, 3), dtype=np.uint8)
+    for y in range(60, height - 60, 80):
+        cv2.putText(img, "Ink2Text benchmark line", (40, y), cv2.FONT_HERSHEY_SIMPLEX, 2, (20, 20, 20), 4)
+    ext = ".jpg" if fmt == "jpg" else ".png"
+    return cv2.imencode(ext, img)[1].tobytes()
+
+
+# ---------------- VARIANTS ----------------
+def legacy_ingest(data, tmpdir):
+    stream = io.BytesIO(data)
+    image = Image.open(stream)
+    image.verify()
+    stream.seek(0)
+    image = Image.open(stream).convert("RGB")
+    img = np.array(image)
+    gray = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+    # What pytesseract does with an array: PIL image -> PNG temp file
+    Image.fromarray(gray).save(os.path.join(tmpdir, "page.png"), format="PNG")
+    return gray.shape
+
+
+def current_ingest(data, tmpdir):
+    from ocr_service import decode_image
+    gray = decode_image(data)
+    cv2.imwrite(os.path.join(tmpdir, "page.pgm"), gray)
+    return gray.shape
+
+
+VARIANTS = {"legacy": legacy_ingest, "current": current_ingest}
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_variant(name, data, repeat, queue):
+    ingest = VARIANTS[name]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # Warm up imports and codecs before taking the RSS baseline
+        ingest(make_image(0.1, "png"), tmpdir)
+        baseline = _peak_rss_mb()
+
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            ingest(data, tmpdir)
+            times.append(time.perf_counter() - start)
+
+    queue.put({"latency_ms": float(np.median(times)) * 1000, "peak_mb": _peak_rss_mb() - baseline})
+
+
+def run(megapixels, fmt, repeat):
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for mp in megapixels:
+        data = make_image(mp, fmt)
+        for name in VARIANTS:
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_run_variant, args=(name, data, repeat, queue))
+            proc.start()
+            measured = queue.get()
+            proc.join()
+            results.append({
+                "variant": name,
+                "format": fmt,
+                "megapixels": mp,
+                "upload_mb": round(len(data) / (1024 * 1024), 2),
+                "latency_ms": round(measured["latency_ms"], 1),
+                "ms_per_mp": round(measured["latency_ms"] / mp, 1),
+                "peak_mb": round(measured["peak_mb"], 1),
+                "peak_mb_per_mp": round(measured["peak_mb"] / mp, 2)
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the upload decode path")
+    parser.add_argument("--megapixels", type=float, nargs="+", default=[1, 4, 12, 24])
+    parser.add_argument("--format", choices=["jpg", "png"], default="jpg")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = run(args.megapixels, args.format, args.repeat)
+
+    print(f"{'variant':<8} {'MP':>5} {'upload MB':>9} {'ms':>8} {'ms/MP':>7} {'peak MB':>8} {'MB/MP':>6}")
+    for r in results:
+        print(f"{r['variant']:<8} {r['megapixels']:>5} {r['upload_mb']:>9} {r['latency_ms']:>8} "
+              f"{r['ms_per_mp']:>7} {r['peak_mb']:>8} {r['peak_mb_per_mp']:>6}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+OCR Benchmark for Ink2Text
+Runs a synthetic corpus (see corpus.py) through the OCR pipeline and
+reports throughput, latency percentiles, peak memory and character error
+rate. Two modes:
+
+- inprocess: decode + preprocess + Tesseract through ocr_service, no HTTP
+- http: POST /api/ocr through the Flask test client as a signed-up user,
+  with a throwaway SQLite DB and blob store
+
+The OCR cache is disabled so every page really goes through Tesseract.
+
+Usage:
+    python benchmarks/bench_ocr.py
+    python benchmarks/bench_ocr.py --mode both --count 40 --concurrency 4 --preprocess fast
+    python benchmarks/bench_ocr.py --megapixels 1 4 --json results/fast.json
+    python benchmarks/bench_ocr.py --ocr-mode adaptive
+    python benchmarks/bench_ocr.py --ocr-mode regions --megapixels 12
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np  # noqa: E402
+
+import corpus  # noqa: E402
+
+
+def _configure_environment(workdir):
+    # Must run before the app is imported: Config reads these at import time.
+    # Everything the app writes goes to the throwaway workdir.
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["BLOB_STORE_DIR"] = os.path.join(workdir, "blobs")
+    os.environ["JOB_BROKER_PATH"] = os.path.join(workdir, "jobs.db")
+    os.environ["RATE_LIMIT_PATH"] = os.path.join(workdir, "ratelimit.db")
+    os.environ["OCR_CACHE_ENABLED"] = "false"
+    os.environ["TIMING_LOG"] = "false"
+    os.environ["SQLALCHEMY_ECHO"] = "false"
+    os.environ["RATE_LIMIT_ENABLED"] = "false"  # one benchmark user sends every request
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def _worker_peak_rss_mb():
+    """Largest peak RSS among the live OCR worker processes (Linux only)."""
+    from extensions import ocr_pool
+
+    peaks = []
+    for pid in ocr_pool.worker_pids():
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        peaks.append(int(line.split()[1]) / 1024)
+        except OSError:
+            continue
+    return round(max(peaks), 1) if peaks else None
+
+
+def _percentile(values, q):
+    return round(float(np.percentile(values, q)) * 1000, 1) if values else None
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+# ---------------- RUNNERS ----------------
+def run_inprocess(app, pages, preprocess_stages, ocr_mode, concurrency):
+    import ocr_service
+
+    def one(page):
+        with app.app_context():
+            start = time.perf_counter()
+            gray = ocr_service.decode_image(page["data"])
+            result, _, _ = ocr_service.run_ocr(gray, stages=preprocess_stages, mode=ocr_mode)
+            return time.perf_counter() - start, result.text
+
+    return _drive(pages, one, concurrency)
+
+
+def _sign_up(app):
+    """Register the benchmark user; returns (user_id, access token)."""
+    response = app.test_client().post("/api/auth/signup", json={
+        "name": "Benchmark",
+        "email": f"bench-{os.getpid()}@example.com",
+        "password": "benchmark"
+    })
+    body = response.get_json() or {}
+    if response.status_code != 201:
+        raise RuntimeError(body.get("error", f"Signup failed: HTTP {response.status_code}"))
+    return body["user"]["user_id"], body["token"]
+
+
+def run_http(app, pages, preprocess_spec, ocr_mode, concurrency, user_id, token):
+    def one(page):
+        client = app.test_client()
+        start = time.perf_counter()
+        response = client.post("/api/ocr", headers={"Authorization": f"Bearer {token}"}, data={
+            "user_id": str(user_id),
+            "preprocess": preprocess_spec,
+            "mode": ocr_mode,
+            "image": (io.BytesIO(page["data"]), page["name"])
+        })
+        elapsed = time.perf_counter() - start
+        body = response.get_json() or {}
+        if response.status_code != 200:
+            raise RuntimeError(body.get("error", f"HTTP {response.status_code}"))
+        return elapsed, body.get("text", "")
+
+    return _drive(pages, one, concurrency)
+
+
+def _drive(pages, one, concurrency):
+    latencies, errors, scores = [], [], []
+
+    def task(page):
+        try:
+            elapsed, text = one(page)
+            return page, elapsed, text, None
+        except Exception as e:
+            return page, None, None, str(e)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for page, elapsed, text, error in pool.map(task, pages):
+            if error:
+                errors.append({"page": page["name"], "error": error})
+                continue
+            latencies.append(elapsed)
+            scores.append(corpus.cer(page["truth"], text))
+    wall = time.perf_counter() - start
+
+    return {
+        "pages": len(pages),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "wall_seconds": round(wall, 3),
+        "throughput_pages_per_second": round(len(latencies) / wall, 3) if wall else None,
+        "latency_ms": {
+            "mean": round(float(np.mean(latencies)) * 1000, 1) if latencies else None,
+            "p50": _percentile(latencies, 50),
+            "p95": _percentile(latencies, 95),
+            "p99": _percentile(latencies, 99)
+        },
+        "cer": {
+            "mean": round(float(np.mean(scores)), 4) if scores else None,
+            "p95": round(float(np.percentile(scores, 95)), 4) if scores else None
+        },
+        "peak_rss_mb": {"server": _peak_rss_mb(), "ocr_worker": _worker_peak_rss_mb()}
+    }
+
+
+def _print_summary(mode, result):
+    latency = result["latency_ms"]
+    print(
+        f"{mode:<10} pages={result['pages']:<4} errors={result['errors']:<3} "
+        f"{result['throughput_pages_per_second']} pages/s  "
+        f"p50={latency['p50']}ms p95={latency['p95']}ms p99={latency['p99']}ms  "
+        f"CER={result['cer']['mean']}  peak RSS={result['peak_rss_mb']['server']}MB "
+        f"(worker {result['peak_rss_mb']['ocr_worker']}MB)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Ink2Text OCR pipeline")
+    parser.add_argument("--mode", choices=["inprocess", "http", "both"], default="both")
+    parser.add_argument("--count", type=int, default=24, help="pages in the corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--megapixels", type=float, nargs="+", default=[1, 4, 12])
+    parser.add_argument("--styles", nargs="+", choices=list(corpus.STYLES), default=list(corpus.STYLES))
+    parser.add_argument("--noise", type=float, nargs="+", default=[0, 8])
+    parser.add_argument("--rotation", type=float, nargs="+", default=[0, 3])
+    parser.add_argument("--format", choices=["jpg", "png"], default="jpg")
+    parser.add_argument("--preprocess", default="none", help="preset or stage list, as for /api/ocr")
+    parser.add_argument("--ocr-mode", choices=["standard", "adaptive", "regions"], default="standard")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--json", help="write machine-readable results to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="ink2text-bench-")
+    _configure_environment(workdir)
+
+    from config import Config
+    from app import app
+    from extensions import ocr_pool
+    import preprocess
+
+    stages = preprocess.parse(args.preprocess)
+
+    print(f"🧪 Building corpus: {args.count} pages ({args.format})")
+    pages = corpus.build(
+        args.count, seed=args.seed, megapixels=args.megapixels, styles=args.styles,
+        noise=args.noise, rotation=args.rotation, fmt=args.format,
+        max_bytes=Config.MAX_CONTENT_LENGTH
+    )
+
+    user_id, token = _sign_up(app)
+
+    # Start the OCR workers before timing anything
+    with app.app_context():
+        ocr_pool.image_to_string(np.full((32, 32), 255, dtype=np.uint8))
+
+    modes = ["inprocess", "http"] if args.mode == "both" else [args.mode]
+    results = {}
+    for mode in modes:
+        if mode == "inprocess":
+            results[mode] = run_inprocess(app, pages, stages, args.ocr_mode, args.concurrency)
+        else:
+            results[mode] = run_http(app, pages, args.preprocess, args.ocr_mode, args.concurrency, user_id, token)
+        _print_summary(mode, results[mode])
+
+    report = {
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "git_revision": _git_revision(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "settings": {
+            "preprocess": stages,
+            "ocr_mode": args.ocr_mode,
+            "adaptive_threshold": ocr_pool.adaptive_threshold if args.ocr_mode == "adaptive" else None,
+            "concurrency": args.concurrency,
+            "ocr_workers": ocr_pool.workers,
+            "ocr_lang": ocr_pool.lang
+        },
+        "corpus": {
+            "count": len(pages),
+            "seed": args.seed,
+            "format": args.format,
+            "megapixels": args.megapixels,
+            "styles": args.styles,
+            "noise": args.noise,
+            "rotation": args.rotation,
+            "bytes_total": sum(len(page["data"]) for page in pages)
+        },
+        "results": results
+    }
+
+    if args.json:
+        os.makedirs(os.path.dirname(os.path.abspath(args.json)), exist_ok=True)
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"📄 Results written to {args.json}")
+
+    ocr_pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
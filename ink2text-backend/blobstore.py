@@ -0,0 +1,168 @@
+"""
+Blob Store for Ink2Text
+Original uploads and their thumbnails are kept on local disk, addressed by
+a hash of their content:
+
+- blobs live at <root>/ab/cd/<digest>, so no directory grows too large
+- identical uploads are stored once; documents only reference the digest
+- writes go to a temporary file that is renamed into place, so readers
+  never see a half-written blob
+- reads are streamed straight from the file (sendfile where the server
+  supports it); nothing is decoded to serve a preview
+
+Blobs are never deleted together with documents, since other documents may
+share them. collect() removes the ones nothing references any more.
+"""
+
+import hashlib
+import os
+import tempfile
+import time
+
+from flask import send_file
+
+import ingest
+import lazy
+
+cv2 = lazy.module("cv2")
+
+MIME_TYPES = {
+    "png": "image/png", "jpeg": "image/jpeg", "gif": "image/gif", "webp": "image/webp",
+    "tiff": "image/tiff", "zip": "application/zip", "pdf": "application/pdf"
+}
+
+
+def make_thumbnail(gray, max_side=320, quality=80):
+    """JPEG preview of a decoded page, long side shrunk to ``max_side``.
+
+    Built from the grayscale image the OCR pipeline already decoded, so
+    the upload isn't decoded a second time.
+    """
+    height, width = gray.shape[:2]
+    factor = min(1.0, max_side / max(height, width))
+    if factor < 1.0:
+        size = (max(1, int(round(width * factor))), max(1, int(round(height * factor))))
+        gray = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode(".jpg", gray, [cv2.IMWRITE_JPEG_QUALITY, quality, cv2.IMWRITE_JPEG_OPTIMIZE, 1])
+    if not ok:
+        raise ValueError("Could not encode thumbnail")
+    return encoded.tobytes()
+
+
+class BlobStore:
+    def __init__(self, app=None):
+        self.enabled = True
+        self.root = None
+        self.thumbnail_max_side = 320
+        self.thumbnail_quality = 80
+        self.cache_max_age = 86400
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get("BLOB_STORE_ENABLED", self.enabled)
+        self.root = app.config.get("BLOB_STORE_DIR") or os.path.join(app.instance_path, "blobs")
+        self.thumbnail_max_side = app.config.get("THUMBNAIL_MAX_SIDE", self.thumbnail_max_side)
+        self.thumbnail_quality = app.config.get("THUMBNAIL_QUALITY", self.thumbnail_quality)
+        self.cache_max_age = app.config.get("BLOB_CACHE_MAX_AGE", self.cache_max_age)
+        app.extensions["blob_store"] = self
+
+    @staticmethod
+    def digest(data):
+        return hashlib.blake2b(data, digest_size=32).hexdigest()
+
+    def path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def put(self, data):
+        """Store ``data`` (bytes or any buffer) and return its digest.
+
+        Content that is already stored isn't written again.
+        """
+        digest = self.digest(data)
+        path = self.path(digest)
+        if os.path.exists(path):
+            try:
+                # Fresh again, so collect() leaves it alone until the upload is saved
+                os.utime(path)
+                return digest
+            except FileNotFoundError:
+                pass  # collected in the meantime; write it again
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            # Atomic: a concurrent upload of the same content just replaces it
+            os.replace(temp_path, path)
+        except BaseException:
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+            raise
+        return digest
+
+    def put_thumbnail(self, gray):
+        return self.put(make_thumbnail(gray, self.thumbnail_max_side, self.thumbnail_quality))
+
+    def mimetype(self, digest):
+        with open(self.path(digest), "rb") as f:
+            head = f.read(16)
+        return MIME_TYPES.get(ingest.sniff(head), "application/octet-stream")
+
+    def send(self, digest, download_name=None):
+        """Response streaming the blob from disk; raises FileNotFoundError.
+
+        Blobs never change, so the digest doubles as a strong ETag and
+        revalidations are answered with 304.
+        """
+        path = self.path(digest)
+        response = send_file(
+            path,
+            mimetype=self.mimetype(digest),
+            as_attachment=download_name is not None,
+            download_name=download_name,
+            conditional=True,
+            etag=digest,
+            max_age=self.cache_max_age
+        )
+        # Previews are personal data: browsers may cache them, shared proxies may not
+        response.cache_control.public = False
+        response.cache_control.private = True
+        return response
+
+    def walk(self):
+        """Digests of all stored blobs with their modification times."""
+        if not os.path.isdir(self.root):
+            return
+        for top, _, files in os.walk(self.root):
+            for name in files:
+                if name.startswith(".tmp-"):
+                    continue
+                try:
+                    yield name, os.path.getmtime(os.path.join(top, name))
+                except OSError:
+                    continue
+
+    def collect(self, referenced, grace=3600):
+        """Delete blobs not in ``referenced`` that are older than ``grace``
+        seconds (younger ones may belong to uploads still being saved).
+        Returns the number of blobs removed."""
+        cutoff = time.time() - grace
+        removed = 0
+        for digest, mtime in list(self.walk()):
+            if digest in referenced or mtime > cutoff:
+                continue
+            try:
+                os.unlink(self.path(digest))
+                removed += 1
+            except OSError:
+                continue
+        return removed
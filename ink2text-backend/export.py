@@ -0,0 +1,137 @@
+"""
+History Export for Ink2Text
+Streams a user's whole archive as NDJSON, CSV, plain text or a zip of one
+text file per document. Rows are read with yield_per (a server-side cursor
+on PostgreSQL) and written out in chunks as they arrive, so memory stays
+flat however large the archive is and the first bytes go out right away.
+"""
+
+import csv
+import io
+import json
+import re
+import zipfile
+
+from extensions import db, text_codec
+
+# format -> (Content-Type, file extension)
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "txt": ("text/plain; charset=utf-8", "txt"),
+    "zip": ("application/zip", "zip")
+}
+
+CSV_COLUMNS = ("document_id", "file_name", "uploaded_at", "confidence", "text")
+
+
+def _rows(user_id, batch_size):
+    from models import Document, OCRText
+
+    query = (
+        db.select(
+            Document.document_id,
+            Document.file_name,
+            Document.uploaded_at,
+            OCRText.confidence_score,
+            OCRText.extracted_text,
+            OCRText.text_data
+        )
+        .join(OCRText, Document.document_id == OCRText.document_id)
+        .where(Document.user_id == user_id)
+        .order_by(Document.uploaded_at, Document.document_id)
+        .execution_options(yield_per=batch_size)
+    )
+    for row in db.session.execute(query):
+        yield {
+            "document_id": row.document_id,
+            "file_name": row.file_name,
+            "uploaded_at": row.uploaded_at.strftime("%Y-%m-%d %H:%M:%S") if row.uploaded_at else None,
+            "confidence": row.confidence_score,
+            "text": text_codec.decode(row.extracted_text, row.text_data)
+        }
+
+
+def _chunked(parts, chunk_bytes):
+    """Join small pieces of output into chunks of about ``chunk_bytes``."""
+    buffer, size = [], 0
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        buffer.append(part)
+        size += len(part)
+        if size >= chunk_bytes:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def _ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + "\n"
+
+
+def _csv(rows):
+    line = io.StringIO()
+    writer = csv.DictWriter(line, fieldnames=CSV_COLUMNS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        yield line.getvalue()
+        line.seek(0)
+        line.truncate()
+    yield line.getvalue()
+
+
+def _txt(rows):
+    for row in rows:
+        yield f"===== {row['file_name']} ({row['uploaded_at']}, document {row['document_id']}) =====\n"
+        yield row["text"].rstrip("\n") + "\n\n"
+
+
+class _ZipStream(io.RawIOBase):
+    """Write-only stream that hands out what ZipFile wrote since the last call.
+
+    Not seekable, so ZipFile writes sizes in data descriptors after each
+    member instead of going back to patch the headers.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def _member_name(row):
+    stem = row["file_name"].rsplit(".", 1)[0]
+    stem = re.sub(r"[^\w.-]+", "_", stem).strip("._") or "document"
+    return f"{row['document_id']}-{stem[:80]}.txt"
+
+
+def _zip(rows):
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for row in rows:
+            archive.writestr(_member_name(row), row["text"])
+            yield stream.drain()
+    yield stream.drain()
+
+
+WRITERS = {"ndjson": _ndjson, "csv": _csv, "txt": _txt, "zip": _zip}
+
+
+def export(user_id, fmt, batch_size=500, chunk_bytes=64 * 1024):
+    """Byte chunks of the user's history in format ``fmt`` (one of FORMATS)."""
+    return _chunked(WRITERS[fmt](_rows(user_id, batch_size)), chunk_bytes)
@@ -1,3 +1,23 @@
 from flask_sqlalchemy import SQLAlchemy
+from ocr_pool import OCRPool
+from jobs import JobQueue
+from ocr_cache import OCRCache
+from blobstore import BlobStore
+from ratelimit import RateLimiter
 
 db = SQLAlchemy()
+ocr_pool = OCRPool()
+job_queue = JobQueue()
+ocr_cache = OCRCache()
+blob_store = BlobStore()
+rate_limiter = RateLimiter()
+
+# Imported after db exists: persistence, textcodec, readiness and auth use it at module level
+from persistence import WriteBehindBuffer  # noqa: E402
+from textcodec import TextCodec  # noqa: E402
+from readiness import Readiness  # noqa: E402
+from auth import TokenAuth  # noqa: E402
+write_buffer = WriteBehindBuffer()
+text_codec = TextCodec()
+readiness = Readiness()
+token_auth = TokenAuth()
@@ -0,0 +1,124 @@
+"""
+HTTP Caching and Compression for Ink2Text
+
+- Conditional GET: every user has a history version, bumped in the same
+  transaction as any change to their documents (persistence.touch_history).
+  History responses carry an ETag built from it, so a client asking again
+  with If-None-Match gets a 304 after one primary-key lookup instead of
+  the whole listing. Last-Modified only has whole seconds, so it is sent
+  (and If-Modified-Since honoured) once the second of the last change is
+  over; a later change can't share its value then.
+- Compression: JSON and plain-text responses above a minimum size are
+  compressed with brotli (when the brotli package is installed) or gzip,
+  whichever the client prefers. Streamed responses are left alone.
+"""
+
+import gzip
+import hashlib
+from datetime import datetime
+from functools import wraps
+
+from flask import current_app, make_response, request
+
+from extensions import db
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only without it
+    brotli = None
+
+COMPRESSIBLE_TYPES = {"application/json", "text/plain", "text/csv"}
+
+
+# ---------------- CONDITIONAL GET ----------------
+def history_state(user_id):
+    """``(version, updated_at)`` of a user's history, or None for unknown users."""
+    from models import User
+
+    return db.session.execute(
+        db.select(User.history_version, User.history_updated_at).where(User.user_id == user_id)
+    ).first()
+
+
+def history_cached(view):
+    """Answer ``view(user_id, ...)`` with 304 while the user's history is
+    unchanged. The ETag also covers the path and query string, which
+    select what the response contains."""
+
+    @wraps(view)
+    def wrapper(user_id, *args, **kwargs):
+        state = history_state(user_id)
+        if state is None:
+            return view(user_id, *args, **kwargs)
+
+        resource = hashlib.blake2b(request.full_path.encode("utf-8"), digest_size=6).hexdigest()
+        # Weak: the body is the same whatever Content-Encoding it is sent with
+        etag = f"h{user_id}-{state.history_version}-{resource}"
+        last_modified = state.history_updated_at.replace(microsecond=0) if state.history_updated_at else None
+        if last_modified and last_modified >= datetime.utcnow().replace(microsecond=0):
+            # Changed within the current second: another change this second
+            # would get the same Last-Modified
+            last_modified = None
+
+        # If-None-Match wins over If-Modified-Since, as in RFC 9110
+        if request.if_none_match:
+            unchanged = request.if_none_match.contains_weak(etag)
+        else:
+            since = request.if_modified_since
+            unchanged = bool(last_modified and since and last_modified <= since.replace(tzinfo=None))
+
+        if unchanged:
+            response = current_app.response_class(status=304)
+        else:
+            response = make_response(view(user_id, *args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+        response.set_etag(etag, weak=True)
+        if last_modified:
+            response.last_modified = last_modified
+        # Cached copies must be revalidated, and only the user's browser keeps them
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+
+    return wrapper
+
+
+# ---------------- COMPRESSION ----------------
+def _compress(data, encoding, gzip_level, brotli_quality):
+    if encoding == "br":
+        return brotli.compress(data, quality=brotli_quality)
+    return gzip.compress(data, compresslevel=gzip_level, mtime=0)
+
+
+def init_app(app):
+    if not app.config.get("COMPRESSION_ENABLED", True):
+        return
+    min_bytes = app.config.get("COMPRESSION_MIN_BYTES", 1024)
+    gzip_level = app.config.get("COMPRESSION_GZIP_LEVEL", 6)
+    brotli_quality = app.config.get("COMPRESSION_BROTLI_QUALITY", 5)
+    encodings = (["br"] if brotli else []) + ["gzip"]
+
+    @app.after_request
+    def compress_response(response):
+        if (
+            response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES
+        ):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        encoding = request.accept_encodings.best_match(encodings)
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if len(data) < min_bytes:
+            return response
+
+        response.set_data(_compress(data, encoding, gzip_level, brotli_quality))
+        response.headers["Content-Encoding"] = encoding
+        return response
@@ -0,0 +1,298 @@
+"""
+Streaming Upload Ingestion for Ink2Text
+Uploaded files are checked while the multipart body is still arriving:
+
+- the format is sniffed from the magic bytes of the first chunk, not the
+  file name
+- image dimensions are read from the header, so oversized images and
+  decompression bombs are rejected before the rest of the body is read
+- the body is kept in memory only up to INGEST_SPOOL_MEMORY_BYTES and
+  spooled to a temporary file beyond that; decoding then reads it through
+  a memory map instead of a copy in RAM
+"""
+
+import io
+import mmap
+import tempfile
+import warnings
+from contextlib import contextmanager
+
+from flask import Request, jsonify
+from werkzeug.exceptions import HTTPException
+
+import lazy
+
+Image = lazy.module("PIL.Image")
+
+# Bytes collected before sniffing; enough for the header of every format
+# below, including JPEGs with a large EXIF block in front of the frame header
+HEAD_BYTES = 64 * 1024
+MAX_HEAD_BYTES = 512 * 1024
+
+# (format, magic bytes at offset 0, extra check)
+SIGNATURES = [
+    ("png", b"\x89PNG\r\n\x1a\n", None),
+    ("jpeg", b"\xff\xd8\xff", None),
+    ("gif", b"GIF87a", None),
+    ("gif", b"GIF89a", None),
+    ("webp", b"RIFF", lambda head: head[8:12] == b"WEBP"),
+    ("tiff", b"II*\x00", None),
+    ("tiff", b"MM\x00*", None),
+    ("zip", b"PK\x03\x04", None),
+    ("zip", b"PK\x05\x06", None),
+    ("pdf", b"%PDF-", None),
+]
+
+# Formats decoded as a single image, whose size can be checked up front
+IMAGE_FORMATS = {"png", "jpeg", "gif", "webp", "tiff"}
+
+EXTENSION_FORMATS = {
+    "png": "png", "jpg": "jpeg", "jpeg": "jpeg", "gif": "gif", "webp": "webp",
+    "tif": "tiff", "tiff": "tiff", "zip": "zip", "pdf": "pdf"
+}
+
+
+class UploadRejected(HTTPException):
+    """An upload refused while it was being received."""
+
+    def __init__(self, description, code=400):
+        super().__init__(description)
+        self.code = code
+
+
+def sniff(head):
+    """Format name from the first bytes of a file, or None."""
+    for name, magic, check in SIGNATURES:
+        if head.startswith(magic) and (check is None or check(head)):
+            return name
+    return None
+
+
+def image_size(head):
+    """``(width, height)`` from an image header, or None if it isn't complete yet.
+
+    Raises ``Image.DecompressionBombError`` for headers far beyond
+    ``Image.MAX_IMAGE_PIXELS``.
+    """
+    try:
+        with Image.open(io.BytesIO(head)) as image:
+            return image.size
+    except Image.DecompressionBombError:
+        raise
+    except Exception:
+        return None
+
+
+# ---------------- SPOOL ----------------
+class UploadSpool(io.RawIOBase):
+    """Seekable file that receives one uploaded file part.
+
+    Checks the header once HEAD_BYTES have arrived (or at the end of a
+    smaller part) and raises ``UploadRejected`` straight from ``write()``,
+    which stops the multipart parser before it reads any more of the body.
+    """
+
+    def __init__(self, allowed_formats, max_bytes, max_pixels, memory_bytes, spool_dir=None):
+        super().__init__()
+        self.allowed_formats = allowed_formats
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.memory_bytes = memory_bytes
+        self.spool_dir = spool_dir
+        self.format = None
+        self.size = None
+        self.bytes_received = 0
+        self._head = bytearray()
+        self._checked = False
+        self._file = io.BytesIO()
+        self._on_disk = False
+
+    # Werkzeug writes the part with write() and rewinds it with seek(0) at the end
+    def write(self, data):
+        self.bytes_received += len(data)
+        if self.max_bytes and self.bytes_received > self.max_bytes:
+            raise UploadRejected(f"File too large, the limit is {self.max_bytes // (1024 * 1024)}MB", 413)
+        if not self._checked:
+            self._head += data
+            if len(self._head) >= HEAD_BYTES:
+                self._check(final=False)
+
+        if not self._on_disk and self._file.tell() + len(data) > self.memory_bytes:
+            self._roll_over()
+        return self._file.write(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if not self._checked:
+            self._check(final=True)
+        return self._file.seek(offset, whence)
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def readinto(self, buffer):
+        return self._file.readinto(buffer)
+
+    def tell(self):
+        return self._file.tell()
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+        super().close()
+
+    def _roll_over(self):
+        disk = tempfile.TemporaryFile(dir=self.spool_dir)
+        disk.write(self._file.getbuffer())
+        self._file = disk
+        self._on_disk = True
+
+    def _check(self, final):
+        head = bytes(self._head)
+        if final and not head:
+            # An empty part (a form sent without choosing a file) is the
+            # view's to turn away
+            self._checked = True
+            return
+        self.format = sniff(head)
+        if self.format is None or self.format not in self.allowed_formats:
+            raise UploadRejected("Unsupported file format", 415)
+
+        if self.format in IMAGE_FORMATS:
+            try:
+                size = image_size(head)
+            except Image.DecompressionBombError:
+                raise UploadRejected(f"Image too large, the limit is {self.max_pixels // 1000000} megapixels", 413)
+            if size is None:
+                if not final and len(head) < MAX_HEAD_BYTES:
+                    return  # the header continues in the next chunk
+                raise UploadRejected("Invalid image file")
+            width, height = size
+            if self.max_pixels and width * height > self.max_pixels:
+                raise UploadRejected(
+                    f"Image too large: {width}x{height} pixels, the limit is {self.max_pixels // 1000000} megapixels",
+                    413
+                )
+            self.size = size
+
+        self._checked = True
+        self._head = bytearray()
+
+    @contextmanager
+    def buffer(self):
+        """Zero-copy view of the whole upload: the in-memory buffer, or a
+        read-only memory map of the spool file."""
+        if not self._on_disk:
+            view = self._file.getbuffer()
+            try:
+                yield view
+            finally:
+                view.release()
+            return
+
+        self._file.flush()
+        if not self.bytes_received:
+            yield b""
+            return
+        mapped = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mapped
+        finally:
+            mapped.close()
+
+
+class BufferReader(io.RawIOBase):
+    """Seekable read-only file over a buffer (bytes, a memoryview or a
+    memory map) for readers that want a file, like zipfile and Pillow,
+    without copying the buffer. Close it to release the buffer."""
+
+    def __init__(self, data):
+        super().__init__()
+        self._view = memoryview(data)
+        self._pos = 0
+
+    def readinto(self, buffer):
+        chunk = self._view[self._pos:self._pos + len(buffer)]
+        buffer[:len(chunk)] = chunk
+        self._pos += len(chunk)
+        return len(chunk)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def close(self):
+        if not self.closed:
+            # A memory map can't be closed while a view of it is alive
+            self._view.release()
+        super().close()
+
+
+@contextmanager
+def upload_buffer(file):
+    """Buffer of an uploaded ``FileStorage``, without copying it when possible."""
+    stream = file.stream
+    if isinstance(stream, UploadSpool):
+        with stream.buffer() as data:
+            yield data
+    else:
+        yield file.read()
+
+
+# ---------------- FLASK INTEGRATION ----------------
+class IngestRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        from flask import current_app
+
+        config = current_app.config
+        extensions = set(config.get("ALLOWED_EXTENSIONS", ())) | set(config.get("BATCH_EXTENSIONS", ()))
+        return UploadSpool(
+            allowed_formats={EXTENSION_FORMATS[ext] for ext in extensions if ext in EXTENSION_FORMATS},
+            max_bytes=config.get("MAX_CONTENT_LENGTH"),
+            max_pixels=config.get("MAX_IMAGE_PIXELS"),
+            memory_bytes=config.get("INGEST_SPOOL_MEMORY_BYTES", 1024 * 1024),
+            spool_dir=config.get("INGEST_SPOOL_DIR")
+        )
+
+
+def init_app(app):
+    app.request_class = IngestRequest
+
+    max_pixels = app.config.get("MAX_IMAGE_PIXELS")
+
+    def configure_pil(image):
+        # Decoders (PIL, and ocr_service.decode_image for pages inside archives)
+        # refuse images above the same limit
+        if max_pixels:
+            image.MAX_IMAGE_PIXELS = max_pixels
+        # Oversized images are rejected with an error, PIL's warning is just noise
+        warnings.simplefilter("ignore", image.DecompressionBombWarning)
+
+    # Pillow is imported on first use; configure it then
+    lazy.on_load("PIL.Image", configure_pil)
+
+    @app.errorhandler(UploadRejected)
+    def upload_rejected(e):
+        response = jsonify({"error": e.description})
+        response.status_code = e.code
+        # The rest of the body was never read; don't reuse the connection
+        response.headers["Connection"] = "close"
+        return response
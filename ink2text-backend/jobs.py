@@ -0,0 +1,365 @@
+"""
+Background OCR Jobs for Ink2Text
+Uploads are queued and processed by dispatcher threads so the HTTP request
+can return a job ID straight away. Two brokers are available:
+
+- "memory": in-process queue, jobs are lost on restart
+- "sqlite": local SQLite file, a stand-in for a real broker that keeps
+  queued jobs across restarts
+
+A finished job can be POSTed to a callback URL. Callbacks go only to hosts
+in JOB_CALLBACK_HOSTS or, without that list, to public addresses, so a
+client can't make the server send OCR text into its own network.
+"""
+
+import ipaddress
+import json
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+import urllib.parse
+import urllib.request
+import uuid
+
+
+class JobQueueFullError(Exception):
+    """Raised when the broker already holds the maximum number of queued jobs."""
+
+
+class CallbackURLError(ValueError):
+    """Raised for a callback URL the server won't send results to."""
+
+
+def check_callback_url(url, allowed_hosts=()):
+    """Raise CallbackURLError unless ``url`` is an http(s) URL whose host is
+    in ``allowed_hosts`` or, when that is empty, resolves only to public
+    addresses."""
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise CallbackURLError("callback_url must be an http(s) URL")
+    host = parts.hostname.lower()
+    if allowed_hosts:
+        if host not in allowed_hosts:
+            raise CallbackURLError(f"callback_url host {host} is not allowed")
+        return
+
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, parts.port or 443, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError, ValueError):
+        raise CallbackURLError(f"callback_url host {host} can't be resolved")
+    for address in addresses:
+        # Scoped IPv6 addresses look like fe80::1%eth0
+        if not ipaddress.ip_address(address.split("%")[0]).is_global:
+            raise CallbackURLError("callback_url must point to a public address")
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # A redirect could lead the callback to an address that was never checked
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+_callback_opener = urllib.request.build_opener(_NoRedirect)
+
+
+# ---------------- BROKERS ----------------
+class MemoryBroker:
+    def __init__(self, maxsize):
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def enqueue(self, job, payload):
+        with self._lock:
+            self._jobs[job["job_id"]] = job
+        try:
+            self._queue.put_nowait((job["job_id"], payload))
+        except queue.Full:
+            with self._lock:
+                self._jobs.pop(job["job_id"], None)
+            raise JobQueueFullError("OCR job queue is full, try again shortly")
+
+    def dequeue(self, timeout):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def prune(self, older_than):
+        with self._lock:
+            for job_id, job in list(self._jobs.items()):
+                if job["finished_at"] and job["finished_at"] < older_than:
+                    del self._jobs[job_id]
+
+
+class SQLiteBroker:
+    POLL_INTERVAL = 0.2
+
+    def __init__(self, path, maxsize):
+        self.path = path
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = self._connect()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    job TEXT NOT NULL,
+                    payload BLOB,
+                    created_at REAL NOT NULL,
+                    finished_at REAL
+                )
+            """)
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            if "finished_at" not in columns:
+                # Broker files from before finished jobs were pruned by finish time
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN finished_at REAL")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs (status, created_at)")
+            # Jobs that were running when the process died go back on the queue
+            self._conn.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def reconnect(self):
+        """Open a connection of this process's own; a SQLite connection
+        must not be used on both sides of a fork."""
+        with self._lock:
+            self._conn = self._connect()
+
+    def enqueue(self, job, payload):
+        with self._lock:
+            queued = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= self.maxsize:
+                raise JobQueueFullError("OCR job queue is full, try again shortly")
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, status, job, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job["job_id"], job["status"], json.dumps(job), _pack(payload), job["created_at"])
+            )
+
+    def dequeue(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT job_id, payload FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row:
+                    claimed = self._conn.execute(
+                        "UPDATE jobs SET status = 'running' WHERE job_id = ? AND status = 'queued'",
+                        (row["job_id"],)
+                    ).rowcount
+                    if claimed:
+                        return row["job_id"], _unpack(row["payload"])
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(self.POLL_INTERVAL)
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            row = self._conn.execute("SELECT job FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if not row:
+                return
+            job = json.loads(row["job"])
+            job.update(fields)
+            # Finished jobs don't need their upload any more
+            clear_payload = job["status"] in ("done", "failed")
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, job = ?, finished_at = ?" + (", payload = NULL" if clear_payload else "") + " WHERE job_id = ?",
+                (job["status"], json.dumps(job), job.get("finished_at"), job_id)
+            )
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute("SELECT job FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row["job"]) if row else None
+
+    def depth(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+
+    def prune(self, older_than):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND COALESCE(finished_at, created_at) < ?",
+                (older_than,)
+            )
+
+
+def _pack(payload):
+    meta = {k: v for k, v in payload.items() if k != "data"}
+    header = json.dumps(meta).encode("utf-8")
+    return len(header).to_bytes(4, "big") + header + payload.get("data", b"")
+
+
+def _unpack(blob):
+    size = int.from_bytes(blob[:4], "big")
+    payload = json.loads(blob[4:4 + size].decode("utf-8"))
+    payload["data"] = bytes(blob[4 + size:])
+    return payload
+
+
+# ---------------- JOB QUEUE ----------------
+class JobQueue:
+    """Flask extension that owns the broker and the dispatcher threads."""
+
+    def __init__(self, app=None, handler=None):
+        self.app = None
+        self.handler = None
+        self.broker = None
+        self.workers = 2
+        self.result_ttl = 3600
+        self.callback_hosts = set()
+        self._threads = []
+        self._pid = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, handler)
+
+    def init_app(self, app, handler):
+        self.app = app
+        self.handler = handler
+        self.workers = app.config.get("JOB_WORKERS", self.workers)
+        self.result_ttl = app.config.get("JOB_RESULT_TTL", self.result_ttl)
+        self.callback_hosts = {
+            host.strip().lower() for host in app.config.get("JOB_CALLBACK_HOSTS", "").split(",") if host.strip()
+        }
+
+        maxsize = app.config.get("JOB_QUEUE_SIZE", 100)
+        if app.config.get("JOB_BROKER", "memory") == "sqlite":
+            path = app.config.get("JOB_BROKER_PATH") or os.path.join(app.instance_path, "jobs.db")
+            self.broker = SQLiteBroker(path, maxsize)
+        else:
+            self.broker = MemoryBroker(maxsize)
+
+        app.extensions["job_queue"] = self
+
+        @app.before_request
+        def start_dispatchers():
+            # Jobs left queued by a previous run are picked up without
+            # waiting for a new submit; servers call start() up front
+            self.start()
+
+    def check_callback(self, url):
+        """Raise CallbackURLError if job results may not be sent to ``url``."""
+        check_callback_url(url, self.callback_hosts)
+
+    def submit(self, payload, callback_url=None, owner=None):
+        """Queue a job for user ``owner`` and return its initial status record."""
+        self.start()
+        self.broker.prune(time.time() - self.result_ttl)
+
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "status": "queued",
+            "user_id": owner,
+            "callback_url": callback_url,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None
+        }
+        self.broker.enqueue(job, payload)
+        return job
+
+    def get(self, job_id):
+        return self.broker.get(job_id)
+
+    def after_fork(self):
+        """Call in a server worker forked from the process that created the app."""
+        if isinstance(self.broker, SQLiteBroker):
+            self.broker.reconnect()
+        self.start()
+
+    def start(self):
+        """Start this process's dispatcher threads unless they are running."""
+        with self._lock:
+            # After a fork the threads belong to the parent process
+            if self._threads and self._pid == os.getpid():
+                return
+            self._threads = []
+            self._pid = os.getpid()
+            self._stop.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"ocr-job-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def shutdown(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def _run(self):
+        while not self._stop.is_set():
+            item = self.broker.dequeue(timeout=1)
+            if item is None:
+                continue
+
+            job_id, payload = item
+            self.broker.update(job_id, status="running", started_at=time.time())
+
+            with self.app.app_context():
+                try:
+                    result = self.handler(payload)
+                    self.broker.update(job_id, status="done", result=result, finished_at=time.time())
+                except Exception as e:
+                    print(f"❌ OCR job {job_id} failed: {str(e)}")
+                    self.broker.update(job_id, status="failed", error=str(e), finished_at=time.time())
+
+            job = self.broker.get(job_id)
+            if job and job.get("callback_url"):
+                self._notify(job)
+
+    def _notify(self, job):
+        body = json.dumps(public_job(job)).encode("utf-8")
+        req = urllib.request.Request(
+            job["callback_url"],
+            data=body,
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        try:
+            # Again at send time: DNS may point somewhere else by now
+            self.check_callback(job["callback_url"])
+            _callback_opener.open(req, timeout=10).close()
+        except Exception as e:
+            print(f"⚠️  Callback for job {job['job_id']} failed: {str(e)}")
+
+
+def public_job(job):
+    """Job fields safe to return to clients."""
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "created_at": job["created_at"],
+        "started_at": job["started_at"],
+        "finished_at": job["finished_at"],
+        "result": job["result"],
+        "error": job["error"]
+    }
@@ -0,0 +1,75 @@
+"""
+Lazy Imports for Ink2Text
+OpenCV, NumPy, Pillow and pytesseract make up most of the app's import
+time but are only needed once there is an image to read. Modules refer to
+them through a LazyModule, which imports the real module the first time
+one of its attributes is used. load() imports them ahead of time, e.g.
+while the app warms up (see readiness.py) or when an OCR worker starts.
+"""
+
+import importlib
+import threading
+
+_modules = {}
+_hooks = {}
+# Reentrant: a hook may use other lazy modules
+_lock = threading.RLock()
+
+
+class LazyModule:
+    """Stands in for a module until one of its attributes is used."""
+
+    __slots__ = ("_name", "_module")
+
+    def __init__(self, name):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_module", None)
+
+    def _load(self):
+        if self._module is None:
+            with _lock:
+                if self._module is None:
+                    module = importlib.import_module(self._name)
+                    for hook in _hooks.pop(self._name, ()):
+                        hook(module)
+                    object.__setattr__(self, "_module", module)
+        return self._module
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def module(name):
+    """The shared LazyModule for ``name``."""
+    with _lock:
+        if name not in _modules:
+            _modules[name] = LazyModule(name)
+        return _modules[name]
+
+
+def on_load(name, hook):
+    """Call ``hook(module)`` when ``name`` is first loaded through its
+    LazyModule, or right away if it already has been."""
+    with _lock:
+        lazy = module(name)
+        if lazy._module is None:
+            _hooks.setdefault(name, []).append(hook)
+            return
+    hook(lazy._module)
+
+
+def load(*names):
+    """Import these modules now instead of on first use."""
+    for name in names:
+        module(name)._load()
+
+
+def loaded(name):
+    return name in _modules and _modules[name]._module is not None
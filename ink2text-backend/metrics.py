@@ -0,0 +1,221 @@
+"""
+Metrics for Ink2Text
+A small Prometheus-compatible registry (counters, histograms and gauges)
+served as text from /metrics, plus per-stage timing helpers for the OCR
+pipeline. Values are per process; with several server workers, scrape
+each worker or put them behind a per-worker port.
+"""
+
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+timing_log = logging.getLogger("ink2text.timing")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+MEGAPIXEL_BUCKETS = (0.1, 0.5, 1, 2, 4, 8, 12, 16, 24, 48)
+BYTES_BUCKETS = (64e3, 256e3, 1e6, 2e6, 4e6, 8e6, 16e6)
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            series = self._values.setdefault(key, {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        bucket_labels = self.labels + ("le",)
+        with self._lock:
+            for key, series in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, series["buckets"]):
+                    lines.append(f"{self.name}_bucket{_labels(bucket_labels, key + (bound,))} {count}")
+                lines.append(f"{self.name}_bucket{_labels(bucket_labels, key + ('+Inf',))} {series['count']}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, key)} {series['sum']}")
+                lines.append(f"{self.name}_count{_labels(self.labels, key)} {series['count']}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose value is read from a callback at scrape time."""
+
+    def __init__(self, name, help, callback):
+        self.name, self.help, self.callback = name, help, callback
+
+    def render(self):
+        try:
+            value = self.callback()
+        except Exception:
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {value}"]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        # Re-registering a name (e.g. create_app() called twice) replaces it
+        self._metrics = [m for m in self._metrics if m.name != metric.name]
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUESTS = registry.register(Counter(
+    "ink2text_http_requests_total", "HTTP requests by endpoint and status",
+    labels=("method", "endpoint", "status")
+))
+REQUEST_SECONDS = registry.register(Histogram(
+    "ink2text_http_request_duration_seconds", "HTTP request latency",
+    labels=("method", "endpoint")
+))
+STAGE_SECONDS = registry.register(Histogram(
+    "ink2text_ocr_stage_duration_seconds", "Time spent in each OCR pipeline stage",
+    labels=("stage",)
+))
+IMAGE_MEGAPIXELS = registry.register(Histogram(
+    "ink2text_ocr_image_megapixels", "Decoded upload size in megapixels", buckets=MEGAPIXEL_BUCKETS
+))
+UPLOAD_BYTES = registry.register(Histogram(
+    "ink2text_ocr_upload_bytes", "Upload size in bytes", buckets=BYTES_BUCKETS
+))
+RATE_LIMITED = registry.register(Counter(
+    "ink2text_rate_limited_total", "Requests rejected by the rate limiter", labels=("endpoint",)
+))
+
+
+# ---------------- STAGE TIMING ----------------
+@contextmanager
+def stage(name, timings=None):
+    """Time a block as OCR stage ``name``; optionally record ms into ``timings``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        if timings is not None:
+            timings[name] = round(elapsed * 1000, 2)
+
+
+def record_stages(timings):
+    """Record stage timings (in ms) measured elsewhere, e.g. in an OCR worker."""
+    for name, ms in timings.items():
+        STAGE_SECONDS.observe(ms / 1000, stage=name)
+
+
+def record_image(upload_bytes, gray):
+    UPLOAD_BYTES.observe(upload_bytes)
+    IMAGE_MEGAPIXELS.observe(gray.shape[0] * gray.shape[1] / 1e6)
+
+
+def log_timings(event, timings, **fields):
+    """One structured (JSON) log line with the stage breakdown of a request."""
+    if timing_log.isEnabledFor(logging.INFO):
+        timing_log.info(json.dumps({"event": event, **fields, "timings_ms": timings}, default=str))
+
+
+# ---------------- FLASK INTEGRATION ----------------
+def init_app(app, ocr_pool, ocr_cache, job_queue):
+    from flask import g, request
+
+    if app.config.get("TIMING_LOG", True) and not timing_log.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        timing_log.addHandler(handler)
+        timing_log.setLevel(logging.INFO)
+        timing_log.propagate = False
+
+    registry.register(Gauge(
+        "ink2text_ocr_pool_in_flight", "OCR jobs queued or running in the worker pool",
+        lambda: ocr_pool.in_flight
+    ))
+    registry.register(Gauge(
+        "ink2text_ocr_pool_capacity", "Maximum OCR jobs the worker pool accepts",
+        lambda: ocr_pool.queue_size
+    ))
+    for lane in ("interactive", "batch"):
+        registry.register(Gauge(
+            f"ink2text_ocr_scheduler_waiting_{lane}", f"OCR jobs in the {lane} lane waiting for a worker",
+            lambda lane=lane: ocr_pool.waiting(lane)
+        ))
+    registry.register(Gauge(
+        "ink2text_job_queue_depth", "Async OCR jobs waiting to be picked up",
+        lambda: job_queue.broker.depth()
+    ))
+    for counter in ("memory_hits", "db_hits", "misses", "evictions"):
+        registry.register(Gauge(
+            f"ink2text_ocr_cache_{counter}", f"OCR cache {counter.replace('_', ' ')} since start",
+            lambda counter=counter: ocr_cache.counters[counter]
+        ))
+    registry.register(Gauge(
+        "ink2text_ocr_cache_hit_ratio", "OCR cache hit ratio since start",
+        lambda: ocr_cache.stats()["hit_rate"]
+    ))
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop("request_start", None)
+        if start is not None:
+            endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+            REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method, endpoint=endpoint)
+            REQUESTS.inc(method=request.method, endpoint=endpoint, status=response.status_code)
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return registry.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
@@ -1,14 +1,58 @@
 from extensions import db
 from datetime import datetime
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class User(db.Model):
+    __tablename__ = "users"
+
+    user_id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    email = db.Column(db.String(255), unique=True, nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Bumped whenever the user's documents change; history ETags are built from it
+    history_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    history_updated_at = db.Column(db.DateTime)
+    # Access tokens issued before this are revoked (see auth.py)
+    tokens_valid_after = db.Column(db.DateTime)
+
+    documents = db.relationship("Document", backref="user", lazy=True)
+
+    def set_password(self, password):
+        self.password_hash = generate_password_hash(password)
+
+    def check_password(self, password):
+        return check_password_hash(self.password_hash, password)
+
+    def to_dict(self):
+        return {
+            "user_id": self.user_id,
+            "name": self.name,
+            "email": self.email,
+            "created_at": self.created_at.strftime("%Y-%m-%d %H:%M:%S") if self.created_at else None
+        }
+
 
 class Document(db.Model):
     __tablename__ = "documents"
+    __table_args__ = (
+        # Serves the per-user history listing and its keyset pagination
+        db.Index("ix_documents_user_uploaded", "user_id", "uploaded_at", "document_id"),
+    )
 
     document_id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.user_id"), nullable=True)
     file_name = db.Column(db.String(255), nullable=False)
+    image_hash = db.Column(db.String(64), index=True)
+    # Digests in the blob store (blobstore.py); NULL for documents saved before it
+    original_blob = db.Column(db.String(64))
+    thumbnail_blob = db.Column(db.String(64))
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    ocr_texts = db.relationship("OCRText", backref="document", lazy=True)
+    ocr_texts = db.relationship("OCRText", backref="document", lazy=True, cascade="all, delete-orphan")
+    layout = db.relationship("OCRLayout", uselist=False, lazy=True, cascade="all, delete-orphan")
+    revisions = db.relationship("OCRRevision", lazy=True, cascade="all, delete-orphan")
 
 
 class OCRText(db.Model):
@@ -18,7 +62,119 @@ class OCRText(db.Model):
     document_id = db.Column(
         db.Integer,
         db.ForeignKey("documents.document_id"),
-        nullable=False
+        nullable=False,
+        index=True
     )
+    # Deferred: listings and joins never load the text unless asked for it.
+    # Compressed text (see textcodec.py) is in text_data, with extracted_text
+    # left empty; read and write both through .text
+    extracted_text = db.deferred(db.Column(db.Text, nullable=False), group="text")
+    text_data = db.deferred(db.Column(db.LargeBinary), group="text")
+    confidence_score = db.Column(db.Float)
+    passes = db.Column(db.JSON)  # adaptive OCR passes taken, see adaptive.py
+
+    @property
+    def text(self):
+        from extensions import text_codec
+        return text_codec.decode(self.extracted_text, self.text_data)
+
+    @text.setter
+    def text(self, value):
+        from extensions import text_codec
+        self.extracted_text, self.text_data = text_codec.encode(value)
+
+
+class TextDictionary(db.Model):
+    """Compression dictionary for OCR text, see textcodec.py. Kept as long
+    as any text compressed with it may exist."""
+    __tablename__ = "text_dictionaries"
+
+    dict_id = db.Column(db.Integer, primary_key=True)
+    codec = db.Column(db.String(16), nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+    samples = db.Column(db.Integer)  # texts it was trained on
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class OCRLayout(db.Model):
+    """Word boxes and confidences of a document, packed by ocr_layout.pack()."""
+    __tablename__ = "ocr_layout"
+
+    document_id = db.Column(db.Integer, db.ForeignKey("documents.document_id"), primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)
+
+
+class ReprocessRun(db.Model):
+    """One re-OCR pass over stored documents, see reprocess.py."""
+    __tablename__ = "reprocess_runs"
+
+    run_id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(16), nullable=False, default="pending")
+    settings = db.Column(db.JSON, nullable=False)  # lang, preprocess, mode and Tesseract version
+    user_id = db.Column(db.Integer, db.ForeignKey("users.user_id"), nullable=True)  # only this user's documents
+    checkpoint = db.Column(db.Integer, nullable=False, default=0)  # highest document_id done
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    skipped = db.Column(db.Integer, nullable=False, default=0)  # no stored original to re-read
+    failed = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    swapped_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            "run_id": self.run_id,
+            "status": self.status,
+            "settings": self.settings,
+            "user_id": self.user_id,
+            "checkpoint": self.checkpoint,
+            "processed": self.processed,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "last_error": self.last_error,
+            "created_at": self.created_at.strftime("%Y-%m-%d %H:%M:%S") if self.created_at else None,
+            "finished_at": self.finished_at.strftime("%Y-%m-%d %H:%M:%S") if self.finished_at else None,
+            "swapped_at": self.swapped_at.strftime("%Y-%m-%d %H:%M:%S") if self.swapped_at else None
+        }
+
+
+class OCRRevision(db.Model):
+    """A document's text from a reprocessing run, kept next to the live
+    OCRText until the run is swapped in. After the swap it holds the
+    previous text instead, so the swap can be reverted."""
+    __tablename__ = "ocr_revisions"
+
+    run_id = db.Column(db.Integer, db.ForeignKey("reprocess_runs.run_id"), primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey("documents.document_id"), primary_key=True, index=True)
     extracted_text = db.Column(db.Text, nullable=False)
     confidence_score = db.Column(db.Float)
+    passes = db.Column(db.JSON)
+    layout = db.Column(db.LargeBinary)
+    swapped = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class OCRCacheEntry(db.Model):
+    __tablename__ = "ocr_cache"
+
+    cache_key = db.Column(db.String(64), primary_key=True)
+    extracted_text = db.Column(db.Text, nullable=False)
+    confidence = db.Column(db.Float)
+    layout = db.Column(db.LargeBinary)
+    passes = db.Column(db.JSON)
+    size_bytes = db.Column(db.Integer, nullable=False)
+    hits = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_hit_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class RevokedToken(db.Model):
+    """An access token revoked before it expired, e.g. by logging out.
+    Processes reload new rows every AUTH_REVOCATION_REFRESH seconds."""
+    __tablename__ = "revoked_tokens"
+
+    jti = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.user_id"), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    revoked_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
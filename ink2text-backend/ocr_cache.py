@@ -0,0 +1,197 @@
+"""
+OCR Result Cache for Ink2Text
+Results are keyed by a hash of the decoded image plus the OCR settings, so
+re-uploading the same scan skips Tesseract entirely. Two tiers:
+
+- memory: per-process LRU bounded by the total size of cached results
+- database: the ocr_cache table, shared by all processes, bounded by row count
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from ocr_layout import OCRResult
+
+
+def image_hash(gray):
+    """Content hash of a decoded image (pixels and shape)."""
+    digest = hashlib.blake2b(digest_size=32)
+    digest.update(str(gray.shape).encode("ascii"))
+    digest.update(gray.tobytes())
+    return digest.hexdigest()
+
+
+class OCRCache:
+    # Check the database tier's size once every this many inserts
+    PRUNE_EVERY = 100
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.max_bytes = 64 * 1024 * 1024
+        self.db_max_entries = 100000
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._inserts = 0
+        self.counters = {"memory_hits": 0, "db_hits": 0, "misses": 0, "evictions": 0}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get("OCR_CACHE_ENABLED", self.enabled)
+        self.max_bytes = app.config.get("OCR_CACHE_MEMORY_BYTES", self.max_bytes)
+        self.db_max_entries = app.config.get("OCR_CACHE_DB_MAX_ENTRIES", self.db_max_entries)
+        app.extensions["ocr_cache"] = self
+
+    @staticmethod
+    def key(image_digest, **params):
+        """Cache key for an image hash and the settings used to OCR it."""
+        settings = json.dumps(params, sort_keys=True, separators=(",", ":"))
+        return hashlib.blake2b(f"{image_digest}|{settings}".encode("utf-8"), digest_size=32).hexdigest()
+
+    def get(self, key):
+        """Cached ``OCRResult`` for ``key``, or None."""
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return self._entries[key]
+
+        result = self._db_get(key)
+        with self._lock:
+            if result is None:
+                self.counters["misses"] += 1
+            else:
+                self.counters["db_hits"] += 1
+        if result is not None:
+            self._remember(key, result)
+        return result
+
+    def put(self, key, result):
+        if not self.enabled:
+            return
+        self._remember(key, result)
+        self._db_put(key, result)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.counters["memory_hits"] + self.counters["db_hits"] + self.counters["misses"]
+            hits = self.counters["memory_hits"] + self.counters["db_hits"]
+            return {
+                **self.counters,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._entries),
+                "memory_bytes": self._bytes,
+                "memory_max_bytes": self.max_bytes
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    # ---------------- MEMORY TIER ----------------
+    @staticmethod
+    def _size(result):
+        return len(result.text.encode("utf-8")) + len(result.layout or b"")
+
+    def _remember(self, key, result):
+        size = self._size(result)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = result
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= self._size(evicted)
+                self.counters["evictions"] += 1
+
+    # ---------------- DATABASE TIER ----------------
+    def _db_get(self, key):
+        from extensions import db
+        from models import OCRCacheEntry
+
+        table = OCRCacheEntry.__table__
+        try:
+            with db.engine.begin() as conn:
+                row = conn.execute(
+                    table.select()
+                    .with_only_columns(
+                        table.c.extracted_text, table.c.confidence, table.c.layout, table.c.passes
+                    )
+                    .where(table.c.cache_key == key)
+                ).first()
+                if row is None:
+                    return None
+                conn.execute(
+                    table.update()
+                    .where(table.c.cache_key == key)
+                    .values(hits=table.c.hits + 1, last_hit_at=datetime.utcnow())
+                )
+                return OCRResult(row.extracted_text, row.confidence, row.layout, row.passes)
+        except Exception as e:
+            print(f"⚠️  OCR cache lookup failed: {str(e)}")
+            return None
+
+    def _db_put(self, key, result):
+        from extensions import db
+        from models import OCRCacheEntry
+
+        table = OCRCacheEntry.__table__
+        now = datetime.utcnow()
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(table.insert().values(
+                    cache_key=key,
+                    extracted_text=result.text,
+                    confidence=result.confidence,
+                    layout=result.layout,
+                    passes=result.passes,
+                    size_bytes=self._size(result),
+                    hits=0,
+                    created_at=now,
+                    last_hit_at=now
+                ))
+        except Exception:
+            # Another request cached the same image first
+            return
+
+        with self._lock:
+            self._inserts += 1
+            prune = self._inserts % self.PRUNE_EVERY == 0
+        if prune:
+            self._db_prune()
+
+    def _db_prune(self):
+        from extensions import db
+        from models import OCRCacheEntry
+
+        table = OCRCacheEntry.__table__
+        try:
+            with db.engine.begin() as conn:
+                total = conn.execute(db.select(db.func.count()).select_from(table)).scalar()
+                excess = total - self.db_max_entries
+                if excess <= 0:
+                    return
+                oldest = (
+                    db.select(table.c.cache_key)
+                    .order_by(table.c.last_hit_at.asc())
+                    .limit(excess)
+                    .scalar_subquery()
+                )
+                conn.execute(table.delete().where(table.c.cache_key.in_(oldest)))
+                with self._lock:
+                    self.counters["evictions"] += excess
+        except Exception as e:
+            print(f"⚠️  OCR cache prune failed: {str(e)}")
@@ -0,0 +1,151 @@
+"""
+OCR Layout for Ink2Text
+Word boxes and confidences from Tesseract's TSV output. Words are kept
+column-wise (one list per field) and stored as a single compressed blob per
+document rather than one database row per word.
+"""
+
+import struct
+import zlib
+from collections import namedtuple
+
+import lazy
+
+np = lazy.module("numpy")
+
+# What the OCR pipeline produces for one image; ``layout`` is a packed blob
+# and ``passes`` the adaptive passes taken (None in standard mode)
+OCRResult = namedtuple("OCRResult", "text confidence layout passes", defaults=(None,))
+
+# Integer columns, in blob order. ``par`` and ``line`` number paragraphs and
+# lines across the whole page (Tesseract restarts them in every block).
+INT_COLUMNS = ("left", "top", "width", "height", "conf", "par", "line")
+
+_MAGIC = b"IL1"
+
+
+def from_tsv(tsv):
+    """Parse ``tesseract ... tsv`` output into columns of recognised words.
+
+    Tesseract reports confidence per word on a 0-100 scale, -1 when it has
+    none; the values are rounded to whole numbers.
+    """
+    words = {name: [] for name in INT_COLUMNS + ("text",)}
+    rows = tsv.splitlines()
+    if not rows:
+        return words
+
+    header = rows[0].split("\t")
+    index = {name: i for i, name in enumerate(header)}
+    pars, lines = {}, {}
+    for row in rows[1:]:
+        fields = row.split("\t")
+        if len(fields) < len(header) or fields[index["level"]] != "5":
+            continue
+        text = fields[index["text"]].strip()
+        if not text:
+            continue
+
+        block, par, line = (int(fields[index[name]]) for name in ("block_num", "par_num", "line_num"))
+        words["par"].append(pars.setdefault((block, par), len(pars)))
+        words["line"].append(lines.setdefault((block, par, line), len(lines)))
+        for name in ("left", "top", "width", "height"):
+            words[name].append(int(fields[index[name]]))
+        words["conf"].append(int(round(float(fields[index["conf"]]))))
+        words["text"].append(text)
+    return words
+
+
+def to_text(words):
+    """Rebuild plain text: words joined by spaces, lines by newlines and
+    paragraphs by blank lines, as Tesseract's own text output does."""
+    parts = []
+    for i, word in enumerate(words["text"]):
+        if i:
+            if words["par"][i] != words["par"][i - 1]:
+                parts.append("\n\n")
+            elif words["line"][i] != words["line"][i - 1]:
+                parts.append("\n")
+            else:
+                parts.append(" ")
+        parts.append(word)
+    return "".join(parts) + ("\n" if parts else "")
+
+
+def confidence(words):
+    """Document confidence in 0-1: the mean word confidence weighted by word
+    length. ``None`` when Tesseract recognised nothing it could score."""
+    scored = [(conf, len(text)) for conf, text in zip(words["conf"], words["text"]) if conf >= 0]
+    if not scored:
+        return None
+    total = sum(length for _, length in scored)
+    return round(sum(conf * length for conf, length in scored) / total / 100, 4)
+
+
+def lines(words):
+    """Group words into lines: one bounding box, text and confidence each."""
+    grouped = {name: [] for name in ("left", "top", "width", "height", "conf", "text")}
+    i, count = 0, len(words["text"])
+    while i < count:
+        j = i
+        while j < count and words["line"][j] == words["line"][i]:
+            j += 1
+        line = {name: words[name][i:j] for name in INT_COLUMNS + ("text",)}
+        left = min(line["left"])
+        top = min(line["top"])
+        grouped["left"].append(left)
+        grouped["top"].append(top)
+        grouped["width"].append(max(l + w for l, w in zip(line["left"], line["width"])) - left)
+        grouped["height"].append(max(t + h for t, h in zip(line["top"], line["height"])) - top)
+        score = confidence(line)
+        grouped["conf"].append(-1 if score is None else int(round(score * 100)))
+        grouped["text"].append(" ".join(line["text"]))
+        i = j
+    return grouped
+
+
+def concat(parts):
+    """Join the word columns of page regions, given as ``(words, left, top)``
+    with the region's offset in the page, into one set of columns."""
+    joined = {name: [] for name in INT_COLUMNS + ("text",)}
+    for words, left, top in parts:
+        # Keep paragraph and line numbers unique across regions
+        par_base = max(joined["par"], default=-1) + 1
+        line_base = max(joined["line"], default=-1) + 1
+        joined["left"].extend(value + left for value in words["left"])
+        joined["top"].extend(value + top for value in words["top"])
+        joined["par"].extend(value + par_base for value in words["par"])
+        joined["line"].extend(value + line_base for value in words["line"])
+        for name in ("width", "height", "conf", "text"):
+            joined[name].extend(words[name])
+    return joined
+
+
+def select(columns, indices):
+    return {name: [values[i] for i in indices] for name, values in columns.items()}
+
+
+# ---------------- STORAGE ----------------
+def pack(words):
+    """Compress word columns into one blob: the integer columns as int32
+    arrays followed by the newline-separated words, zlib-compressed."""
+    count = len(words["text"])
+    ints = np.array([words[name] for name in INT_COLUMNS], dtype="<i4").reshape(len(INT_COLUMNS), count)
+    body = struct.pack("<I", count) + ints.tobytes() + "\n".join(words["text"]).encode("utf-8")
+    return _MAGIC + zlib.compress(body, 6)
+
+
+def unpack(blob):
+    if not blob or blob[:len(_MAGIC)] != _MAGIC:
+        raise ValueError("Not a packed OCR layout")
+    body = zlib.decompress(blob[len(_MAGIC):])
+    (count,) = struct.unpack_from("<I", body)
+    size = len(INT_COLUMNS) * count * 4
+    ints = np.frombuffer(body, dtype="<i4", count=len(INT_COLUMNS) * count, offset=4)
+    ints = ints.reshape(len(INT_COLUMNS), count)
+
+    words = {name: ints[i].tolist() for i, name in enumerate(INT_COLUMNS)}
+    text = body[4 + size:].decode("utf-8")
+    words["text"] = text.split("\n") if count else []
+    return words
+
@@ -0,0 +1,374 @@
+"""
+OCR Worker Pool for Ink2Text
+Keeps a set of long-lived OCR worker processes so requests don't pay for
+process start-up and language data loading on every upload.
+"""
+
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+import adaptive
+import lazy
+import ocr_layout
+import preprocess
+from scheduler import FairScheduler, INTERACTIVE, BATCH, parse_weights
+
+cv2 = lazy.module("cv2")
+pytesseract = lazy.module("pytesseract")
+
+log = logging.getLogger("ink2text.ocr_pool")
+
+
+class PoolBusyError(Exception):
+    """Raised when the pool already has the maximum number of queued jobs."""
+
+
+class OCRTimeoutError(Exception):
+    """Raised when an OCR job does not finish within the configured timeout."""
+
+
+def _remaining(deadline):
+    """Seconds left until ``deadline`` (time.monotonic()), None without one.
+    Raises OCRTimeoutError once it has passed."""
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise OCRTimeoutError("OCR ran out of time")
+    return remaining
+
+
+# ---------------- WORKER PROCESS ----------------
+# State below lives inside each worker process, not in the Flask process.
+_engine = None
+_engine_lang = None
+
+
+def _init_worker(lang, tesseract_cmd, nice=0):
+    """Runs once per worker process: point pytesseract at the binary and
+    load the language data up front when tesserocr is available."""
+    global _engine, _engine_lang
+
+    if nice and hasattr(os, "nice"):
+        # Background pools (e.g. reprocessing) yield the CPU to live OCR
+        os.nice(nice)
+    # Import the OCR stack while the worker starts, not during its first job
+    lazy.load("numpy", "cv2", "pytesseract")
+    if tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+
+    try:
+        import tesserocr
+        _engine = tesserocr.PyTessBaseAPI(lang=lang)
+        _engine_lang = lang
+    except Exception:
+        # tesserocr is optional; fall back to the pytesseract CLI wrapper
+        _engine = None
+
+
+def _ping():
+    return os.getpid()
+
+
+def _engine_options(config):
+    """Split a config made only of ``--psm N`` and ``-c name=value`` into
+    ``(psm, variables)`` for tesserocr; None if it has anything else."""
+    tokens = config.split()
+    psm, variables = None, {}
+    while tokens:
+        option = tokens.pop(0)
+        if option not in ("--psm", "-c") or not tokens:
+            return None
+        value = tokens.pop(0)
+        if option == "--psm" and value.isdigit():
+            psm = int(value)
+        elif option == "-c" and "=" in value:
+            name, _, setting = value.partition("=")
+            variables[name] = setting
+        else:
+            return None
+    return psm, variables
+
+
+def _engine_read(gray, psm, variables, timeout=None):
+    height, width = gray.shape[:2]
+    previous_psm = _engine.GetPageSegMode()
+    previous = {name: _engine.GetVariableAsString(name) for name in variables}
+    try:
+        if psm is not None:
+            _engine.SetPageSegMode(psm)
+        for name, value in variables.items():
+            _engine.SetVariable(name, value)
+        # Hand the raw 8-bit buffer straight to the engine, no re-encoding
+        _engine.SetImageBytes(gray.tobytes(), width, height, 1, width)
+        # Tesseract checks the time limit (in ms) while it recognizes
+        if not _engine.Recognize(int(timeout * 1000) if timeout else 0):
+            raise OCRTimeoutError(f"Tesseract did not finish within {timeout:.1f}s" if timeout else "Tesseract failed")
+        return _engine.GetUTF8Text(), _engine.GetTSVText(0)
+    finally:
+        _engine.SetPageSegMode(previous_psm)
+        for name, value in previous.items():
+            if value is not None:
+                _engine.SetVariable(name, value)
+
+
+def _recognize(gray, lang, config, deadline=None):
+    """Run Tesseract once; returns ``(text, tsv)``. ``text`` is None when
+    only the TSV was produced and the text has to be rebuilt from it.
+
+    Tesseract is stopped at ``deadline`` (OCRTimeoutError), so a page it
+    hangs on frees its worker; cancelling the job's future can't do that
+    once it runs.
+    """
+    timeout = _remaining(deadline)
+    options = _engine_options(config) if _engine is not None and lang == _engine_lang else None
+    if options is not None:
+        return _engine_read(gray, *options, timeout)
+
+    # pytesseract would PNG-encode the array; an uncompressed PGM is
+    # written at memory speed and read by Tesseract just as well
+    fd, path = tempfile.mkstemp(suffix=".pgm")
+    os.close(fd)
+    try:
+        cv2.imwrite(path, gray)
+        # pytesseract kills the tesseract process after ``timeout`` seconds
+        return None, pytesseract.image_to_data(path, lang=lang, config=config, timeout=timeout or 0)
+    except RuntimeError as e:
+        if str(e) != "Tesseract process timeout":
+            raise
+        raise OCRTimeoutError(f"Tesseract did not finish within {timeout:.1f}s")
+    finally:
+        os.remove(path)
+
+
+def _deadline(time_limit):
+    return time.monotonic() + time_limit if time_limit else None
+
+
+def _ocr(gray, lang, config, stages, time_limit=None):
+    """Preprocess and OCR inside the worker, in at most ``time_limit``
+    seconds. Returns ``(text, timings, words, passes)`` with ``words`` in
+    the column layout of ocr_layout.from_tsv() and ``passes`` None (single
+    pass)."""
+    deadline = _deadline(time_limit)
+    gray, timings = preprocess.run(gray, stages)
+    start = time.perf_counter()
+    text, tsv = _recognize(gray, lang, config, deadline)
+    words = ocr_layout.from_tsv(tsv)
+    if text is None:
+        text = ocr_layout.to_text(words)
+    timings["tesseract"] = round((time.perf_counter() - start) * 1000, 2)
+    return text, timings, words, None
+
+
+def _ocr_adaptive(gray, lang, stages, threshold, time_limit=None):
+    """Adaptive multi-pass OCR inside the worker (see adaptive.py); all
+    passes together get ``time_limit`` seconds.
+
+    Returns ``(text, timings, words, passes)``.
+    """
+    deadline = _deadline(time_limit)
+    gray, timings = preprocess.run(gray, stages)
+    words, pass_timings, passes = adaptive.run(
+        gray, lambda image, config: ocr_layout.from_tsv(_recognize(image, lang, config, deadline)[1]), threshold
+    )
+    timings.update(pass_timings)
+    return ocr_layout.to_text(words), timings, words, passes
+
+
+# ---------------- POOL ----------------
+class OCRPool:
+    """Process pool sized to the machine with a bounded job queue.
+
+    Jobs beyond ``queue_size`` are rejected with ``PoolBusyError`` instead of
+    piling up, and callers wait at most ``timeout`` seconds for a result.
+    Queued jobs reach the workers through a FairScheduler; the batch lane
+    may only hold ``batch_share`` of the queue, so interactive requests
+    always find room.
+    """
+
+    def __init__(self, app=None):
+        self.workers = os.cpu_count() or 2
+        self.queue_size = self.workers * 4
+        self.timeout = 60
+        self.lang = "eng"
+        self.tesseract_cmd = None  # pytesseract's default: "tesseract" on the PATH
+        self.adaptive_threshold = 0.80
+        self.nice = 0
+        self.batch_share = 0.5
+        self.lane_weights = {}
+        self.owner_weights = {}
+        self.in_flight = 0
+        self._executor = None
+        self._scheduler = None
+        self._slots = None
+        self._batch_slots = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.workers = app.config.get("OCR_WORKERS") or self.workers
+        self.queue_size = app.config.get("OCR_QUEUE_SIZE") or self.workers * 4
+        self.timeout = app.config.get("OCR_TIMEOUT", self.timeout)
+        self.lang = app.config.get("OCR_LANG", self.lang)
+        self.tesseract_cmd = app.config.get("TESSERACT_CMD") or self.tesseract_cmd
+        self.adaptive_threshold = app.config.get("OCR_ADAPTIVE_THRESHOLD", self.adaptive_threshold)
+        self.nice = app.config.get("OCR_WORKER_NICE", self.nice)
+        self.batch_share = app.config.get("OCR_BATCH_QUEUE_SHARE", self.batch_share)
+        self.lane_weights = parse_weights(app.config.get("OCR_LANE_WEIGHTS"))
+        self.owner_weights = parse_weights(app.config.get("OCR_USER_WEIGHTS"))
+        self._create_slots()
+        app.extensions["ocr_pool"] = self
+
+    def _create_slots(self):
+        self._slots = threading.BoundedSemaphore(self.queue_size)
+        self._batch_slots = threading.BoundedSemaphore(max(1, int(self.queue_size * self.batch_share)))
+
+    def _get_scheduler(self):
+        with self._lock:
+            if self._scheduler is None:
+                self._scheduler = FairScheduler(self.workers, self.lane_weights, self.owner_weights)
+            return self._scheduler
+
+    def waiting(self, lane=None):
+        """Jobs queued in the scheduler, not yet handed to a worker."""
+        return self._scheduler.waiting(lane) if self._scheduler else 0
+
+    def _get_executor(self):
+        # Workers are started on first use so the pool is never forked
+        # before the app (and the debug reloader) has finished starting.
+        with self._lock:
+            if self._executor is not None and self._executor._broken:
+                self._discard(self._executor)
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=_init_worker,
+                    initargs=(self.lang, self.tesseract_cmd, self.nice),
+                )
+            return self._executor
+
+    def _discard(self, executor):
+        """Drop a broken executor (caller holds the lock). Once a worker has
+        died, e.g. killed for memory or by a Tesseract crash, the executor
+        fails every job, so the next one starts a fresh set of workers."""
+        if self._executor is executor:
+            log.warning("An OCR worker died; restarting the OCR worker pool")
+            self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _dispatch(self, fn, *args):
+        """Hand a job to a worker process. Jobs that were running when a
+        worker died fail with BrokenProcessPool; new ones get new workers."""
+        executor = self._get_executor()
+        try:
+            return executor.submit(fn, *args)
+        except BrokenProcessPool:
+            with self._lock:
+                self._discard(executor)
+            return self._get_executor().submit(fn, *args)
+
+    def warm(self):
+        """Start the worker processes now instead of on the first job."""
+        for future in [self._dispatch(_ping) for _ in range(self.workers)]:
+            future.result(timeout=self.timeout)
+
+    def tesseract_version(self):
+        """Version of the Tesseract binary the workers run."""
+        if self.tesseract_cmd:
+            pytesseract.pytesseract.tesseract_cmd = self.tesseract_cmd
+        return str(pytesseract.get_tesseract_version())
+
+    @staticmethod
+    def _acquire(slots, wait):
+        acquired = slots.acquire(timeout=wait) if wait else slots.acquire(blocking=False)
+        if not acquired:
+            raise PoolBusyError("OCR queue is full, try again shortly")
+
+    def submit(self, fn, *args, wait=None, owner=None, lane=INTERACTIVE):
+        """Queue ``fn(*args)`` on a worker and return its future.
+
+        ``owner`` (a user ID or client address) and ``lane`` decide when the
+        job gets a worker, see scheduler.py. With ``wait`` set, block up to
+        that many seconds for a free slot instead of failing immediately.
+        """
+        if self._slots is None:
+            self._create_slots()
+        slots = [self._slots]
+        if lane == BATCH:
+            self._acquire(self._batch_slots, wait)
+            slots.insert(0, self._batch_slots)
+        try:
+            self._acquire(self._slots, wait)
+        except PoolBusyError:
+            if lane == BATCH:
+                self._batch_slots.release()
+            raise
+
+        try:
+            future = self._get_scheduler().submit(self._dispatch, fn, args, owner, lane)
+        except Exception:
+            for held in slots:
+                held.release()
+            raise
+        with self._lock:
+            self.in_flight += 1
+        future.add_done_callback(lambda _future: self._release(slots))
+        return future
+
+    def _release(self, slots):
+        with self._lock:
+            self.in_flight -= 1
+        for held in slots:
+            held.release()
+
+    def result(self, future, timeout=None):
+        try:
+            return future.result(timeout=timeout or self.timeout)
+        except FutureTimeout:
+            # Drops the job if it is still queued; a running one stops at its own time limit
+            future.cancel()
+            raise OCRTimeoutError(f"OCR did not finish within {timeout or self.timeout}s")
+
+    def submit_image(self, gray, config="", lang=None, stages=(), wait=None, owner=None, lane=INTERACTIVE):
+        """Queue preprocessing + Tesseract on a grayscale array.
+
+        The future resolves to ``(text, timings, words, passes)``.
+        """
+        return self.submit(
+            _ocr, gray, lang or self.lang, config, list(stages), self.timeout, wait=wait, owner=owner, lane=lane
+        )
+
+    def submit_adaptive(self, gray, threshold=None, lang=None, stages=(), wait=None, owner=None, lane=INTERACTIVE):
+        """Queue adaptive multi-pass OCR; the future resolves to
+        ``(text, timings, words, passes)``."""
+        return self.submit(
+            _ocr_adaptive, gray, lang or self.lang, list(stages), threshold or self.adaptive_threshold, self.timeout,
+            wait=wait, owner=owner, lane=lane
+        )
+
+    def image_to_string(self, gray, config="", lang=None, stages=()):
+        """Run OCR on a grayscale array in a worker and wait for the text."""
+        text, _, _, _ = self.result(self.submit_image(gray, config, lang, stages))
+        return text
+
+    def worker_pids(self):
+        with self._lock:
+            if self._executor is None:
+                return []
+            return list(self._executor._processes or {})
+
+    def shutdown(self, wait=True):
+        if self._scheduler is not None:
+            self._scheduler.cancel_waiting()
+        with self._lock:
+            executor, self._executor = self._executor, None
+        # Not under the lock: jobs finishing meanwhile release their slots through it
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,444 @@
+"""
+OCR Service for Ink2Text
+Shared decode -> OCR -> save steps used by the synchronous /api/ocr route
+and by background jobs.
+"""
+
+import io
+import time
+import zipfile
+from concurrent.futures import wait, FIRST_COMPLETED
+
+from extensions import db, ocr_pool, ocr_cache, blob_store, write_buffer
+from persistence import insert_results
+import ingest
+import lazy
+import metrics
+import ocr_layout
+import preprocess
+import segmentation
+from ocr_pool import OCRTimeoutError
+from scheduler import INTERACTIVE, BATCH
+from ocr_cache import image_hash
+
+cv2 = lazy.module("cv2")
+np = lazy.module("numpy")
+Image = lazy.module("PIL.Image")
+ImageSequence = lazy.module("PIL.ImageSequence")
+
+
+# standard: one Tesseract pass; adaptive: escalating passes (adaptive.py);
+# regions: the page split into text regions OCR'd in parallel (segmentation.py)
+MODES = ("standard", "adaptive", "regions")
+
+# Pages smaller than this aren't worth splitting into regions
+REGION_MIN_PIXELS = 2_000_000
+# Regions are blocks of lines, so Tesseract can skip page layout analysis
+REGION_CONFIG = "--psm 6"
+
+
+class InvalidImageError(Exception):
+    """Raised when uploaded bytes cannot be decoded as an image."""
+
+
+def parse_mode(spec):
+    mode = (spec or "standard").strip().lower()
+    if mode not in MODES:
+        raise ValueError(f"Unknown OCR mode: {mode}. Use one of: {', '.join(MODES)}")
+    return mode
+
+
+def allowed_file(filename, allowed_extensions):
+    file_ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+    return file_ext in allowed_extensions
+
+
+def _header(data):
+    # Bytes are shared by BytesIO, not copied; other buffers (memory maps of
+    # spooled uploads) only need their first bytes for the header
+    return io.BytesIO(data if isinstance(data, bytes) else bytes(data[:ingest.MAX_HEAD_BYTES]))
+
+
+def decode_image(data):
+    """Validate the uploaded bytes and return a grayscale numpy array.
+
+    ``data`` is bytes or any buffer, e.g. a memory-mapped upload. Validation
+    only parses the image header; the pixels are then decoded once,
+    straight to a single channel, from a zero-copy view of the buffer.
+    """
+    try:
+        with Image.open(_header(data)) as image:
+            width, height = image.size
+    except Image.UnidentifiedImageError:
+        raise InvalidImageError("Invalid image file")
+    except Exception as e:
+        raise InvalidImageError(f"Error processing image: {str(e)}")
+
+    if Image.MAX_IMAGE_PIXELS and width * height > Image.MAX_IMAGE_PIXELS:
+        raise InvalidImageError(f"Image too large: {width}x{height} pixels")
+
+    gray = cv2.imdecode(
+        np.frombuffer(data, dtype=np.uint8),
+        cv2.IMREAD_GRAYSCALE | cv2.IMREAD_IGNORE_ORIENTATION
+    )
+    if gray is not None:
+        return gray
+
+    # Formats OpenCV can't decode (e.g. GIF) go through PIL instead
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return np.asarray(image.convert("L"))
+    except Exception as e:
+        raise InvalidImageError(f"Error processing image: {str(e)}")
+
+
+def _decode_frame(data, index):
+    try:
+        with ingest.BufferReader(data) as reader, Image.open(reader) as image:
+            image.seek(index)
+            return np.array(image.convert("L"))
+    except Exception as e:
+        raise InvalidImageError(f"Error processing page {index + 1}: {str(e)}")
+
+
+def _decode_pdf_page(data, index):
+    from pdf2image import convert_from_bytes
+    page = convert_from_bytes(data, first_page=index + 1, last_page=index + 1)[0]
+    return np.array(page.convert("L"))
+
+
+def _read_entry(archive, info, max_bytes):
+    """Unpack one archive entry. Entries bigger than ``max_bytes`` are
+    refused from their header, before anything is inflated: a few KB of
+    zip can unpack to gigabytes."""
+    if max_bytes and info.file_size > max_bytes:
+        raise InvalidImageError(
+            f"Page too large: {info.filename} unpacks to {info.file_size // (1024 * 1024)}MB, "
+            f"the limit is {max_bytes // (1024 * 1024)}MB"
+        )
+    with archive.open(info) as entry:
+        # The header's size can't be trusted; never inflate past the limit
+        data = entry.read(max_bytes + 1) if max_bytes else entry.read()
+    if max_bytes and len(data) > max_bytes:
+        raise InvalidImageError(f"Page too large: {info.filename}, the limit is {max_bytes // (1024 * 1024)}MB")
+    return data
+
+
+def iter_pages(file_name, data, allowed_extensions, max_pages, max_page_bytes=None):
+    """Split an upload into pages.
+
+    Yields ``(page_name, load)`` pairs where ``load()`` decodes that page to a
+    grayscale array, so pages are only decoded when they are about to be
+    OCR'd. Zip archives, multi-page TIFFs and (with pdf2image installed)
+    PDFs expand to one entry per page; anything else is a single page.
+    Archive entries unpacking to more than ``max_page_bytes`` fail to load.
+
+    ``data`` may be a memory map of a spooled upload; close the generator
+    before unmapping it.
+    """
+    ext = file_name.rsplit('.', 1)[1].lower() if '.' in file_name else ''
+    count = 0
+
+    if ext == "zip":
+        with ingest.BufferReader(data) as reader:
+            try:
+                archive = zipfile.ZipFile(reader)
+            except zipfile.BadZipFile:
+                raise InvalidImageError(f"Invalid zip archive: {file_name}")
+            for info in archive.infolist():
+                if info.is_dir() or not allowed_file(info.filename, allowed_extensions):
+                    continue
+                count += 1
+                if count > max_pages:
+                    raise InvalidImageError(f"Too many pages, the limit is {max_pages}")
+                yield f"{file_name}/{info.filename}", (
+                    lambda info=info: decode_image(_read_entry(archive, info, max_page_bytes))
+                )
+
+    elif ext in ("tif", "tiff"):
+        try:
+            with ingest.BufferReader(data) as reader, Image.open(reader) as image:
+                frames = sum(1 for _ in ImageSequence.Iterator(image))
+        except Exception:
+            raise InvalidImageError(f"Invalid TIFF file: {file_name}")
+        if frames > max_pages:
+            raise InvalidImageError(f"Too many pages, the limit is {max_pages}")
+        for index in range(frames):
+            yield f"{file_name}#{index + 1}", (lambda index=index: _decode_frame(data, index))
+
+    elif ext == "pdf":
+        try:
+            from pdf2image import pdfinfo_from_bytes
+        except ImportError:
+            raise InvalidImageError("PDF uploads need pdf2image and poppler installed on the server")
+        pages = pdfinfo_from_bytes(data)["Pages"]
+        if pages > max_pages:
+            raise InvalidImageError(f"Too many pages, the limit is {max_pages}")
+        for index in range(pages):
+            yield f"{file_name}#{index + 1}", (lambda index=index: _decode_pdf_page(data, index))
+
+    else:
+        yield file_name, (lambda: decode_image(data))
+
+
+def ocr_pages(pages, window, stages=(), mode="standard", use_cache=True, owner=None):
+    """OCR pages in parallel on the worker pool, in its batch lane.
+
+    Keeps at most ``window`` pages in flight and yields
+    ``(index, page_name, image_hash, result, error)`` in completion order,
+    where ``result`` is an ``OCRResult``. Every page is yielded exactly
+    once, with an error if it failed, so callers can count on the total.
+    Pages already in the OCR cache are yielded without touching the pool,
+    unless ``use_cache`` is off.
+    """
+    # Pages already keep every worker busy; splitting them further won't help
+    if mode == "regions":
+        mode = "standard"
+    pending = {}
+    pages = enumerate(pages)
+    exhausted = False
+
+    while pending or not exhausted:
+        while not exhausted and len(pending) < window:
+            try:
+                index, (page_name, load) = next(pages)
+            except StopIteration:
+                exhausted = True
+                break
+            try:
+                with metrics.stage("decode"):
+                    gray = load()
+                digest = image_hash(gray)
+                key = cache_key(digest, stages=stages, mode=mode) if use_cache else None
+                cached = ocr_cache.get(key) if use_cache else None
+                if cached is not None:
+                    yield index, page_name, digest, cached, None
+                    continue
+                future = _submit(gray, stages, mode, wait=ocr_pool.timeout, owner=owner, lane=BATCH)
+            except Exception as e:
+                yield index, page_name, None, None, str(e)
+                continue
+            pending[future] = (index, page_name, digest, key)
+
+        if not pending:
+            continue
+
+        done, _ = wait(pending, timeout=ocr_pool.timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            # Fail the pages in flight and go on with the rest; the workers
+            # stop stuck pages at the same timeout (see ocr_pool._recognize)
+            for future, (index, page_name, _, _) in pending.items():
+                future.cancel()
+                yield index, page_name, None, None, f"OCR did not finish within {ocr_pool.timeout}s"
+            pending.clear()
+            continue
+
+        for future in done:
+            index, page_name, digest, key = pending.pop(future)
+            try:
+                text, timings, words, passes = future.result()
+                metrics.record_stages(timings)
+            except Exception as e:
+                yield index, page_name, None, None, str(e)
+                continue
+            result = to_result(text, words, passes)
+            if use_cache:
+                ocr_cache.put(key, result)
+            yield index, page_name, digest, result, None
+
+
+def cache_key(digest, config="", stages=(), mode="standard"):
+    params = {"lang": ocr_pool.lang, "config": config, "preprocess": list(stages)}
+    if mode == "adaptive":
+        params["adaptive"] = ocr_pool.adaptive_threshold
+    elif mode != "standard":
+        params["mode"] = mode
+    return ocr_cache.key(digest, **params)
+
+
+def _submit(gray, stages, mode, wait=None, owner=None, lane=INTERACTIVE):
+    if mode == "adaptive":
+        return ocr_pool.submit_adaptive(gray, stages=stages, wait=wait, owner=owner, lane=lane)
+    return ocr_pool.submit_image(gray, stages=stages, wait=wait, owner=owner, lane=lane)
+
+
+def to_result(text, words, passes=None):
+    """Build an ``OCRResult`` from a worker's text and word columns."""
+    layout = ocr_layout.pack(words) if words["text"] else None
+    return ocr_layout.OCRResult(text, ocr_layout.confidence(words), layout, passes)
+
+
+def _run_regions(gray, stages, timings, owner=None, lane=INTERACTIVE):
+    """OCR the text regions of one page in parallel and stitch them back
+    together in reading order. Returns ``(text, words)``."""
+    # Preprocess the whole page here: deskew, crop etc. only make sense per page
+    gray, stage_timings = preprocess.run(gray, stages)
+    metrics.record_stages(stage_timings)
+    timings.update(stage_timings)
+
+    with metrics.stage("segment", timings):
+        regions = segmentation.segment(gray, ocr_pool.workers)
+
+    start = time.perf_counter()
+    futures = []
+    try:
+        config = REGION_CONFIG if len(regions) > 1 else ""
+        for x, y, w, h in regions:
+            crop = np.ascontiguousarray(gray[y:y + h, x:x + w])
+            futures.append(ocr_pool.submit_image(crop, config=config, wait=ocr_pool.timeout, owner=owner, lane=lane))
+
+        deadline = time.monotonic() + ocr_pool.timeout
+        outputs = []
+        for future in futures:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise OCRTimeoutError(f"OCR did not finish within {ocr_pool.timeout}s")
+            outputs.append(ocr_pool.result(future, timeout=remaining))
+    except Exception:
+        for future in futures:
+            future.cancel()
+        raise
+
+    timings["regions"] = round((time.perf_counter() - start) * 1000, 2)
+    for _, worker_timings, _, _ in outputs:
+        metrics.record_stages(worker_timings)
+
+    texts = [text.strip() for text, _, _, _ in outputs if text.strip()]
+    words = ocr_layout.concat([
+        (region_words, x, y) for (_, _, region_words, _), (x, y, _, _) in zip(outputs, regions)
+    ])
+    return "\n\n".join(texts) + ("\n" if texts else ""), words
+
+
+def run_ocr(gray, digest=None, stages=(), mode="standard", owner=None, lane=INTERACTIVE):
+    """Preprocess and extract text using the Tesseract worker pool.
+
+    Returns ``(result, cached, timings)`` where ``result`` is an
+    ``OCRResult``; identical images with identical settings are answered
+    from the OCR cache. ``mode`` is one of MODES; ``owner`` and ``lane``
+    are passed to the pool's scheduler.
+    """
+    timings = {}
+    key = cache_key(digest or image_hash(gray), stages=stages, mode=mode)
+    with metrics.stage("cache_lookup", timings):
+        cached = ocr_cache.get(key)
+    if cached is not None:
+        return cached, True, timings
+
+    if mode == "regions" and gray.size >= REGION_MIN_PIXELS:
+        extracted_text, words = _run_regions(gray, stages, timings, owner, lane)
+        result = to_result(extracted_text, words)
+        ocr_cache.put(key, result)
+        return result, False, timings
+
+    start = time.perf_counter()
+    extracted_text, worker_timings, words, passes = ocr_pool.result(_submit(gray, stages, mode, owner=owner, lane=lane))
+    elapsed = (time.perf_counter() - start) * 1000
+    metrics.record_stages(worker_timings)
+    timings.update(worker_timings)
+
+    # Whatever the worker didn't spend working was spent waiting in the queue
+    timings["queue_wait"] = round(max(0.0, elapsed - sum(worker_timings.values())), 2)
+    metrics.record_stages({"queue_wait": timings["queue_wait"]})
+
+    result = to_result(extracted_text, words, passes)
+    ocr_cache.put(key, result)
+    return result, False, timings
+
+
+def find_duplicate(user_id, digest):
+    """Most recent document of this user with the same image, if any."""
+    from models import Document
+
+    return (
+        Document.query
+        .filter_by(user_id=user_id, image_hash=digest)
+        .order_by(Document.uploaded_at.desc())
+        .first()
+    )
+
+
+def store_images(gray, original=None):
+    """Keep a thumbnail of ``gray`` and, when given, the ``original`` upload
+    bytes in the blob store. Returns the Document columns referencing them.
+
+    A failing blob store only costs the preview: the OCR result is still saved.
+    """
+    if not blob_store.enabled:
+        return {}
+    try:
+        blobs = {"thumbnail_blob": blob_store.put_thumbnail(gray)}
+        if original is not None:
+            blobs["original_blob"] = blob_store.put(original)
+        return blobs
+    except (OSError, ValueError) as e:
+        print(f"⚠️  Could not store images: {str(e)}")
+        return {}
+
+
+def _row(user_id, file_name, result, digest, blobs=None):
+    row = {
+        "user_id": user_id,
+        "file_name": file_name,
+        "image_hash": digest,
+        "extracted_text": result.text,
+        "confidence_score": result.confidence,
+        "passes": result.passes,
+        "layout": result.layout
+    }
+    row.update(blobs or {})
+    return row
+
+
+def save_result(user_id, file_name, result, digest=None, blobs=None):
+    """Persist one ``OCRResult`` in a single transaction; returns the
+    document ID. ``blobs`` comes from store_images().
+
+    With the write-behind buffer enabled the row is committed together with
+    other requests' results instead of in its own transaction.
+    """
+    row = _row(user_id, file_name, result, digest, blobs)
+
+    if write_buffer.enabled:
+        return write_buffer.submit(row).result(timeout=ocr_pool.timeout)
+
+    document_id = insert_results([row])[0]
+    db.session.commit()
+    return document_id
+
+
+def save_results(user_id, pages):
+    """Persist many ``(file_name, result, image_hash, blobs)`` pages in a
+    single transaction with multi-row inserts; returns the document IDs."""
+    if not pages:
+        return []
+
+    document_ids = insert_results([
+        _row(user_id, file_name, result, digest, blobs) for file_name, result, digest, blobs in pages
+    ])
+    db.session.commit()
+    return document_ids
+
+
+def process_job(payload):
+    """Job handler: run the full pipeline for a queued upload."""
+    gray = decode_image(payload["data"])
+    digest = image_hash(gray)
+    blobs = store_images(gray, payload["data"])
+    result, _, _ = run_ocr(
+        gray, digest, payload.get("preprocess", []), payload.get("mode", "standard"),
+        owner=payload["user_id"], lane=BATCH
+    )
+
+    try:
+        document_id = save_result(payload["user_id"], payload["file_name"], result, digest, blobs)
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return {
+        "document_id": document_id,
+        "text": result.text,
+        "confidence": result.confidence,
+        "passes": result.passes
+    }
@@ -0,0 +1,34 @@
+"""
+Keyset Pagination Helpers for Ink2Text
+History pages are ordered by (uploaded_at, document_id) descending; the
+cursor is the position of the last row on the previous page.
+"""
+
+import base64
+from datetime import datetime
+
+
+class InvalidCursorError(Exception):
+    """Raised when a client sends a cursor we didn't issue."""
+
+
+def encode_cursor(uploaded_at, document_id):
+    raw = f"{uploaded_at.isoformat()}|{document_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        uploaded_at, document_id = base64.urlsafe_b64decode(padded).decode("utf-8").split("|")
+        return datetime.fromisoformat(uploaded_at), int(document_id)
+    except Exception:
+        raise InvalidCursorError("Invalid cursor")
+
+
+def parse_limit(value, default, maximum):
+    try:
+        limit = int(value) if value is not None else default
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    return max(1, min(limit, maximum))
@@ -0,0 +1,143 @@
+"""
+OCR Result Persistence for Ink2Text
+Writes Document + OCRText rows with multi-row INSERTs in one transaction,
+and an optional write-behind buffer that groups results from concurrent
+requests into a single commit.
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+
+from extensions import db
+
+
+def touch_history(user_ids):
+    """Bump the history version of these users (a list or a SELECT of user
+    IDs), so cached history listings are fetched again. Runs in the
+    caller's transaction."""
+    from models import User
+
+    db.session.execute(
+        db.update(User)
+        .where(User.user_id.in_(user_ids))
+        .values(history_version=User.history_version + 1, history_updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+def insert_results(rows):
+    """Insert documents and their OCR text; returns the new document IDs.
+
+    ``rows`` are dicts with user_id, file_name, image_hash and
+    extracted_text, plus optionally confidence_score, passes, layout (a
+    packed word layout blob) and the original_blob / thumbnail_blob digests. Runs in the current session's transaction; the
+    caller commits.
+    """
+    from models import Document, OCRText, OCRLayout
+    from extensions import text_codec
+    import search
+
+    document_ids = db.session.execute(
+        db.insert(Document).returning(Document.document_id, sort_by_parameter_order=True),
+        [
+            {
+                "user_id": row["user_id"],
+                "file_name": row["file_name"],
+                "image_hash": row.get("image_hash"),
+                "original_blob": row.get("original_blob"),
+                "thumbnail_blob": row.get("thumbnail_blob")
+            }
+            for row in rows
+        ]
+    ).scalars().all()
+
+    texts = [{"document_id": document_id} for document_id in document_ids]
+    for text, row in zip(texts, rows):
+        text["extracted_text"], text["text_data"] = text_codec.encode(row["extracted_text"])
+        text["confidence_score"] = row.get("confidence_score")
+        text["passes"] = row.get("passes")
+    ocr_ids = db.session.execute(
+        db.insert(OCRText).returning(OCRText.ocr_id, sort_by_parameter_order=True), texts
+    ).scalars().all()
+    search.index(db.session, [
+        (ocr_id, row["extracted_text"], text["text_data"] is not None)
+        for ocr_id, text, row in zip(ocr_ids, texts, rows)
+    ])
+
+    layouts = [
+        {"document_id": document_id, "data": row["layout"]}
+        for document_id, row in zip(document_ids, rows) if row.get("layout")
+    ]
+    if layouts:
+        db.session.execute(db.insert(OCRLayout), layouts)
+
+    user_ids = {row["user_id"] for row in rows if row["user_id"] is not None}
+    if user_ids:
+        touch_history(list(user_ids))
+    return document_ids
+
+
+class WriteBehindBuffer:
+    """Collects results from request threads and flushes them together.
+
+    ``submit()`` returns a future that resolves to the new document ID once
+    the batch containing it has been committed.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self.interval = 0.02
+        self.max_batch = 200
+        self._pending = []
+        self._cond = threading.Condition()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get("WRITE_BEHIND_ENABLED", self.enabled)
+        self.interval = app.config.get("WRITE_BEHIND_INTERVAL", self.interval)
+        self.max_batch = app.config.get("WRITE_BEHIND_MAX_BATCH", self.max_batch)
+        app.extensions["write_buffer"] = self
+
+    def submit(self, row):
+        future = Future()
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                self._thread.start()
+            self._pending.append((row, future))
+            self._cond.notify()
+        return future
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                full = len(self._pending) >= self.max_batch
+            if not full:
+                # Let other requests join this batch before flushing
+                time.sleep(self.interval)
+            with self._cond:
+                batch = self._pending[:self.max_batch]
+                self._pending = self._pending[self.max_batch:]
+            self._flush(batch)
+
+    def _flush(self, batch):
+        with self.app.app_context():
+            try:
+                document_ids = insert_results([row for row, _ in batch])
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                for _, future in batch:
+                    future.set_exception(e)
+                return
+
+        for document_id, (_, future) in zip(document_ids, batch):
+            future.set_result(document_id)
@@ -0,0 +1,137 @@
+"""
+Image Preprocessing for Ink2Text
+Composable OpenCV stages applied to the grayscale image before Tesseract.
+A request picks either a preset name or a comma separated list of stages,
+e.g. ``preprocess=handwriting`` or ``preprocess=downscale,threshold,crop``.
+"""
+
+import time
+
+import lazy
+
+cv2 = lazy.module("cv2")
+np = lazy.module("numpy")
+
+# Longest side we hand to Tesseract; phone photos are usually far larger
+MAX_SIDE = 2000
+# Median glyph height (px) Tesseract reads best at; larger text is scaled down
+TARGET_TEXT_HEIGHT = 32
+
+
+def _ink_mask(gray):
+    """Foreground (ink) pixels as 255, background as 0."""
+    return cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+
+
+def _resize(gray, scale):
+    height, width = gray.shape[:2]
+    size = (max(1, int(width * scale)), max(1, int(height * scale)))
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+
+# ---------------- STAGES ----------------
+def downscale(gray):
+    """Shrink to MAX_SIDE, then further if the text is much taller than
+    Tesseract needs. Never upscales."""
+    scale = min(1.0, MAX_SIDE / max(gray.shape[:2]))
+    if scale < 1.0:
+        gray = _resize(gray, scale)
+
+    count, _, stats, _ = cv2.connectedComponentsWithStats(_ink_mask(gray), connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    # Ignore specks and page-sized blobs (borders, shadows)
+    heights = heights[(heights > 4) & (heights < gray.shape[0] // 4)]
+    if len(heights) >= 10:
+        text_scale = TARGET_TEXT_HEIGHT / float(np.median(heights))
+        if text_scale < 0.9:
+            gray = _resize(gray, text_scale)
+    return gray
+
+
+def denoise(gray):
+    return cv2.medianBlur(gray, 3)
+
+
+def threshold(gray):
+    """Adaptive binarization; copes with uneven lighting on photos of paper."""
+    return cv2.adaptiveThreshold(
+        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 15
+    )
+
+
+def deskew(gray):
+    points = cv2.findNonZero(_ink_mask(gray))
+    if points is None or len(points) < 50:
+        return gray
+    if len(points) > 100000:
+        points = np.ascontiguousarray(points[::len(points) // 100000])
+
+    angle = cv2.minAreaRect(points)[-1]
+    if angle > 45:
+        angle -= 90
+    elif angle < -45:
+        angle += 90
+    if abs(angle) < 0.5:
+        return gray
+
+    height, width = gray.shape[:2]
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    return cv2.warpAffine(
+        gray, matrix, (width, height),
+        flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE
+    )
+
+
+def crop(gray, padding=10):
+    """Crop to the bounding box of the ink plus a small margin."""
+    points = cv2.findNonZero(_ink_mask(gray))
+    if points is None:
+        return gray
+    x, y, w, h = cv2.boundingRect(points)
+    height, width = gray.shape[:2]
+    return gray[
+        max(0, y - padding):min(height, y + h + padding),
+        max(0, x - padding):min(width, x + w + padding)
+    ]
+
+
+STAGES = {
+    "downscale": downscale,
+    "denoise": denoise,
+    "threshold": threshold,
+    "deskew": deskew,
+    "crop": crop
+}
+
+PRESETS = {
+    "none": [],
+    "fast": ["downscale", "crop"],
+    "print": ["downscale", "threshold", "crop"],
+    "handwriting": ["downscale", "denoise", "threshold", "deskew", "crop"]
+}
+
+
+def parse(spec):
+    """Turn a preset name or comma separated stage list into stage names."""
+    spec = (spec or "none").strip().lower()
+    if spec in PRESETS:
+        return list(PRESETS[spec])
+
+    stages = [stage.strip() for stage in spec.split(",") if stage.strip()]
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        raise ValueError(
+            f"Unknown preprocessing stage(s): {', '.join(unknown)}. "
+            f"Use a preset ({', '.join(PRESETS)}) or stages ({', '.join(STAGES)})"
+        )
+    return stages
+
+
+def run(gray, stages):
+    """Apply stages in order. Returns the image and per-stage timings in ms."""
+    timings = {}
+    for stage in stages:
+        start = time.perf_counter()
+        gray = STAGES[stage](gray)
+        timings[stage] = round((time.perf_counter() - start) * 1000, 2)
+    return np.ascontiguousarray(gray), timings
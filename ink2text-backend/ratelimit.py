@@ -0,0 +1,160 @@
+"""
+Rate Limiting for Ink2Text
+Token buckets per user (the access token's, see auth.py) or per client IP
+for requests without a token: every client may send ``burst`` OCR requests
+at once and then ``rate`` per second. Requests over the limit get a 429 with a Retry-After header.
+
+Buckets live in a backend:
+
+- "memory": per process; with several server workers each has its own buckets
+- "sqlite": a local SQLite file shared by all workers on the machine
+- "module:Class": any class with the same take() method, e.g. one backed by
+  Redis for limits shared across machines; it is created with the app
+"""
+
+import importlib
+import os
+import sqlite3
+import threading
+import time
+
+from flask import jsonify
+from werkzeug.exceptions import HTTPException
+
+import metrics
+
+
+class RateLimitExceeded(HTTPException):
+    code = 429
+
+    def __init__(self, retry_after):
+        retry_after = min(retry_after, 86400)
+        super().__init__(f"Too many requests, try again in {max(1, round(retry_after))}s")
+        self.retry_after = retry_after
+
+
+def _refill(tokens, updated, now, rate, burst):
+    return min(burst, tokens + max(0.0, now - updated) * rate)
+
+
+# ---------------- BACKENDS ----------------
+class MemoryBackend:
+    # Drop buckets that have refilled completely once every this many takes
+    PRUNE_EVERY = 1000
+
+    def __init__(self, app=None):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._takes = 0
+
+    def take(self, key, cost, rate, burst):
+        """Take ``cost`` tokens from ``key``'s bucket. Returns 0 when
+        allowed, otherwise the seconds until enough tokens are back."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = _refill(tokens, updated, now, rate, burst)
+            allowed = tokens >= cost
+            self._buckets[key] = (tokens - cost if allowed else tokens, now)
+
+            self._takes += 1
+            if self._takes % self.PRUNE_EVERY == 0:
+                # Full buckets carry no state worth keeping
+                idle = burst / rate if rate else float("inf")
+                self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < idle}
+        return 0 if allowed else (cost - tokens) / rate if rate else float("inf")
+
+
+class SQLiteBackend:
+    PRUNE_EVERY = 1000
+
+    def __init__(self, app=None, path=None):
+        path = path or app.config.get("RATE_LIMIT_PATH") or os.path.join(app.instance_path, "ratelimit.db")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._takes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS buckets (
+                    key TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated REAL NOT NULL
+                )
+            """)
+
+    def take(self, key, cost, rate, burst):
+        # Wall-clock time: it has to agree between processes
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE: read and write the bucket without another worker in between
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                tokens = _refill(row[0], row[1], now, rate, burst) if row else burst
+                allowed = tokens >= cost
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                    (key, tokens - cost if allowed else tokens, now)
+                )
+                self._takes += 1
+                if self._takes % self.PRUNE_EVERY == 0 and rate:
+                    self._conn.execute("DELETE FROM buckets WHERE updated < ?", (now - burst / rate,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return 0 if allowed else (cost - tokens) / rate if rate else float("inf")
+
+
+BACKENDS = {"memory": MemoryBackend, "sqlite": SQLiteBackend}
+
+
+def _load_backend(spec, app):
+    if spec in BACKENDS:
+        return BACKENDS[spec](app)
+    module_name, _, class_name = spec.partition(":")
+    if not class_name:
+        raise ValueError(f"Unknown rate limit backend: {spec}. Use memory, sqlite or module:Class")
+    return getattr(importlib.import_module(module_name), class_name)(app)
+
+
+# ---------------- LIMITER ----------------
+class RateLimiter:
+    def __init__(self, app=None):
+        self.enabled = True
+        self.rate = 1.0
+        self.burst = 20
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get("RATE_LIMIT_ENABLED", self.enabled)
+        self.rate = app.config.get("RATE_LIMIT_RATE", self.rate)
+        self.burst = app.config.get("RATE_LIMIT_BURST", self.burst)
+        self.backend = _load_backend(app.config.get("RATE_LIMIT_BACKEND", "memory"), app)
+        app.extensions["rate_limiter"] = self
+
+        @app.errorhandler(RateLimitExceeded)
+        def rate_limited(e):
+            response = jsonify({"error": e.description})
+            response.status_code = e.code
+            response.headers["Retry-After"] = str(max(1, int(e.retry_after + 0.999)))
+            return response
+
+    @staticmethod
+    def key(user_id=None, remote_addr=None):
+        return f"user:{user_id}" if user_id else f"ip:{remote_addr}"
+
+    def hit(self, key, cost=1, endpoint=""):
+        """Charge ``cost`` requests to ``key``; raises RateLimitExceeded
+        when its bucket is empty."""
+        if not self.enabled:
+            return
+        # A request costing more than the burst could never pass
+        retry_after = self.backend.take(key, min(cost, self.burst), self.rate, self.burst)
+        if retry_after:
+            metrics.RATE_LIMITED.inc(endpoint=endpoint)
+            raise RateLimitExceeded(retry_after)
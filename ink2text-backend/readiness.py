@@ -0,0 +1,134 @@
+"""
+Startup Readiness for Ink2Text
+A process is "started" as soon as it answers requests; it is "warm" once
+everything the first OCR request would otherwise wait for is in place:
+
+1. imports: OpenCV, NumPy, Pillow and pytesseract (see lazy.py)
+2. database: reachable, with every table of the models
+3. tesseract: the binary runs
+4. ocr_workers: the OCR worker processes are running (WARMUP_OCR_POOL)
+
+Warming up runs in a background thread, started by the first request the
+process gets (a readiness probe is enough) or by the server right after
+forking a worker (serve.py). /api/health only says the process is up;
+/api/ready answers 503 until it is warm, so a load balancer holds traffic
+back until then. A failed warm-up is retried on a later request.
+"""
+
+import os
+import threading
+import time
+
+from flask import jsonify
+from sqlalchemy import inspect
+
+from extensions import db, ocr_pool
+import lazy
+
+HEAVY_MODULES = ("numpy", "cv2", "PIL.Image", "pytesseract")
+
+
+def _check_database():
+    with db.engine.connect() as conn:
+        conn.execute(db.text("SELECT 1"))
+    missing = set(db.metadata.tables) - set(inspect(db.engine).get_table_names())
+    if missing:
+        raise RuntimeError(f"Missing tables {', '.join(sorted(missing))}; run `flask init-db`")
+
+
+class Readiness:
+    def __init__(self, app=None):
+        self.app = None
+        self.warm_ocr_pool = True
+        self.retry_interval = 5.0
+        self.started_at = time.time()
+        self.warm_at = None
+        self.checks = {}
+        self.error = None
+        self._thread = None
+        self._attempted_at = None
+        self._pid = None
+        self._started_pid = os.getpid()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.warm_ocr_pool = app.config.get("WARMUP_OCR_POOL", self.warm_ocr_pool)
+        self.retry_interval = app.config.get("WARMUP_RETRY_INTERVAL", self.retry_interval)
+        self.started_at = time.time()
+        self._started_pid = os.getpid()
+        app.extensions["readiness"] = self
+
+        @app.before_request
+        def start_warmup():
+            self.start()
+
+        @app.route("/api/ready", methods=["GET"])
+        def ready():
+            state = self.state()
+            return jsonify(state), 200 if state["warm"] else 503
+
+    @property
+    def warm(self):
+        return self.warm_at is not None
+
+    def steps(self):
+        steps = [
+            ("imports", lambda: lazy.load(*HEAVY_MODULES)),
+            ("database", _check_database),
+            ("tesseract", ocr_pool.tesseract_version)
+        ]
+        if self.warm_ocr_pool:
+            steps.append(("ocr_workers", ocr_pool.warm))
+        return steps
+
+    def start(self):
+        """Warm up in a background thread, unless this process is warm,
+        warming up, or failed less than ``retry_interval`` seconds ago."""
+        if self.warm:
+            return
+        with self._lock:
+            if self._started_pid != os.getpid():
+                # A server worker forked from the process that created the app
+                self.started_at = time.time()
+                self._started_pid = os.getpid()
+            # After a fork the thread that was warming up is gone
+            if self._pid == os.getpid():
+                if self._thread.is_alive() or time.time() - self._attempted_at < self.retry_interval:
+                    return
+            self._pid = os.getpid()
+            self._attempted_at = time.time()
+            self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        checks = {}
+        with self.app.app_context():
+            for name, step in self.steps():
+                started = time.perf_counter()
+                try:
+                    result = step()
+                except Exception as e:
+                    checks[name] = {"ok": False, "error": str(e)}
+                    self.checks, self.error = checks, f"{name}: {e}"
+                    self.app.logger.warning("Warm-up failed at %s: %s", name, e)
+                    return
+                checks[name] = {"ok": True, "ms": round((time.perf_counter() - started) * 1000, 2)}
+                if result is not None:
+                    checks[name]["result"] = result
+        self.checks, self.error = checks, None
+        self.warm_at = time.time()
+
+    def state(self):
+        return {
+            # "failed" until a retry succeeds
+            "status": "ready" if self.warm else "failed" if self.error else "warming",
+            "started": True,
+            "warm": self.warm,
+            "uptime": round(time.time() - self.started_at, 2),
+            "warmup_seconds": round(self.warm_at - self.started_at, 2) if self.warm else None,
+            "checks": self.checks,
+            "error": self.error
+        }
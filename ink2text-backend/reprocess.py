@@ -0,0 +1,399 @@
+"""
+Re-OCR of Stored Documents for Ink2Text
+After a Tesseract, language data or preprocessing upgrade, stored
+documents can be read again from their original uploads (see blobstore.py):
+
+1. ``flask reprocess start`` creates a run and walks the documents in
+   document_id order, a chunk at a time. Every chunk is committed with the
+   run's checkpoint, so a stopped run resumes where it left off
+   (``flask reprocess resume``).
+2. New text goes to ocr_revisions; the live OCRText rows are untouched.
+3. ``flask reprocess swap`` exchanges the revisions with the live text in
+   chunks. The previous text stays in ocr_revisions, so
+   ``flask reprocess revert`` can swap it back.
+
+A run uses its own OCR worker pool in the process running the command,
+throttled so it doesn't starve live /api/ocr traffic: few workers at a
+lower CPU priority, a pages-per-second limit, and a pause whenever the
+machine's load average is too high.
+"""
+
+import mmap
+import os
+import time
+from datetime import datetime, timedelta
+
+import click
+
+from extensions import db, ocr_pool
+from persistence import touch_history
+import ocr_service
+import preprocess
+import search
+
+# A "running" run that hasn't checkpointed for this long is assumed dead
+STALE_AFTER = timedelta(minutes=10)
+
+
+class ReprocessError(Exception):
+    """Raised when a run can't be started, resumed or swapped in its state."""
+
+
+def _tesseract_version():
+    try:
+        return ocr_pool.tesseract_version()
+    except Exception:
+        return None
+
+
+def create_run(stages=(), mode="standard", user_id=None):
+    """Record a new run with the current OCR settings; returns it."""
+    from models import ReprocessRun
+
+    run = ReprocessRun(
+        settings={
+            "lang": ocr_pool.lang,
+            "preprocess": list(stages),
+            "mode": mode,
+            "tesseract": _tesseract_version()
+        },
+        user_id=user_id
+    )
+    db.session.add(run)
+    db.session.commit()
+    return run
+
+
+def _load_original(digest):
+    from extensions import blob_store
+
+    with open(blob_store.path(digest), "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return ocr_service.decode_image(data)
+
+
+class Throttle:
+    """Paces pages to ``rate`` per second (0: no limit) and, with
+    ``max_load`` set, waits while the 1-minute load average is above it."""
+
+    def __init__(self, rate=0, max_load=None, sleep=time.sleep):
+        self.rate = rate
+        self.max_load = max_load
+        self.sleep = sleep
+        self._next = time.monotonic()
+
+    def wait(self):
+        if self.max_load and hasattr(os, "getloadavg"):
+            while os.getloadavg()[0] > self.max_load:
+                self.sleep(1.0)
+        if self.rate:
+            now = time.monotonic()
+            if self._next > now:
+                self.sleep(self._next - now)
+            self._next = max(now, self._next) + 1.0 / self.rate
+
+
+def _chunk(run, chunk_size):
+    from models import Document
+
+    query = (
+        db.session.query(Document.document_id, Document.original_blob)
+        .filter(Document.document_id > run.checkpoint)
+    )
+    if run.user_id is not None:
+        query = query.filter(Document.user_id == run.user_id)
+    return query.order_by(Document.document_id).limit(chunk_size).all()
+
+
+def process_run(run_id, chunk_size=50, throttle=None, log=print):
+    """Process a run from its checkpoint to the end.
+
+    Stops early (status "paused") when the run is paused from elsewhere or
+    interrupted; an error marks it "failed". Either way it can be resumed.
+    Returns the run.
+    """
+    from models import ReprocessRun
+
+    run = db.session.get(ReprocessRun, run_id)
+    if run is None:
+        raise ReprocessError(f"Run {run_id} not found")
+    if run.status in ("done", "swapped"):
+        raise ReprocessError(f"Run {run_id} is already {run.status}")
+    if run.status == "running" and datetime.utcnow() - run.updated_at < STALE_AFTER:
+        raise ReprocessError(f"Run {run_id} is already running")
+
+    throttle = throttle or Throttle()
+    run.status = "running"
+    run.last_error = None
+    run.updated_at = datetime.utcnow()
+    db.session.commit()
+
+    try:
+        while True:
+            documents = _chunk(run, chunk_size)
+            if not documents:
+                break
+            _process_chunk(run, documents, throttle)
+            log(f"🔁 Run {run.run_id}: up to document {run.checkpoint}, "
+                f"{run.processed} processed, {run.skipped} skipped, {run.failed} failed")
+
+            db.session.refresh(run)
+            if run.status == "paused":
+                return run
+    except BaseException as e:
+        # The unfinished chunk is redone on resume
+        db.session.rollback()
+        run.status = "paused" if isinstance(e, KeyboardInterrupt) else "failed"
+        if not isinstance(e, KeyboardInterrupt):
+            run.last_error = str(e)
+        db.session.commit()
+        raise
+
+    run.status = "done"
+    run.finished_at = datetime.utcnow()
+    db.session.commit()
+    return run
+
+
+def _process_chunk(run, documents, throttle):
+    from models import OCRRevision
+
+    pages = []
+    for document_id, digest in documents:
+        if digest:
+            pages.append((document_id, lambda digest=digest: _load_original(digest)))
+        else:
+            run.skipped += 1
+
+    def paced():
+        for page in pages:
+            throttle.wait()
+            yield page
+
+    revisions = []
+    settings = run.settings
+    for _, document_id, _, result, error in ocr_service.ocr_pages(
+        paced(), ocr_pool.workers, settings["preprocess"], settings["mode"],
+        use_cache=False, owner=f"reprocess-{run.run_id}"
+    ):
+        if error:
+            run.failed += 1
+            run.last_error = f"Document {document_id}: {error}"
+            continue
+        revisions.append({
+            "run_id": run.run_id,
+            "document_id": document_id,
+            "extracted_text": result.text,
+            "confidence_score": result.confidence,
+            "passes": result.passes,
+            "layout": result.layout
+        })
+
+    # Revisions and the checkpoint are committed together, so a chunk is
+    # either done or redone from scratch
+    if revisions:
+        db.session.execute(
+            db.delete(OCRRevision)
+            .where(OCRRevision.run_id == run.run_id)
+            .where(OCRRevision.document_id.in_([r["document_id"] for r in revisions]))
+        )
+        db.session.execute(db.insert(OCRRevision), revisions)
+    run.processed += len(revisions)
+    run.checkpoint = documents[-1].document_id
+    run.updated_at = datetime.utcnow()
+    db.session.commit()
+
+
+def pause(run_id):
+    """Ask a running run to stop after its current chunk."""
+    from models import ReprocessRun
+
+    run = db.session.get(ReprocessRun, run_id)
+    if run is None:
+        raise ReprocessError(f"Run {run_id} not found")
+    if run.status not in ("pending", "running"):
+        raise ReprocessError(f"Run {run_id} is {run.status}")
+    run.status = "paused"
+    db.session.commit()
+    return run
+
+
+def _exchange(revision, text, layout):
+    """Swap one revision with the live OCR text and layout of its document."""
+    from models import OCRLayout
+
+    current = (text.text, text.confidence_score, text.passes, layout.data if layout else None)
+    text.text = revision.extracted_text
+    text.confidence_score = revision.confidence_score
+    text.passes = revision.passes
+    if revision.layout is None:
+        if layout is not None:
+            db.session.delete(layout)
+    elif layout is None:
+        db.session.add(OCRLayout(document_id=revision.document_id, data=revision.layout))
+    else:
+        layout.data = revision.layout
+
+    (revision.extracted_text, revision.confidence_score, revision.passes, revision.layout) = current
+    revision.swapped = not revision.swapped
+
+
+def swap(run_id, chunk_size=50, revert=False, log=print):
+    """Make a finished run's text live (or, with ``revert``, put the
+    previous text back), one chunk per transaction. Safe to re-run after an
+    interruption: only revisions not swapped yet are touched."""
+    from models import ReprocessRun, OCRRevision, OCRText, OCRLayout, Document
+
+    run = db.session.get(ReprocessRun, run_id)
+    if run is None:
+        raise ReprocessError(f"Run {run_id} not found")
+    expected = "swapped" if revert else "done"
+    if run.status != expected:
+        raise ReprocessError(f"Run {run_id} is {run.status}, not {expected}")
+
+    total = 0
+    last = 0
+    while True:
+        revisions = (
+            OCRRevision.query
+            .filter(OCRRevision.run_id == run_id, OCRRevision.swapped == revert, OCRRevision.document_id > last)
+            .order_by(OCRRevision.document_id)
+            .limit(chunk_size)
+            .all()
+        )
+        if not revisions:
+            break
+
+        document_ids = [revision.document_id for revision in revisions]
+        texts = {}
+        for text in (
+            OCRText.query.options(db.undefer_group("text"))
+            .filter(OCRText.document_id.in_(document_ids)).order_by(OCRText.ocr_id.desc())
+        ):
+            texts[text.document_id] = text  # ends on the document's first OCR text
+        layouts = {layout.document_id: layout for layout in OCRLayout.query.filter(OCRLayout.document_id.in_(document_ids))}
+
+        try:
+            search.unindex(db.session, [(text.ocr_id, text.text) for text in texts.values()])
+            for revision in revisions:
+                if revision.document_id in texts:
+                    _exchange(revision, texts[revision.document_id], layouts.get(revision.document_id))
+            db.session.flush()
+            search.index(db.session, [
+                (text.ocr_id, text.text, text.text_data is not None) for text in texts.values()
+            ])
+            touch_history(db.select(Document.user_id).where(Document.document_id.in_(document_ids)).distinct())
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        total += len(revisions)
+        last = document_ids[-1]
+        log(f"🔁 Run {run_id}: {'reverted' if revert else 'swapped'} {total} documents")
+
+    run.status = "done" if revert else "swapped"
+    run.swapped_at = None if revert else datetime.utcnow()
+    db.session.commit()
+    return total
+
+
+# ---------------- CLI ----------------
+def init_app(app):
+    @app.cli.group("reprocess")
+    def reprocess_group():
+        """Re-run OCR over stored documents."""
+
+    throttle_options = [
+        click.option("--chunk-size", type=int, default=lambda: app.config.get("REPROCESS_CHUNK_SIZE", 50)),
+        click.option("--rate", type=float, default=lambda: app.config.get("REPROCESS_RATE", 2),
+                     help="Pages per second, 0 for no limit"),
+        click.option("--workers", type=int, default=lambda: app.config.get("REPROCESS_WORKERS", 1)),
+        click.option("--max-load", type=float, default=lambda: app.config.get("REPROCESS_MAX_LOAD", 0),
+                     help="Pause while the load average is above this (default: CPU count)")
+    ]
+
+    def with_throttle_options(command):
+        for option in reversed(throttle_options):
+            command = option(command)
+        return command
+
+    def process(run_id, chunk_size, rate, workers, max_load):
+        # This process's pool only serves the run: keep it small and polite
+        ocr_pool.workers = workers
+        ocr_pool.nice = app.config.get("REPROCESS_NICE", 10)
+        # The run's own workers add to the load average
+        throttle = Throttle(rate, max_load or (os.cpu_count() or 1) + workers)
+        try:
+            finished = process_run(run_id, chunk_size, throttle)
+        except ReprocessError as e:
+            raise click.ClickException(str(e))
+        except KeyboardInterrupt:
+            print(f"⏸️  Run {run_id} paused; continue with `flask reprocess resume {run_id}`")
+            return
+        finally:
+            ocr_pool.shutdown()
+        print(f"✅ Run {run_id} {finished.status}: {finished.processed} processed, "
+              f"{finished.skipped} skipped, {finished.failed} failed")
+
+    @reprocess_group.command("start")
+    @click.option("--preprocess", "preprocess_spec", default=lambda: app.config.get("OCR_PREPROCESS"),
+                  help="Preset or stage list, as for /api/ocr")
+    @click.option("--mode", default=lambda: app.config.get("OCR_MODE"), help="OCR mode, as for /api/ocr")
+    @click.option("--user-id", type=int, help="Only this user's documents")
+    @with_throttle_options
+    def start_command(preprocess_spec, mode, user_id, **throttle):
+        try:
+            stages = preprocess.parse(preprocess_spec)
+            mode = ocr_service.parse_mode(mode)
+        except ValueError as e:
+            raise click.BadParameter(str(e))
+        new_run = create_run(stages, mode, user_id)
+        print(f"🔁 Started run {new_run.run_id}: {new_run.settings}")
+        process(new_run.run_id, **throttle)
+
+    @reprocess_group.command("resume")
+    @click.argument("run_id", type=int)
+    @with_throttle_options
+    def resume_command(run_id, **throttle):
+        process(run_id, **throttle)
+
+    @reprocess_group.command("pause")
+    @click.argument("run_id", type=int)
+    def pause_command(run_id):
+        try:
+            pause(run_id)
+        except ReprocessError as e:
+            raise click.ClickException(str(e))
+        print(f"⏸️  Run {run_id} will stop after its current chunk")
+
+    @reprocess_group.command("status")
+    @click.argument("run_id", type=int, required=False)
+    def status_command(run_id):
+        from models import ReprocessRun
+
+        runs = [db.session.get(ReprocessRun, run_id)] if run_id else ReprocessRun.query.order_by(ReprocessRun.run_id).all()
+        for item in runs:
+            if item is None:
+                raise click.ClickException(f"Run {run_id} not found")
+            print(item.to_dict())
+
+    @reprocess_group.command("swap")
+    @click.argument("run_id", type=int)
+    @click.option("--chunk-size", type=int, default=lambda: app.config.get("REPROCESS_CHUNK_SIZE", 50))
+    def swap_command(run_id, chunk_size):
+        """Make a finished run's text live."""
+        try:
+            swap(run_id, chunk_size)
+        except ReprocessError as e:
+            raise click.ClickException(str(e))
+
+    @reprocess_group.command("revert")
+    @click.argument("run_id", type=int)
+    @click.option("--chunk-size", type=int, default=lambda: app.config.get("REPROCESS_CHUNK_SIZE", 50))
+    def revert_command(run_id, chunk_size):
+        """Put back the text a swapped run replaced."""
+        try:
+            swap(run_id, chunk_size, revert=True)
+        except ReprocessError as e:
+            raise click.ClickException(str(e))
@@ -0,0 +1,117 @@
+"""
+History Cleanup for Ink2Text
+Set-based deletes for bulk history removal and a retention purge that
+removes old documents in small chunks so tables are never locked for long.
+Stored originals and thumbnails are shared between documents, so they are
+collected separately once nothing references them.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+from extensions import db
+from persistence import touch_history
+import search
+
+
+def delete_documents(document_ids):
+    """Delete documents, their OCR text, word layout and reprocessed
+    revisions with set-based statements.
+
+    ``document_ids`` is a list or a SELECT of document IDs. The caller owns
+    the transaction; returns the number of documents deleted.
+    """
+    from models import Document, OCRText, OCRLayout, OCRRevision
+
+    touch_history(db.select(Document.user_id).where(Document.document_id.in_(document_ids)).distinct())
+    search.unindex_documents(db.session, document_ids)
+    for model in (OCRText, OCRLayout, OCRRevision):
+        db.session.execute(
+            db.delete(model)
+            .where(model.document_id.in_(document_ids))
+            .execution_options(synchronize_session=False)
+        )
+    result = db.session.execute(
+        db.delete(Document)
+        .where(Document.document_id.in_(document_ids))
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+def purge_expired(days, chunk_size=500, pause=0.1):
+    """Delete documents older than ``days`` days, one chunk per transaction."""
+    from models import Document
+
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    total = 0
+    while True:
+        ids = [
+            row.document_id for row in
+            db.session.query(Document.document_id)
+            .filter(Document.uploaded_at < cutoff)
+            .order_by(Document.document_id)
+            .limit(chunk_size)
+        ]
+        if not ids:
+            break
+
+        try:
+            total += delete_documents(ids)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        if len(ids) < chunk_size:
+            break
+        # Give live traffic a chance at the tables between chunks
+        time.sleep(pause)
+    return total
+
+
+def collect_blobs(grace=3600):
+    """Delete blob store files no document references any more; returns
+    how many were removed."""
+    from models import Document
+    from extensions import blob_store
+
+    referenced = set()
+    for column in (Document.original_blob, Document.thumbnail_blob):
+        referenced.update(db.session.execute(db.select(column).where(column.isnot(None)).distinct()).scalars())
+    return blob_store.collect(referenced, grace)
+
+
+class RetentionScheduler:
+    """Runs purge_expired() every ``interval`` seconds on a daemon thread."""
+
+    def __init__(self, app):
+        self.app = app
+        self.days = app.config.get("RETENTION_DAYS", 0)
+        self.interval = app.config.get("RETENTION_INTERVAL", 3600)
+        self.chunk_size = app.config.get("RETENTION_CHUNK_SIZE", 500)
+        self.blob_grace = app.config.get("BLOB_GC_GRACE", 3600)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if not self.days or self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, name="retention-purge", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self.app.app_context():
+                try:
+                    deleted = purge_expired(self.days, self.chunk_size)
+                    if deleted:
+                        print(f"🧹 Retention purge removed {deleted} documents older than {self.days} days")
+                        removed = collect_blobs(self.blob_grace)
+                        print(f"🧹 Removed {removed} unreferenced blobs")
+                except Exception as e:
+                    print(f"❌ Retention purge failed: {str(e)}")
@@ -0,0 +1,153 @@
+"""
+Fair Scheduling of OCR Work for Ink2Text
+The worker pool's executor runs jobs first come, first served, so one user
+submitting a large batch would make everyone else wait behind it. The
+scheduler holds jobs back and only hands one to the executor when a worker
+is free, choosing which:
+
+- lanes: "interactive" (single images someone is waiting for) and "batch"
+  (batch uploads, async jobs, reprocessing); waiting lanes are served by
+  smooth weighted round robin, e.g. 4 interactive jobs for every batch job
+- within a lane, every owner (user or client IP) has its own queue and
+  owners take turns; an owner with weight 3 gets 3 jobs per turn
+
+Jobs still waiting here can be cancelled without ever reaching a worker.
+"""
+
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+LANES = (INTERACTIVE, BATCH)
+
+
+def parse_weights(spec):
+    """``"interactive:4,batch:1"`` or ``"7:3,12:2"`` -> dict of name to weight."""
+    weights = {}
+    for item in (spec or "").split(","):
+        if not item.strip():
+            continue
+        name, _, weight = item.partition(":")
+        try:
+            weights[name.strip()] = max(1, int(weight))
+        except ValueError:
+            raise ValueError(f"Invalid weight: {item.strip()}. Use name:weight")
+    return weights
+
+
+class _Lane:
+    """Per-owner queues served in weighted round robin."""
+
+    def __init__(self):
+        self.queues = {}
+        self.order = deque()  # owners with queued jobs, next turn first
+        self.served = 0  # jobs the owner at the front has had this turn
+        self.size = 0
+
+    def push(self, owner, job):
+        if owner not in self.queues:
+            self.queues[owner] = deque()
+            self.order.append(owner)
+        self.queues[owner].append(job)
+        self.size += 1
+
+    def pop(self, weights):
+        owner = self.order[0]
+        queue = self.queues[owner]
+        job = queue.popleft()
+        self.size -= 1
+        self.served += 1
+        if not queue:
+            del self.queues[owner]
+            self.order.popleft()
+            self.served = 0
+        elif self.served >= weights.get(owner, 1):
+            self.order.rotate(-1)
+            self.served = 0
+        return job
+
+
+class FairScheduler:
+    def __init__(self, capacity, lane_weights=None, owner_weights=None):
+        self.capacity = capacity
+        self.lane_weights = {INTERACTIVE: 4, BATCH: 1, **(lane_weights or {})}
+        self.owner_weights = owner_weights or {}
+        self.running = 0
+        self._lanes = {lane: _Lane() for lane in LANES}
+        self._credit = {lane: 0 for lane in LANES}
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def submit(self, dispatch, fn, args, owner=None, lane=INTERACTIVE):
+        """Queue ``fn(*args)`` and return a future for its result. When its
+        turn comes, ``dispatch(fn, *args)`` starts it and returns its future."""
+        if lane not in self._lanes:
+            raise ValueError(f"Unknown lane: {lane}")
+        owner = None if owner is None else str(owner)
+        future = Future()
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="ocr-scheduler", daemon=True)
+                self._thread.start()
+            self._lanes[lane].push(owner, (future, dispatch, fn, args))
+            self._cond.notify()
+        return future
+
+    def cancel_waiting(self):
+        """Cancel every job that hasn't reached the executor yet."""
+        with self._cond:
+            for lane in self._lanes.values():
+                while lane.size:
+                    lane.pop(self.owner_weights)[0].cancel()
+
+    def waiting(self, lane=None):
+        with self._cond:
+            if lane is not None:
+                return self._lanes[lane].size
+            return sum(queued.size for queued in self._lanes.values())
+
+    def _next_lane(self):
+        # Smooth weighted round robin over the lanes that have work
+        ready = [lane for lane in LANES if self._lanes[lane].size]
+        if not ready:
+            return None
+        total = 0
+        for lane in ready:
+            self._credit[lane] += self.lane_weights.get(lane, 1)
+            total += self.lane_weights.get(lane, 1)
+        chosen = max(ready, key=lambda lane: self._credit[lane])
+        self._credit[chosen] -= total
+        return chosen
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self.running >= self.capacity or not any(lane.size for lane in self._lanes.values()):
+                    self._cond.wait()
+                future, dispatch, fn, args = self._lanes[self._next_lane()].pop(self.owner_weights)
+                # Skips jobs cancelled while they were waiting here
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self.running += 1
+
+            try:
+                inner = dispatch(fn, *args)
+            except BaseException as e:
+                self._finished()
+                future.set_exception(e)
+                continue
+            inner.add_done_callback(lambda inner, future=future: self._done(inner, future))
+
+    def _finished(self):
+        with self._cond:
+            self.running -= 1
+            self._cond.notify()
+
+    def _done(self, inner, future):
+        self._finished()
+        try:
+            future.set_result(inner.result())
+        except BaseException as e:
+            future.set_exception(e)
@@ -0,0 +1,55 @@
+"""
+Schema Upgrades for Ink2Text
+db.create_all() creates missing tables but never changes existing ones.
+Columns and indexes added to a model after its table was first created
+are listed here and added to older databases on startup.
+"""
+
+from sqlalchemy import inspect, text
+
+# (table, column, DDL type)
+ADDED_COLUMNS = [
+    ("documents", "user_id", "INTEGER"),
+    ("documents", "image_hash", "VARCHAR(64)"),
+    ("ocr_cache", "confidence", "FLOAT"),
+    ("ocr_cache", "layout", "BLOB"),
+    ("ocr_cache", "passes", "JSON"),
+    ("ocr_text", "passes", "JSON"),
+    ("documents", "original_blob", "VARCHAR(64)"),
+    ("documents", "thumbnail_blob", "VARCHAR(64)"),
+    ("users", "history_version", "INTEGER NOT NULL DEFAULT 0"),
+    ("users", "history_updated_at", "TIMESTAMP"),
+    ("ocr_text", "text_data", "BLOB"),
+    ("users", "tokens_valid_after", "TIMESTAMP"),
+]
+
+# (index, table, columns)
+ADDED_INDEXES = [
+    ("ix_documents_image_hash", "documents", ("image_hash",)),
+    ("ix_documents_user_uploaded", "documents", ("user_id", "uploaded_at", "document_id")),
+    ("ix_ocr_text_document_id", "ocr_text", ("document_id",)),
+]
+
+_DIALECT_TYPES = {
+    "postgresql": {"BLOB": "BYTEA"}
+}
+
+
+def upgrade(engine):
+    """Add any columns from ADDED_COLUMNS and indexes from ADDED_INDEXES
+    the database doesn't have yet."""
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    types = _DIALECT_TYPES.get(engine.dialect.name, {})
+
+    with engine.begin() as conn:
+        for table, column, ddl_type in ADDED_COLUMNS:
+            if table not in tables:
+                continue
+            if column in {c["name"] for c in inspector.get_columns(table)}:
+                continue
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {types.get(ddl_type, ddl_type)}"))
+        for index, table, columns in ADDED_INDEXES:
+            if table not in tables:
+                continue
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {index} ON {table} ({', '.join(columns)})"))
@@ -0,0 +1,256 @@
+"""
+Full-Text Search for Ink2Text
+Searches extracted OCR text with the database's own full-text index:
+
+- PostgreSQL: GIN index on a search_vector column. A trigger fills it for
+  plain text; for compressed text (see textcodec.py) the database can't
+  read the words, so the writer fills it with index()
+- SQLite: FTS5 table ranked with bm25. Writers keep it in sync with
+  index() and unindex(), which get the decoded text from the application,
+  so ocr_text has no triggers and other clients (the sqlite3 shell) can
+  still change it; ``flask rebuild-search`` reindexes after such changes.
+  Snippets and rebuilds read the text through the ocr_text_plain view,
+  which decodes compressed rows with the ocr_plain_text() function
+  TextCodec registers on the application's connections
+- anything else: unindexed LIKE fallback (text is never compressed there)
+"""
+
+import html
+import re
+
+from sqlalchemy import text
+
+# Sentinels put around matches by the database; swapped for <mark> after
+# the snippet has been HTML-escaped
+_START, _STOP = "\x02", "\x03"
+
+TS_CONFIG = "english"
+HEADLINE_OPTIONS = "MaxWords=30, MinWords=10, MaxFragments=2"
+
+
+def _setup_postgresql(conn):
+    migrated = conn.execute(text(
+        "SELECT 1 FROM information_schema.columns "
+        "WHERE table_name = 'ocr_text' AND column_name = 'search_vector'"
+    )).first()
+    if not migrated:
+        conn.execute(text("ALTER TABLE ocr_text ADD COLUMN search_vector tsvector"))
+        # Text stored before compression existed is all plain
+        conn.execute(text(f"UPDATE ocr_text SET search_vector = to_tsvector('{TS_CONFIG}', extracted_text)"))
+        # Replaced by the index on search_vector
+        conn.execute(text("DROP INDEX IF EXISTS ix_ocr_text_fts"))
+
+    conn.execute(text(f"""
+        CREATE OR REPLACE FUNCTION ocr_text_search_vector() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.text_data IS NULL THEN
+                NEW.search_vector := to_tsvector('{TS_CONFIG}', NEW.extracted_text);
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """))
+    conn.execute(text("DROP TRIGGER IF EXISTS ocr_text_search_vector ON ocr_text"))
+    conn.execute(text(
+        "CREATE TRIGGER ocr_text_search_vector BEFORE INSERT OR UPDATE OF extracted_text, text_data "
+        "ON ocr_text FOR EACH ROW EXECUTE FUNCTION ocr_text_search_vector()"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_ocr_text_search ON ocr_text USING GIN (search_vector)"))
+
+
+def _setup_sqlite(conn):
+    # Older databases kept the index in sync with triggers; those needed
+    # ocr_plain_text() on every connection that wrote ocr_text
+    for trigger in ("ocr_text_fts_insert", "ocr_text_fts_delete", "ocr_text_fts_update"):
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+
+    exists = {
+        row[0] for row in conn.execute(text(
+            "SELECT name FROM sqlite_master WHERE name IN ('ocr_text_fts', 'ocr_text_plain')"
+        ))
+    }
+    if "ocr_text_plain" in exists:
+        return
+    if "ocr_text_fts" in exists:
+        # Index from before compression: it read ocr_text directly
+        conn.execute(text("DROP TABLE ocr_text_fts"))
+
+    conn.execute(text("""
+        CREATE VIEW ocr_text_plain AS
+        SELECT ocr_id, ocr_plain_text(extracted_text, text_data) AS extracted_text FROM ocr_text
+    """))
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE ocr_text_fts USING fts5("
+        "extracted_text, content='ocr_text_plain', content_rowid='ocr_id')"
+    ))
+    # Index rows that existed before the FTS table
+    rebuild(conn)
+
+
+def setup(engine):
+    """Create the search index for the current database if it's missing."""
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        if dialect == "postgresql":
+            _setup_postgresql(conn)
+        elif dialect == "sqlite":
+            _setup_sqlite(conn)
+
+
+def rebuild(conn):
+    """Reindex all of ocr_text on SQLite, e.g. after it was changed
+    without index() and unindex()."""
+    conn.execute(text("INSERT INTO ocr_text_fts (ocr_text_fts) VALUES ('rebuild')"))
+
+
+def index(session, texts):
+    """Index OCR text rows just inserted or updated in the session's
+    transaction, given as ``(ocr_id, text, compressed)``.
+
+    PostgreSQL's trigger covers plain text, so there only compressed rows
+    are indexed; SQLite indexes every row here.
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        texts = [(ocr_id, value) for ocr_id, value, compressed in texts if compressed]
+        sql = f"UPDATE ocr_text SET search_vector = to_tsvector('{TS_CONFIG}', :text) WHERE ocr_id = :ocr_id"
+    elif dialect == "sqlite":
+        texts = [(ocr_id, value) for ocr_id, value, compressed in texts]
+        sql = "INSERT INTO ocr_text_fts (rowid, extracted_text) VALUES (:ocr_id, :text)"
+    else:
+        return
+    if texts:
+        session.execute(text(sql), [{"ocr_id": ocr_id, "text": value} for ocr_id, value in texts])
+
+
+def unindex(session, texts):
+    """Remove OCR text rows from the index before they are deleted or
+    updated, given as ``(ocr_id, text)`` with the text still stored.
+    Only SQLite needs this: its index has to be told the old words."""
+    if not texts or session.get_bind().dialect.name != "sqlite":
+        return
+    session.execute(
+        text("INSERT INTO ocr_text_fts (ocr_text_fts, rowid, extracted_text) VALUES ('delete', :ocr_id, :text)"),
+        [{"ocr_id": ocr_id, "text": value} for ocr_id, value in texts]
+    )
+
+
+def unindex_documents(session, document_ids):
+    """unindex() the OCR text of documents about to be deleted;
+    ``document_ids`` is a list or a SELECT of document IDs."""
+    from extensions import db, text_codec
+    from models import OCRText
+
+    if session.get_bind().dialect.name != "sqlite":
+        return
+    rows = session.execute(
+        db.select(OCRText.ocr_id, OCRText.extracted_text, OCRText.text_data)
+        .where(OCRText.document_id.in_(document_ids))
+    ).all()
+    unindex(session, [(row.ocr_id, text_codec.decode(row.extracted_text, row.text_data)) for row in rows])
+
+
+def _fts5_query(query):
+    """Quote each word so user input can't break FTS5 syntax; the last
+    word is a prefix match so results update while typing."""
+    words = re.findall(r"\w+", query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _highlight(snippet):
+    snippet = html.escape(snippet or "")
+    return snippet.replace(_START, "<mark>").replace(_STOP, "</mark>")
+
+
+def search(session, user_id, query, limit=20):
+    """Best matches for ``query`` among one user's documents.
+
+    Returns dicts with document_id, file_name, uploaded_at, rank and an
+    HTML-escaped snippet with matches wrapped in <mark>.
+    """
+    dialect = session.get_bind().dialect.name
+    params = {"user_id": user_id, "limit": limit, "start": _START, "stop": _STOP}
+
+    if dialect == "postgresql":
+        params["query"] = query
+        sql = f"""
+            SELECT d.document_id, d.file_name, d.uploaded_at, t.extracted_text, t.text_data,
+                   ts_rank_cd(t.search_vector, websearch_to_tsquery('{TS_CONFIG}', :query)) AS rank
+            FROM ocr_text t
+            JOIN documents d ON d.document_id = t.document_id
+            WHERE d.user_id = :user_id
+              AND t.search_vector @@ websearch_to_tsquery('{TS_CONFIG}', :query)
+            ORDER BY rank DESC
+            LIMIT :limit
+        """
+
+    elif dialect == "sqlite":
+        params["query"] = _fts5_query(query)
+        if params["query"] is None:
+            return []
+        # bm25() is lower-is-better; negate so higher rank means a better match
+        sql = """
+            SELECT d.document_id, d.file_name, d.uploaded_at,
+                   -bm25(ocr_text_fts) AS rank,
+                   snippet(ocr_text_fts, 0, :start, :stop, '…', 16) AS snippet
+            FROM ocr_text_fts
+            JOIN ocr_text t ON t.ocr_id = ocr_text_fts.rowid
+            JOIN documents d ON d.document_id = t.document_id
+            WHERE ocr_text_fts MATCH :query AND d.user_id = :user_id
+            ORDER BY bm25(ocr_text_fts)
+            LIMIT :limit
+        """
+
+    else:
+        params["query"] = f"%{query}%"
+        sql = """
+            SELECT d.document_id, d.file_name, d.uploaded_at, 0 AS rank,
+                   SUBSTR(t.extracted_text, 1, 200) AS snippet
+            FROM ocr_text t
+            JOIN documents d ON d.document_id = t.document_id
+            WHERE d.user_id = :user_id AND t.extracted_text LIKE :query
+            ORDER BY d.uploaded_at DESC
+            LIMIT :limit
+        """
+
+    rows = session.execute(text(sql), params).mappings().all()
+    if dialect == "postgresql":
+        rows = _with_headlines(session, rows, params)
+    return [
+        {
+            "document_id": row["document_id"],
+            "file_name": row["file_name"],
+            "uploaded_at": _format_time(row["uploaded_at"]),
+            "rank": round(float(row["rank"] or 0), 4),
+            "snippet": _highlight(row["snippet"])
+        }
+        for row in rows
+    ]
+
+
+def _with_headlines(session, rows, params):
+    """Add ts_headline snippets to ranked hits. Compressed text is decoded
+    here and handed back to the database, and only for the rows returned."""
+    from extensions import text_codec
+
+    if not rows:
+        return rows
+    bodies = [text_codec.decode(row["extracted_text"], row["text_data"]) for row in rows]
+    snippets = session.execute(text(f"""
+        SELECT ts_headline('{TS_CONFIG}', b.body, websearch_to_tsquery('{TS_CONFIG}', :query),
+                           'StartSel=' || :start || ', StopSel=' || :stop || ', {HEADLINE_OPTIONS}')
+        FROM unnest(CAST(:bodies AS text[])) WITH ORDINALITY AS b(body, n)
+        ORDER BY b.n
+    """), {"query": params["query"], "start": params["start"], "stop": params["stop"], "bodies": bodies}).scalars().all()
+    return [{**row, "snippet": snippet} for row, snippet in zip(rows, snippets)]
+
+
+def _format_time(value):
+    # SQLite hands back raw text for DATETIME columns in textual queries
+    if hasattr(value, "strftime"):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return str(value)[:19] if value else None
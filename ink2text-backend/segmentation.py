@@ -0,0 +1,111 @@
+"""
+Page Segmentation for Ink2Text
+Splits a page into text regions with OpenCV so a single large image can be
+OCR'd by several workers at once. Ink is smeared together with a
+morphological dilation sized to the text and connected blobs become blocks
+(the dilation also leaves a margin around the ink). Blocks taller than the
+target region height are cut halfway between lines. Regions are returned
+in reading order.
+"""
+
+import math
+
+import lazy
+
+cv2 = lazy.module("cv2")
+np = lazy.module("numpy")
+
+# Smallest region (in text lines) worth a Tesseract call of its own
+MIN_REGION_LINES = 3
+# Scattered notes can produce many tiny blocks; above this many per target
+# region the blobs are smeared together harder
+MAX_BLOCKS_PER_REGION = 4
+
+
+def _ink_mask(gray):
+    """Ink as 255 with paper grain and specks removed, so they can't bridge blocks."""
+    mask = cv2.threshold(cv2.medianBlur(gray, 3), 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+    return cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((2, 2), np.uint8))
+
+
+def _glyph_height(mask):
+    """Median height of character-sized blobs, the unit everything else scales with."""
+    _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    heights = heights[(heights > 4) & (heights < mask.shape[0] // 4)]
+    return int(np.median(heights)) if len(heights) else 0
+
+
+def _blocks(mask, glyph, spread=1):
+    """Bounding boxes of ink blobs after closing word and line gaps."""
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (glyph * 3 * spread, glyph * 2 * spread))
+    smeared = cv2.dilate(mask, kernel)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(smeared, connectivity=8)
+    boxes = []
+    for i in range(1, count):
+        x, y, w, h, _ = stats[i]
+        # Specks and rules thinner than a glyph aren't text
+        if h >= glyph and w >= glyph:
+            boxes.append((int(x), int(y), int(w), int(h)))
+    return boxes
+
+
+def _reading_order(boxes):
+    """Top to bottom; blocks sharing a band of rows (columns) left to right."""
+    rows = []
+    for box in sorted(boxes, key=lambda b: b[1]):
+        if rows and box[1] < rows[-1]["bottom"]:
+            rows[-1]["boxes"].append(box)
+            rows[-1]["bottom"] = max(rows[-1]["bottom"], box[1] + box[3])
+        else:
+            rows.append({"bottom": box[1] + box[3], "boxes": [box]})
+    return [box for row in rows for box in sorted(row["boxes"], key=lambda b: b[0])]
+
+
+def _split(mask, box, parts):
+    """Cut a block into up to ``parts`` strips, only between lines of text."""
+    x, y, w, h = box
+    inked = np.concatenate(([False], mask[y:y + h, x:x + w].any(axis=1), [False]))
+    # Runs of inked rows are lines of text: (first row, row after the last)
+    lines = np.flatnonzero(np.diff(inked.astype(np.int8))).reshape(-1, 2)
+    if parts < 2 or len(lines) < 2 * MIN_REGION_LINES:
+        return [box]
+
+    per_part = max(MIN_REGION_LINES, math.ceil(len(lines) / parts))
+    # Cut in the middle of the gap above every per_part-th line
+    cuts = [int(lines[i - 1][1] + lines[i][0]) // 2 for i in range(per_part, len(lines), per_part)]
+    bounds = [0] + cuts + [h]
+    return [(x, y + top, w, bottom - top) for top, bottom in zip(bounds, bounds[1:]) if bottom > top]
+
+
+def segment(gray, target_regions):
+    """Split ``gray`` into about ``target_regions`` text regions.
+
+    Returns ``(x, y, w, h)`` boxes in reading order; a single full-page box
+    when the page has too little text to be worth splitting.
+    """
+    height, width = gray.shape[:2]
+    page = [(0, 0, width, height)]
+    if target_regions < 2:
+        return page
+
+    mask = _ink_mask(gray)
+    glyph = _glyph_height(mask)
+    if not glyph:
+        return page
+
+    spread = 1
+    blocks = _blocks(mask, glyph)
+    while len(blocks) > target_regions * MAX_BLOCKS_PER_REGION and spread < 8:
+        spread *= 2
+        blocks = _blocks(mask, glyph, spread)
+    if not blocks:
+        return page
+    blocks = _reading_order(blocks)
+
+    # Spread the text height evenly over the target number of regions
+    region_height = max(sum(b[3] for b in blocks) / target_regions, glyph * 2 * MIN_REGION_LINES)
+    regions = []
+    for block in blocks:
+        regions.extend(_split(mask, block, math.ceil(block[3] / region_height)))
+    return regions if len(regions) > 1 else page
@@ -0,0 +1,119 @@
+"""
+Production Server for Ink2Text
+Runs the backend under gunicorn (Linux/macOS) or waitress (Windows)
+instead of the Flask debug server.
+
+Usage:
+    python serve.py
+    python serve.py --workers 4 --threads 8 --bind 0.0.0.0:5000
+
+Settings default to the SERVER_* values in config.py.
+"""
+
+import argparse
+import os
+import sys
+
+from config import Config
+
+
+def _split_ocr_workers(workers):
+    # Every server worker process gets its own OCR pool; share the cores
+    # between them unless OCR_WORKERS was set explicitly.
+    if "OCR_WORKERS" not in os.environ:
+        Config.OCR_WORKERS = max(1, (os.cpu_count() or 2) // workers)
+
+
+def _shared_job_broker(workers):
+    # The memory broker lives in one process: with several server workers,
+    # status and result polls would often reach one that never saw the job.
+    if workers > 1 and Config.JOB_BROKER == "memory":
+        if "JOB_BROKER" in os.environ:
+            sys.exit("JOB_BROKER=memory only works with --workers 1; use JOB_BROKER=sqlite for several workers")
+        Config.JOB_BROKER = "sqlite"
+
+
+# ---------------- GUNICORN HOOKS ----------------
+def post_fork(server, worker):
+    # The app (and its engine) was created in the master before forking;
+    # connections inherited from it must not be shared between workers.
+    from app import app
+    from extensions import db, job_queue, readiness
+    with app.app_context():
+        db.engine.dispose(close=False)
+    job_queue.after_fork()
+    # Warm up now rather than on this worker's first request
+    readiness.start()
+
+
+def worker_exit(server, worker):
+    from extensions import ocr_pool, job_queue
+    job_queue.shutdown()
+    ocr_pool.shutdown(wait=False)
+
+
+def run_gunicorn(bind, workers, threads, timeout, graceful_timeout):
+    from gunicorn.app.base import BaseApplication
+
+    class Ink2TextServer(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", bind)
+            self.cfg.set("workers", workers)
+            self.cfg.set("threads", threads)
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("preload_app", True)
+            self.cfg.set("timeout", timeout)
+            self.cfg.set("graceful_timeout", graceful_timeout)
+            self.cfg.set("post_fork", post_fork)
+            self.cfg.set("worker_exit", worker_exit)
+            self.cfg.set("accesslog", "-")
+
+        def load(self):
+            from app import app
+            return app
+
+    Ink2TextServer().run()
+
+
+def run_waitress(bind, threads):
+    from waitress import serve
+    from app import app
+    from extensions import job_queue, readiness
+
+    host, port = bind.rsplit(":", 1)
+    job_queue.start()
+    readiness.start()
+    try:
+        serve(app, host=host, port=int(port), threads=threads)
+    finally:
+        worker_exit(None, None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Ink2Text backend in production mode")
+    parser.add_argument("--bind", default=f"{Config.SERVER_HOST}:{Config.SERVER_PORT}")
+    parser.add_argument("--workers", type=int, default=Config.SERVER_WORKERS)
+    parser.add_argument("--threads", type=int, default=Config.SERVER_THREADS)
+    parser.add_argument("--timeout", type=int, default=Config.SERVER_TIMEOUT)
+    parser.add_argument("--graceful-timeout", type=int, default=Config.SERVER_GRACEFUL_TIMEOUT)
+    args = parser.parse_args()
+
+    print("\n" + "="*50)
+    print("🚀 Starting Ink2Text Backend Server (production)")
+    print("="*50)
+    print(f"📍 Bind: {args.bind}")
+    print(f"👷 Workers: {args.workers} x {args.threads} threads")
+    print("="*50 + "\n")
+
+    if sys.platform == "win32":
+        # No fork on Windows: one process, many threads
+        _split_ocr_workers(1)
+        run_waitress(args.bind, args.threads)
+    else:
+        _split_ocr_workers(args.workers)
+        _shared_job_broker(args.workers)
+        run_gunicorn(args.bind, args.workers, args.threads, args.timeout, args.graceful_timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -90,6 +90,7 @@ if __name__ == "__main__":
             print("\n📝 Next steps:")
             print("   1. Run: python app.py")
             print("   2. Tables will be created automatically")
+            print("      (with LAZY_INIT=true, run `flask --app app init-db` first)")
         else:
             print("\n❌ Setup failed - connection test failed")
     else:
@@ -0,0 +1,58 @@
+import atexit
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+
+# config.py reads the environment on import: point everything the app
+# writes at a scratch directory before the app is imported
+_scratch = tempfile.mkdtemp(prefix="ink2text-tests-")
+atexit.register(shutil.rmtree, _scratch, ignore_errors=True)
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_scratch, 'ink2text.db')}"
+os.environ["BLOB_STORE_DIR"] = os.path.join(_scratch, "blobs")
+os.environ["JOB_BROKER_PATH"] = os.path.join(_scratch, "jobs.db")
+os.environ["RATE_LIMIT_PATH"] = os.path.join(_scratch, "ratelimit.db")
+os.environ["SECRET_KEY"] = "test-secret-key"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["RETENTION_DAYS"] = "0"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+# textcodec, auth and friends import extensions, which imports them back:
+# load it first, the way the app does
+import extensions  # noqa: E402,F401
+
+_emails = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app import app
+
+    app.config["TESTING"] = True
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def signup(client):
+    """Register a new user; returns ``(user, token)``."""
+
+    def signup(name="Test User"):
+        response = client.post("/api/auth/signup", json={
+            "name": name,
+            "email": f"user{next(_emails)}@example.com",
+            "password": "correct horse"
+        })
+        assert response.status_code == 201
+        body = response.get_json()
+        return body["user"], body["token"]
+
+    return signup
@@ -0,0 +1,198 @@
+import io
+import time
+
+import pytest
+
+from auth import AuthError
+
+
+def _auth(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+# ---------------- TOKENS ----------------
+def test_issue_and_verify(app, signup):
+    from extensions import token_auth
+
+    user, token = signup()
+    with app.app_context():
+        claims = token_auth.verify(token)
+    assert claims["uid"] == user["user_id"]
+    assert claims["jti"]
+
+
+def test_tampered_token(app, signup):
+    from extensions import token_auth
+
+    user, token = signup()
+    payload, _, signature = token.rpartition(".")
+    forged = payload + "." + signature[::-1]
+    for bad in (forged, token[:-4], "x" + token, "not-a-token"):
+        with app.app_context():
+            with pytest.raises(AuthError) as raised:
+                token_auth.verify(bad)
+        assert raised.value.code == 401
+
+
+def test_expired_token(app, signup, monkeypatch):
+    from extensions import token_auth
+
+    user, token = signup()
+    monkeypatch.setattr(token_auth, "ttl", -1)
+    with app.app_context():
+        with pytest.raises(AuthError, match="expired"):
+            token_auth.verify(token)
+
+
+def test_token_of_a_deleted_user(app, client):
+    from extensions import db, token_auth
+    from models import User
+
+    with app.app_context():
+        user = User(name="Gone", email="gone@example.com")
+        user.set_password("pw")
+        db.session.add(user)
+        db.session.commit()
+        token = token_auth.issue(user)["token"]
+        token_auth.users.pop(user.user_id)
+        db.session.delete(user)
+        db.session.commit()
+    assert client.get("/api/auth/me", headers=_auth(token)).status_code == 401
+
+
+def test_logout_revokes_only_that_token(client, signup):
+    user, token = signup()
+    other = client.post("/api/auth/login", json={"email": user["email"], "password": "correct horse"}).get_json()["token"]
+
+    assert client.get("/api/auth/me", headers=_auth(token)).get_json()["user"]["user_id"] == user["user_id"]
+    assert client.post("/api/auth/logout", headers=_auth(token)).status_code == 200
+    response = client.get("/api/auth/me", headers=_auth(token))
+    assert response.status_code == 401
+    assert response.headers["WWW-Authenticate"] == "Bearer"
+    assert client.get("/api/auth/me", headers=_auth(other)).status_code == 200
+
+
+@pytest.fixture
+def far_east(monkeypatch):
+    """Run in UTC+14, where naive UTC datetimes read as local time expire
+    hours before the token does."""
+    monkeypatch.setenv("TZ", "Pacific/Kiritimati")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_revocation_outside_utc(app, client, signup, far_east):
+    from extensions import token_auth
+
+    user, token = signup()
+    assert client.post("/api/auth/logout", headers=_auth(token)).status_code == 200
+    # The next check reloads the whole revocation list from the database
+    token_auth._revoked, token_auth._revoked_since, token_auth._refreshed = {}, None, 0.0
+    assert client.get("/api/auth/me", headers=_auth(token)).status_code == 401
+    token_auth._refreshed = 0.0
+    assert client.get("/api/auth/me", headers=_auth(token)).status_code == 401
+
+
+def test_revoke_user_ends_every_session(app, client, signup):
+    from extensions import db, token_auth
+
+    user, token = signup()
+    # Token timestamps have whole seconds, and revocation covers the
+    # current one: keep the tokens before and after it apart
+    time.sleep(1.1)
+    with app.app_context():
+        assert token_auth.revoke_user(user["user_id"])
+        db.session.commit()
+        assert not token_auth.revoke_user(10 ** 9)
+    assert client.get("/api/auth/me", headers=_auth(token)).status_code == 401
+
+    time.sleep(1.1)
+    fresh = client.post("/api/auth/login", json={"email": user["email"], "password": "correct horse"}).get_json()["token"]
+    assert client.get("/api/auth/me", headers=_auth(fresh)).status_code == 200
+
+
+def test_wrong_password(client, signup):
+    user, token = signup()
+    response = client.post("/api/auth/login", json={"email": user["email"], "password": "wrong"})
+    assert response.status_code == 401
+
+
+# ---------------- ROUTES ----------------
+def test_history_needs_the_users_token(client, signup):
+    user, token = signup()
+    other, other_token = signup()
+    url = f"/api/history/{user['user_id']}"
+
+    assert client.get(url).status_code == 401
+    assert client.get(url, headers=_auth(other_token)).status_code == 403
+    assert client.get(url, headers=_auth(token)).status_code == 200
+
+
+def test_documents_of_other_users_are_not_found(app, client, signup):
+    import persistence
+    from extensions import db
+
+    user, token = signup()
+    other, other_token = signup()
+    with app.app_context():
+        (document_id,) = persistence.insert_results([{"user_id": user["user_id"], "file_name": "a.png", "extracted_text": "mine"}])
+        db.session.commit()
+
+    assert client.delete(f"/api/history/{document_id}").status_code == 401
+    assert client.delete(f"/api/history/{document_id}", headers=_auth(other_token)).status_code == 404
+    assert client.delete(f"/api/history/{document_id}", headers=_auth(token)).status_code == 200
+
+
+def test_users_list_is_for_admins(client, signup, monkeypatch):
+    from extensions import token_auth
+
+    user, token = signup()
+    assert client.get("/api/users").status_code == 401
+    assert client.get("/api/users", headers=_auth(token)).status_code == 403
+
+    monkeypatch.setattr(token_auth, "admin_ids", {user["user_id"]})
+    response = client.get("/api/users", headers=_auth(token))
+    assert response.status_code == 200
+    assert user["user_id"] in [listed["user_id"] for listed in response.get_json()["users"]]
+
+
+def test_guest_ocr_needs_no_token(client):
+    response = client.post("/api/ocr", data={"image": (io.BytesIO(b""), "page.png")})
+    assert response.status_code == 200
+    assert response.get_json()["message"] == "Guest conversion - not saved"
+
+
+def test_ocr_for_a_user_needs_their_token(client, signup):
+    user, token = signup()
+    other, other_token = signup()
+
+    def form():
+        return {"user_id": str(user["user_id"]), "image": (io.BytesIO(b""), "")}
+
+    assert client.post("/api/ocr", data=form()).status_code == 401
+    assert client.post("/api/ocr", data=form(), headers=_auth(other_token)).status_code == 403
+    assert client.post("/api/ocr", data=form(), headers=_auth(token)).status_code == 400
+
+
+def test_rate_limit_follows_the_token_user(client, signup, monkeypatch):
+    from extensions import rate_limiter
+    from ratelimit import MemoryBackend
+
+    monkeypatch.setattr(rate_limiter, "enabled", True)
+    monkeypatch.setattr(rate_limiter, "backend", MemoryBackend())
+    monkeypatch.setattr(rate_limiter, "rate", 0.001)
+    monkeypatch.setattr(rate_limiter, "burst", 1)
+
+    user, token = signup()
+    other, other_token = signup()
+
+    def submit(token, user_id):
+        return client.post("/api/ocr/jobs", data={"user_id": str(user_id), "image": (io.BytesIO(b""), "")}, headers=_auth(token))
+
+    assert submit(token, user["user_id"]).status_code == 400
+    assert submit(token, user["user_id"]).status_code == 429
+    # Naming another user doesn't get a fresh bucket
+    assert submit(token, other["user_id"]).status_code == 403
+    assert submit(other_token, other["user_id"]).status_code == 400
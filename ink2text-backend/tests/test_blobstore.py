@@ -0,0 +1,115 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from blobstore import BlobStore, make_thumbnail
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = BlobStore()
+    store.root = str(tmp_path / "blobs")
+    return store
+
+
+def test_put_addresses_by_content(store):
+    digest = store.put(PNG)
+    assert digest == BlobStore.digest(PNG)
+    assert store.path(digest) == os.path.join(store.root, digest[:2], digest[2:4], digest)
+    with open(store.path(digest), "rb") as f:
+        assert f.read() == PNG
+
+
+def test_identical_content_is_stored_once(store):
+    assert store.put(PNG) == store.put(memoryview(PNG))
+    assert [digest for digest, mtime in store.walk()] == [BlobStore.digest(PNG)]
+
+
+def test_put_refreshes_existing_blobs(store):
+    digest = store.put(PNG)
+    os.utime(store.path(digest), (0, 0))
+    store.put(PNG)
+    assert os.path.getmtime(store.path(digest)) > time.time() - 60
+
+
+def test_collect_keeps_referenced_and_recent_blobs(store):
+    kept, recent, old = store.put(PNG), store.put(b"recent"), store.put(b"old")
+    for digest in (kept, old):
+        os.utime(store.path(digest), (0, 0))
+    # A temporary file of an upload in progress is never a blob
+    open(os.path.join(os.path.dirname(store.path(old)), ".tmp-upload"), "wb").close()
+
+    assert store.collect({kept}, grace=3600) == 1
+    assert store.exists(kept) and store.exists(recent)
+    assert not store.exists(old)
+
+
+def test_collect_without_a_store(store):
+    assert store.collect(set()) == 0
+
+
+def test_send_streams_with_a_strong_etag(app, store):
+    digest = store.put(PNG)
+    with app.test_request_context():
+        response = store.send(digest)
+        assert response.mimetype == "image/png"
+        assert response.get_etag() == (digest, False)
+        assert response.cache_control.private
+        assert not response.cache_control.public
+        response.close()
+
+    with app.test_request_context(headers={"If-None-Match": f'"{digest}"'}):
+        response = store.send(digest)
+        assert response.status_code == 304
+        response.close()
+    with pytest.raises(FileNotFoundError):
+        with app.test_request_context():
+            store.send("0" * 64)
+
+
+def test_send_as_download(app, store):
+    digest = store.put(PNG)
+    with app.test_request_context():
+        response = store.send(digest, download_name="page.png")
+        assert response.headers["Content-Disposition"] == "attachment; filename=page.png"
+        response.close()
+
+
+def test_thumbnail_keeps_the_aspect_ratio():
+    import cv2
+
+    gray = np.full((1000, 500), 255, np.uint8)
+    thumbnail = cv2.imdecode(np.frombuffer(make_thumbnail(gray, max_side=320), np.uint8), cv2.IMREAD_GRAYSCALE)
+    assert thumbnail.shape == (320, 160)
+
+    small = np.full((100, 50), 255, np.uint8)
+    thumbnail = cv2.imdecode(np.frombuffer(make_thumbnail(small, max_side=320), np.uint8), cv2.IMREAD_GRAYSCALE)
+    assert thumbnail.shape == (100, 50)
+
+
+def test_document_images_are_served_to_their_owner(app, client, signup):
+    import persistence
+    from extensions import blob_store, db
+
+    user, token = signup()
+    other, other_token = signup()
+    digest = blob_store.put(PNG)
+    with app.app_context():
+        (document_id,) = persistence.insert_results([{
+            "user_id": user["user_id"], "file_name": "page.png", "extracted_text": "text",
+            "original_blob": digest, "thumbnail_blob": digest
+        }])
+        db.session.commit()
+
+    url = f"/api/history/{document_id}/original"
+    assert client.get(url).status_code == 401
+    assert client.get(url, headers={"Authorization": f"Bearer {other_token}"}).status_code == 404
+    response = client.get(url, headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.data == PNG
+    revalidated = client.get(url, headers={"Authorization": f"Bearer {token}", "If-None-Match": response.headers["ETag"]})
+    assert revalidated.status_code == 304
@@ -0,0 +1,112 @@
+import sqlite3
+import time
+
+import pytest
+from flask import Flask
+
+from jobs import JobQueue, MemoryBroker, SQLiteBroker
+
+
+def _job(job_id, created_at=None):
+    return {
+        "job_id": job_id, "status": "queued", "user_id": None, "callback_url": None,
+        "created_at": created_at or time.time(), "started_at": None, "finished_at": None,
+        "result": None, "error": None
+    }
+
+
+def _wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+@pytest.fixture
+def broker_path(tmp_path):
+    return str(tmp_path / "jobs.db")
+
+
+@pytest.fixture
+def job_app(broker_path):
+    app = Flask(__name__)
+    app.config.update(JOB_BROKER="sqlite", JOB_BROKER_PATH=broker_path, JOB_WORKERS=1)
+    return app
+
+
+def test_payload_round_trip(broker_path):
+    broker = SQLiteBroker(broker_path, 10)
+    broker.enqueue(_job("a"), {"data": b"\x89PNG", "file_name": "page.png"})
+    assert broker.depth() == 1
+    assert broker.dequeue(timeout=0) == ("a", {"data": b"\x89PNG", "file_name": "page.png"})
+    assert broker.depth() == 0
+    assert broker.dequeue(timeout=0) is None
+
+
+def test_running_jobs_are_queued_again_after_a_restart(broker_path):
+    broker = SQLiteBroker(broker_path, 10)
+    broker.enqueue(_job("a"), {"data": b"page"})
+    broker.dequeue(timeout=0)
+    broker.update("a", status="running", started_at=time.time())
+
+    restarted = SQLiteBroker(broker_path, 10)
+    assert restarted.depth() == 1
+    assert restarted.dequeue(timeout=0) == ("a", {"data": b"page"})
+
+
+def test_queued_jobs_run_without_a_new_submit(job_app, broker_path):
+    SQLiteBroker(broker_path, 10).enqueue(_job("left-over"), {"data": b"page"})
+
+    jobs = JobQueue(job_app, handler=lambda payload: {"text": payload["data"].decode()})
+    try:
+        # The first request of the restarted process starts the dispatchers
+        job_app.test_client().get("/")
+        _wait_for(lambda: jobs.get("left-over")["status"] == "done")
+        assert jobs.get("left-over")["result"] == {"text": "page"}
+    finally:
+        jobs.shutdown()
+
+
+def test_start_is_idempotent(job_app):
+    jobs = JobQueue(job_app, handler=lambda payload: None)
+    try:
+        jobs.start()
+        threads = list(jobs._threads)
+        jobs.start()
+        assert jobs._threads == threads and len(threads) == 1
+    finally:
+        jobs.shutdown()
+
+
+@pytest.mark.parametrize("broker_type", ["memory", "sqlite"])
+def test_prune_by_finish_time(broker_type, broker_path):
+    broker = MemoryBroker(10) if broker_type == "memory" else SQLiteBroker(broker_path, 10)
+    now = time.time()
+    # Waited in the queue for hours, finished just now: still pollable
+    broker.enqueue(_job("slow", created_at=now - 7200), {"data": b""})
+    broker.update("slow", status="done", finished_at=now)
+    broker.enqueue(_job("old", created_at=now - 7200), {"data": b""})
+    broker.update("old", status="done", finished_at=now - 5000)
+    broker.enqueue(_job("waiting", created_at=now - 7200), {"data": b""})
+
+    broker.prune(now - 3600)
+    assert broker.get("slow") is not None
+    assert broker.get("old") is None
+    assert broker.get("waiting") is not None
+
+
+def test_broker_files_from_before_finished_at(broker_path):
+    with sqlite3.connect(broker_path) as conn:
+        conn.execute("""
+            CREATE TABLE jobs (
+                job_id TEXT PRIMARY KEY, status TEXT NOT NULL, job TEXT NOT NULL,
+                payload BLOB, created_at REAL NOT NULL
+            )
+        """)
+        conn.execute("INSERT INTO jobs VALUES ('old', 'done', '{}', NULL, ?)", (time.time() - 7200,))
+    conn.close()
+
+    broker = SQLiteBroker(broker_path, 10)
+    # Without a finish time the job falls back to its creation time
+    broker.prune(time.time() - 3600)
+    assert broker.get("old") is None
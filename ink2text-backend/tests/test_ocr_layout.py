@@ -0,0 +1,44 @@
+import pytest
+
+import ocr_layout
+
+
+def _words():
+    return {
+        "left": [10, 60, 10],
+        "top": [5, 5, 40],
+        "width": [40, 55, 70],
+        "height": [20, 20, 22],
+        "conf": [96, 71, -1],
+        "par": [1, 1, 2],
+        "line": [1, 1, 2],
+        "text": ["Hello", "wörld", "naïve✓"]
+    }
+
+
+def test_pack_round_trip():
+    words = _words()
+    assert ocr_layout.unpack(ocr_layout.pack(words)) == words
+
+
+def test_pack_round_trip_without_words():
+    words = {name: [] for name in (*ocr_layout.INT_COLUMNS, "text")}
+    assert ocr_layout.unpack(ocr_layout.pack(words)) == words
+
+
+@pytest.mark.parametrize("blob", [None, b"", b"not a layout", b"IL2" + b"\x00" * 8])
+def test_unpack_rejects_other_data(blob):
+    with pytest.raises(ValueError):
+        ocr_layout.unpack(blob)
+
+
+def test_concat_offsets_regions():
+    words = _words()
+    joined = ocr_layout.concat([(words, 0, 0), (words, 100, 200)])
+    assert joined["text"] == words["text"] * 2
+    assert joined["left"] == [10, 60, 10, 110, 160, 110]
+    assert joined["top"] == [5, 5, 40, 205, 205, 240]
+    # Paragraphs and lines of the second region don't collide with the first
+    assert joined["par"] == [1, 1, 2, 4, 4, 5]
+    assert joined["line"] == [1, 1, 2, 4, 4, 5]
+    assert ocr_layout.unpack(ocr_layout.pack(joined)) == joined
@@ -0,0 +1,59 @@
+from datetime import datetime
+
+import pytest
+
+from pagination import InvalidCursorError, decode_cursor, encode_cursor, parse_limit
+
+
+def test_cursor_round_trip():
+    uploaded_at = datetime(2024, 1, 31, 12, 30, 5, 123456)
+    assert decode_cursor(encode_cursor(uploaded_at, 42)) == (uploaded_at, 42)
+
+
+def test_cursor_is_url_safe_without_padding():
+    cursor = encode_cursor(datetime(2024, 1, 31), 7)
+    assert "=" not in cursor
+    assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_")
+
+
+@pytest.mark.parametrize("cursor", ["", "not a cursor", "bm9waXBl", encode_cursor(datetime(2024, 1, 1), 1)[:-3]])
+def test_invalid_cursor(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize("value, expected", [(None, 50), ("10", 10), ("0", 1), ("-5", 1), ("1000", 200)])
+def test_parse_limit(value, expected):
+    assert parse_limit(value, 50, 200) == expected
+
+
+def test_parse_limit_rejects_non_integers():
+    with pytest.raises(ValueError):
+        parse_limit("ten", 50, 200)
+
+
+def test_history_pages_follow_the_cursor(app, client, signup):
+    import persistence
+    from extensions import db
+
+    user, token = signup()
+    with app.app_context():
+        for i in range(5):
+            persistence.insert_results([{"user_id": user["user_id"], "file_name": f"{i}.png", "extracted_text": f"page {i}"}])
+        db.session.commit()
+
+    seen, cursor = [], None
+    while True:
+        url = f"/api/history/{user['user_id']}?view=summary&limit=2" + (f"&cursor={cursor}" if cursor else "")
+        body = client.get(url, headers={"Authorization": f"Bearer {token}"}).get_json()
+        seen += [item["file_name"] for item in body["history"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == ["4.png", "3.png", "2.png", "1.png", "0.png"]
+
+
+def test_history_rejects_a_bad_cursor(client, signup):
+    user, token = signup()
+    response = client.get(f"/api/history/{user['user_id']}?cursor=garbage", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 400
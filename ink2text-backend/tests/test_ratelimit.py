@@ -0,0 +1,92 @@
+import pytest
+
+import ratelimit
+from ratelimit import MemoryBackend, RateLimiter, RateLimitExceeded, SQLiteBackend
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock)
+    monkeypatch.setattr(ratelimit.time, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path, clock):
+    if request.param == "memory":
+        return MemoryBackend()
+    return SQLiteBackend(path=str(tmp_path / "ratelimit.db"))
+
+
+def test_burst_then_rate(backend, clock):
+    # rate 2/s, burst 3
+    assert [backend.take("k", 1, 2.0, 3) for i in range(3)] == [0, 0, 0]
+    assert backend.take("k", 1, 2.0, 3) == pytest.approx(0.5)
+
+    clock.now += 0.5
+    assert backend.take("k", 1, 2.0, 3) == 0
+    assert backend.take("k", 1, 2.0, 3) == pytest.approx(0.5)
+
+
+def test_refill_stops_at_burst(backend, clock):
+    for i in range(3):
+        backend.take("k", 1, 2.0, 3)
+    clock.now += 3600
+    assert [backend.take("k", 1, 2.0, 3) for i in range(3)] == [0, 0, 0]
+    assert backend.take("k", 1, 2.0, 3) > 0
+
+
+def test_denied_requests_cost_nothing(backend, clock):
+    assert backend.take("k", 3, 1.0, 3) == 0
+    for i in range(5):
+        assert backend.take("k", 1, 1.0, 3) == pytest.approx(1.0)
+    clock.now += 1
+    assert backend.take("k", 1, 1.0, 3) == 0
+
+
+def test_buckets_are_per_key(backend):
+    assert backend.take("user:1", 3, 1.0, 3) == 0
+    assert backend.take("user:1", 1, 1.0, 3) > 0
+    assert backend.take("user:2", 1, 1.0, 3) == 0
+
+
+def test_no_refill_without_rate(backend):
+    assert backend.take("k", 1, 0, 1) == 0
+    assert backend.take("k", 1, 0, 1) == float("inf")
+
+
+def test_key():
+    assert RateLimiter.key(7, "10.0.0.1") == "user:7"
+    assert RateLimiter.key(None, "10.0.0.1") == "ip:10.0.0.1"
+
+
+def test_hit_raises_with_retry_after(clock):
+    limiter = RateLimiter()
+    limiter.backend = MemoryBackend()
+    limiter.rate, limiter.burst = 0.5, 2
+    limiter.hit("k")
+    limiter.hit("k")
+    with pytest.raises(RateLimitExceeded) as raised:
+        limiter.hit("k")
+    assert raised.value.code == 429
+    assert raised.value.retry_after == pytest.approx(2.0)
+
+    # A request costing more than the burst waits for a full bucket instead of never passing
+    clock.now += 4
+    limiter.hit("k", cost=10)
+
+
+def test_disabled_limiter_never_raises():
+    limiter = RateLimiter()
+    limiter.enabled = False
+    for i in range(100):
+        limiter.hit("k")
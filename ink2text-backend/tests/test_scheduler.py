@@ -0,0 +1,130 @@
+import threading
+import time
+from concurrent.futures import CancelledError, Future
+
+import pytest
+
+from scheduler import BATCH, INTERACTIVE, FairScheduler, parse_weights
+
+
+class Dispatcher:
+    """Stands in for the worker pool: records what starts, in order, and
+    leaves each job running until finish() is called."""
+
+    def __init__(self):
+        self.started = []
+        self.running = []
+        self._cond = threading.Condition()
+
+    def __call__(self, fn, *args):
+        future = Future()
+        with self._cond:
+            self.started.append(args[0])
+            self.running.append(future)
+            self._cond.notify_all()
+        return future
+
+    def wait_started(self, count, timeout=5):
+        with self._cond:
+            assert self._cond.wait_for(lambda: len(self.started) >= count, timeout), self.started
+
+    def finish(self, index, result=None):
+        self.running[index].set_result(result)
+
+    def run_all(self, count):
+        """Let ``count`` jobs run one after another; returns their start order."""
+        for i in range(count):
+            self.wait_started(i + 1)
+            self.finish(i, self.started[i])
+        return self.started[:count]
+
+
+def _blocked(capacity=1, **kwargs):
+    """Scheduler whose workers are all busy until the dispatcher's first
+    jobs are finished, so everything submitted next queues up."""
+    scheduler, dispatcher = FairScheduler(capacity, **kwargs), Dispatcher()
+    for i in range(capacity):
+        scheduler.submit(dispatcher, None, (f"blocker{i}",), owner="blocker")
+    dispatcher.wait_started(capacity)
+    return scheduler, dispatcher
+
+
+def test_lanes_are_served_by_weight():
+    scheduler, dispatcher = _blocked(lane_weights={INTERACTIVE: 4, BATCH: 1})
+    for i in range(8):
+        scheduler.submit(dispatcher, None, ("interactive",), owner="a")
+    for i in range(4):
+        scheduler.submit(dispatcher, None, ("batch",), owner="b", lane=BATCH)
+
+    order = dispatcher.run_all(13)[1:]
+    # 4 interactive jobs for every batch job while both lanes have work
+    for window in (order[:5], order[5:10]):
+        assert window.count("batch") == 1
+    assert order[10:] == ["batch", "batch"]
+
+
+def test_owners_take_weighted_turns():
+    scheduler, dispatcher = _blocked(owner_weights={"7": 3})
+    for i in range(6):
+        scheduler.submit(dispatcher, None, ("7",), owner=7, lane=BATCH)
+    for i in range(6):
+        scheduler.submit(dispatcher, None, ("8",), owner=8, lane=BATCH)
+
+    order = dispatcher.run_all(13)[1:]
+    assert order == ["7", "7", "7", "8", "7", "7", "7", "8", "8", "8", "8", "8"]
+
+
+def test_results_come_back_through_the_future():
+    scheduler, dispatcher = FairScheduler(2), Dispatcher()
+    future = scheduler.submit(dispatcher, None, ("job",))
+    dispatcher.wait_started(1)
+    dispatcher.finish(0, "text")
+    assert future.result(timeout=5) == "text"
+    assert scheduler.running == 0
+
+
+def test_cancel_waiting_never_dispatches():
+    scheduler, dispatcher = _blocked()
+    waiting = [scheduler.submit(dispatcher, None, ("waiting",), lane=BATCH) for i in range(3)]
+    assert scheduler.waiting() == 3
+    assert scheduler.waiting(BATCH) == 3
+
+    scheduler.cancel_waiting()
+    assert scheduler.waiting() == 0
+    for future in waiting:
+        with pytest.raises(CancelledError):
+            future.result(timeout=5)
+
+    dispatcher.finish(0)
+    time.sleep(0.1)
+    assert dispatcher.started == ["blocker0"]
+
+
+def test_dispatch_errors_free_the_worker():
+    scheduler = FairScheduler(1)
+
+    def broken(fn, *args):
+        raise RuntimeError("pool is gone")
+
+    future = scheduler.submit(broken, None, ("job",))
+    with pytest.raises(RuntimeError):
+        future.result(timeout=5)
+
+    dispatcher = Dispatcher()
+    future = scheduler.submit(dispatcher, None, ("next",))
+    dispatcher.wait_started(1)
+    dispatcher.finish(0, "ok")
+    assert future.result(timeout=5) == "ok"
+
+
+def test_unknown_lane():
+    with pytest.raises(ValueError):
+        FairScheduler(1).submit(Dispatcher(), None, ("job",), lane="urgent")
+
+
+def test_parse_weights():
+    assert parse_weights("interactive:4, batch:1") == {"interactive": 4, "batch": 1}
+    assert parse_weights("7:3,12:0") == {"7": 3, "12": 1}
+    assert parse_weights(None) == {}
+    with pytest.raises(ValueError):
+        parse_weights("7:lots")
@@ -0,0 +1,69 @@
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine, inspect
+
+import schema
+
+# The tables as the first release created them
+BASELINE = """
+CREATE TABLE documents (
+    document_id INTEGER PRIMARY KEY,
+    file_name VARCHAR(255) NOT NULL,
+    uploaded_at DATETIME
+);
+CREATE TABLE ocr_text (
+    ocr_id INTEGER PRIMARY KEY,
+    document_id INTEGER NOT NULL REFERENCES documents (document_id),
+    extracted_text TEXT NOT NULL,
+    confidence_score FLOAT
+);
+INSERT INTO documents VALUES (1, 'page.png', '2024-01-31 12:00:00');
+INSERT INTO ocr_text VALUES (1, 1, 'old text', 87.5);
+"""
+
+
+@pytest.fixture
+def engine(tmp_path):
+    path = tmp_path / "baseline.db"
+    with sqlite3.connect(path) as conn:
+        conn.executescript(BASELINE)
+    engine = create_engine(f"sqlite:///{path}")
+    yield engine
+    engine.dispose()
+
+
+def _columns(engine, table):
+    return {column["name"] for column in inspect(engine).get_columns(table)}
+
+
+def _indexes(engine, table):
+    return {index["name"]: index["column_names"] for index in inspect(engine).get_indexes(table)}
+
+
+def test_upgrade_from_the_baseline(engine):
+    schema.upgrade(engine)
+
+    assert {"user_id", "image_hash", "original_blob", "thumbnail_blob"} <= _columns(engine, "documents")
+    assert {"passes", "text_data"} <= _columns(engine, "ocr_text")
+    assert _indexes(engine, "documents")["ix_documents_image_hash"] == ["image_hash"]
+    assert _indexes(engine, "documents")["ix_documents_user_uploaded"] == ["user_id", "uploaded_at", "document_id"]
+    assert _indexes(engine, "ocr_text")["ix_ocr_text_document_id"] == ["document_id"]
+
+    with engine.connect() as conn:
+        row = conn.exec_driver_sql("SELECT document_id, file_name, user_id FROM documents").one()
+    assert tuple(row) == (1, "page.png", None)
+
+
+def test_upgrade_is_idempotent(engine):
+    schema.upgrade(engine)
+    before = {table: (_columns(engine, table), _indexes(engine, table)) for table in ("documents", "ocr_text")}
+    schema.upgrade(engine)
+    assert before == {table: (_columns(engine, table), _indexes(engine, table)) for table in ("documents", "ocr_text")}
+
+
+def test_upgrade_skips_missing_tables(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'empty.db'}")
+    schema.upgrade(engine)
+    assert inspect(engine).get_table_names() == []
+    engine.dispose()
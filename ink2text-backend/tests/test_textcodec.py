@@ -0,0 +1,83 @@
+import pytest
+
+from textcodec import TextCodec, TextCodecError, prefix_bytes, zlib_dictionary, zstandard
+
+CODECS = ["zlib"] + (["zstd"] if zstandard else [])
+
+PAGE = "Dear customer, your receipt for the monthly subscription is attached. Grüße ✓ " * 20
+TEXTS = ["", "short", "naïve café ✓", PAGE, "\n".join(f"line {i}" for i in range(500))]
+
+
+@pytest.fixture
+def codec(app, request):
+    """A TextCodec for ``request.param`` inside a transaction that is
+    rolled back afterwards, so trained dictionaries don't leak."""
+    from extensions import db
+
+    codec = TextCodec()
+    codec.codec = getattr(request, "param", "zlib")
+    with app.app_context():
+        yield codec
+        db.session.rollback()
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_plain_round_trip(app, text):
+    with app.app_context():
+        plain = TextCodec()
+        assert plain.encode(text) == (text, None)
+        assert plain.decode(*plain.encode(text)) == text
+
+
+@pytest.mark.parametrize("codec", CODECS, indirect=True)
+@pytest.mark.parametrize("text", TEXTS)
+def test_compressed_round_trip(codec, text):
+    extracted_text, text_data = codec.encode(text)
+    if text_data is not None:
+        assert extracted_text == ""
+        assert len(text_data) < len(text.encode("utf-8"))
+    assert codec.decode(extracted_text, text_data) == text
+
+
+@pytest.mark.parametrize("codec", CODECS, indirect=True)
+def test_short_text_stays_plain(codec):
+    assert codec.encode("x" * (codec.min_bytes - 1)) == ("x" * (codec.min_bytes - 1), None)
+
+
+@pytest.mark.parametrize("codec", CODECS, indirect=True)
+def test_dictionary_round_trip(codec):
+    before = codec.encode(PAGE)[1]
+    dictionary = codec.train([PAGE.replace("monthly", word) for word in ("weekly", "yearly", "daily")] * 5)
+
+    extracted_text, text_data = codec.encode(PAGE)
+    assert int.from_bytes(text_data[1:5], "big") == dictionary.dict_id
+    assert len(text_data) < len(before)
+    assert codec.decode(extracted_text, text_data) == PAGE
+    # Text compressed before the dictionary still reads back
+    assert codec.decode("", before) == PAGE
+
+
+def test_decode_prefix(codec):
+    extracted_text, text_data = codec.encode(PAGE)
+    for max_chars in (1, 50, 120):
+        assert codec.decode(extracted_text, text_data[:prefix_bytes(max_chars)], max_chars) == PAGE[:max_chars]
+    # Too little of the value decodes to what it holds, never garbage
+    assert PAGE.startswith(codec.decode(extracted_text, text_data[:20], 120))
+    assert codec.decode("plain text", None, 5) == "plain"
+
+
+def test_unknown_codec(codec):
+    with pytest.raises(TextCodecError):
+        codec.decode("", b"\x09\x00\x00\x00\x00payload")
+
+
+def test_train_needs_compression(app):
+    with app.app_context():
+        with pytest.raises(TextCodecError):
+            TextCodec().train([PAGE])
+
+
+def test_zlib_dictionary_puts_frequent_words_last():
+    dictionary = zlib_dictionary(["alpha beta beta gamma gamma gamma", "gamma beta"], 64)
+    # Words seen only once save nothing
+    assert dictionary.split() == [b"beta", b"gamma"]
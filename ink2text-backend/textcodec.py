@@ -0,0 +1,363 @@
+"""
+Compressed OCR Text for Ink2Text
+Extracted text is most of the ocr_text table. With TEXT_COMPRESSION set,
+new text is stored compressed in ocr_text.text_data and extracted_text is
+left empty; rows written before (or too short to gain anything) stay plain,
+and OCRText.text reads either kind.
+
+- codecs: "zlib", or "zstd" when the zstandard package is installed
+- dictionaries: most pages are short and share words, which a general
+  compressor can't exploit within a single page. ``flask text train``
+  builds a dictionary from stored pages (zstd's trainer, or the most
+  frequent words for zlib) and keeps it in text_dictionaries; new text
+  is compressed with the newest one
+- ``flask text recompress`` rewrites existing rows with the current codec
+  and dictionary in small transactions, e.g. after enabling compression,
+  training a dictionary, or with TEXT_COMPRESSION=none to undo it
+
+Each value starts with a codec byte and the ID of its dictionary (0 for
+none), so rows written with different settings can be read side by side.
+Full-text search indexes the decoded text, see search.py; on SQLite its
+snippets read it through the ocr_plain_text() SQL function registered here.
+"""
+
+import codecs
+import json
+import struct
+import threading
+import zlib
+from collections import Counter
+
+import click
+from sqlalchemy import event
+
+from extensions import db
+
+try:
+    import zstandard
+except ImportError:  # optional; zlib only without it
+    zstandard = None
+
+_HEADER = struct.Struct(">BI")  # codec, dictionary ID
+CODECS = {"zlib": 1, "zstd": 2}
+
+# Compression only runs on these; elsewhere search couldn't read the text
+DIALECTS = ("postgresql", "sqlite")
+
+
+class TextCodecError(Exception):
+    """Raised when stored text can't be decoded or a dictionary can't be built."""
+
+
+def zlib_dictionary(samples, size):
+    """Preset dictionary of the words that save the most across ``samples``.
+
+    zlib finds matches more cheaply the closer they are to the data, so
+    the most valuable words go last.
+    """
+    counts = Counter(word for sample in samples for word in sample.split() if len(word) > 2)
+    words, total = [], 0
+    for word, count in counts.most_common():
+        if count < 2:
+            break
+        if total + len(word) + 1 > size:
+            break
+        words.append(word)
+        total += len(word) + 1
+    return " ".join(reversed(words)).encode("utf-8")
+
+
+def prefix_bytes(max_chars):
+    """How much of text_data decode(..., max_chars) needs: zlib output
+    starts with the first bytes read, and UTF-8 has up to 4 bytes a
+    character, plus room for the block headers."""
+    return _HEADER.size + 4 * max_chars + 1024
+
+
+def _stored_size(extracted_text, text_data):
+    return len(text_data) if text_data is not None else len(extracted_text.encode("utf-8"))
+
+
+class TextCodec:
+    def __init__(self, app=None):
+        self.app = None
+        self.codec = None  # None stores plain text
+        self.level = None
+        self.min_bytes = 64
+        self.dictionary_size = 32 * 1024
+        self._dictionaries = {}  # dict_id -> (codec, raw bytes)
+        self._active = None  # (dict_id, codec) used for new text, 0 for none
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        codec = app.config.get("TEXT_COMPRESSION", "none").lower()
+        if codec not in ("none", *CODECS):
+            raise ValueError(f"Unknown text compression: {codec}. Use none, zlib or zstd")
+        if codec == "zstd" and zstandard is None:
+            app.logger.warning("TEXT_COMPRESSION=zstd needs the zstandard package; using zlib")
+            codec = "zlib"
+        self.codec = None if codec == "none" else codec
+        self.level = app.config.get("TEXT_COMPRESSION_LEVEL")
+        self.min_bytes = app.config.get("TEXT_COMPRESSION_MIN_BYTES", self.min_bytes)
+        self.dictionary_size = app.config.get("TEXT_DICTIONARY_SIZE", self.dictionary_size)
+        app.extensions["text_codec"] = self
+
+        with app.app_context():
+            engine = db.engine
+        if self.codec and engine.dialect.name not in DIALECTS:
+            app.logger.warning("Text compression isn't supported on %s; storing plain text", engine.dialect.name)
+            self.codec = None
+        if engine.dialect.name == "sqlite":
+            event.listen(engine, "connect", self._register_sqlite_function)
+
+        self._init_cli(app)
+
+    def _register_sqlite_function(self, dbapi_connection, connection_record):
+        # Used by the full-text index's content view
+        dbapi_connection.create_function("ocr_plain_text", 2, self.decode, deterministic=True)
+
+    # ---------------- DICTIONARIES ----------------
+    def _dictionary(self, dict_id):
+        entry = self._dictionaries.get(dict_id)
+        if entry is None:
+            from models import TextDictionary
+
+            # Own connection: this may run inside a SQLite trigger on the session's
+            with self.app.app_context(), db.engine.connect() as conn:
+                row = conn.execute(
+                    db.select(TextDictionary.codec, TextDictionary.data).where(TextDictionary.dict_id == dict_id)
+                ).first()
+            if row is None:
+                raise TextCodecError(f"Text dictionary {dict_id} not found")
+            entry = self._dictionaries[dict_id] = (row.codec, row.data)
+        return entry
+
+    def _active_dictionary(self):
+        """ID of the newest dictionary for the current codec, 0 for none.
+        Looked up once per process; restart to pick up a newer one."""
+        if self._active is None or self._active[1] != self.codec:
+            from models import TextDictionary
+
+            with self._lock:
+                row = db.session.execute(
+                    db.select(TextDictionary.dict_id, TextDictionary.data)
+                    .where(TextDictionary.codec == self.codec)
+                    .order_by(TextDictionary.dict_id.desc())
+                    .limit(1)
+                ).first()
+                if row is not None:
+                    self._dictionaries[row.dict_id] = (self.codec, row.data)
+                self._active = (row.dict_id if row else 0, self.codec)
+        return self._active[0]
+
+    def train(self, samples):
+        """Build a dictionary for the current codec from sample texts and
+        make it the one new text is compressed with. Runs in the caller's
+        transaction; returns the new TextDictionary."""
+        from models import TextDictionary
+
+        if self.codec is None:
+            raise TextCodecError("Text compression is disabled; set TEXT_COMPRESSION first")
+        if self.codec == "zstd":
+            try:
+                data = zstandard.train_dictionary(
+                    self.dictionary_size, [sample.encode("utf-8") for sample in samples]
+                ).as_bytes()
+            except zstandard.ZstdError as e:
+                raise TextCodecError(f"Could not train a dictionary: {e}")
+        else:
+            # zlib only looks back 32 KB
+            data = zlib_dictionary(samples, min(self.dictionary_size, 32 * 1024))
+        if not data:
+            raise TextCodecError("Not enough sample text to build a dictionary")
+
+        dictionary = TextDictionary(codec=self.codec, data=data, samples=len(samples))
+        db.session.add(dictionary)
+        db.session.flush()
+        self._dictionaries[dictionary.dict_id] = (self.codec, data)
+        self._active = (dictionary.dict_id, self.codec)
+        return dictionary
+
+    # ---------------- ENCODING ----------------
+    def _zstd(self, kind, dict_id, data):
+        # Compressors are not thread-safe and slow to set up with a dictionary
+        cache = self._local.__dict__.setdefault(kind, {})
+        if dict_id not in cache:
+            options = {"dict_data": zstandard.ZstdCompressionDict(data)} if data else {}
+            if kind == "compressor":
+                cache[dict_id] = zstandard.ZstdCompressor(level=self.level or 9, **options)
+            else:
+                cache[dict_id] = zstandard.ZstdDecompressor(**options)
+        return cache[dict_id]
+
+    def encode(self, text):
+        """``(extracted_text, text_data)`` column values to store ``text``."""
+        raw = text.encode("utf-8")
+        if self.codec is None or len(raw) < self.min_bytes:
+            return text, None
+
+        dict_id = self._active_dictionary()
+        data = self._dictionary(dict_id)[1] if dict_id else None
+        if self.codec == "zstd":
+            payload = self._zstd("compressor", dict_id, data).compress(raw)
+        else:
+            options = {"zdict": data} if data else {}
+            compressor = zlib.compressobj(self.level if self.level is not None else 6, **options)
+            payload = compressor.compress(raw) + compressor.flush()
+
+        encoded = _HEADER.pack(CODECS[self.codec], dict_id) + payload
+        if len(encoded) >= len(raw):
+            return text, None
+        return "", encoded
+
+    def decode(self, extracted_text, text_data, max_chars=None):
+        """The text stored as ``(extracted_text, text_data)``.
+
+        With ``max_chars``, only its first ``max_chars`` characters, and
+        ``text_data`` may be just the start of the stored value (see
+        prefix_bytes()). What can't be decoded from that start is left
+        out, so the result may be shorter than the text.
+        """
+        if text_data is None:
+            return (extracted_text or "")[:max_chars]
+
+        codec, dict_id = _HEADER.unpack_from(text_data)
+        payload = memoryview(text_data)[_HEADER.size:]
+        data = None
+        if dict_id:
+            dict_codec, data = self._dictionary(dict_id)
+            if CODECS[dict_codec] != codec:
+                raise TextCodecError(f"Text dictionary {dict_id} is for {dict_codec}")
+
+        if codec == CODECS["zlib"]:
+            decompressor = zlib.decompressobj(zdict=data) if data else zlib.decompressobj()
+            if max_chars is not None:
+                raw = decompressor.decompress(payload, 4 * max_chars)
+            else:
+                raw = decompressor.decompress(payload) + decompressor.flush()
+        elif codec == CODECS["zstd"]:
+            if zstandard is None:
+                raise TextCodecError("Text was compressed with zstd; install the zstandard package")
+            decompressor = self._zstd("decompressor", dict_id, data)
+            if max_chars is not None:
+                # Decodes whole blocks only; a cut-off block gives nothing
+                raw = decompressor.decompressobj().decompress(payload)
+            else:
+                raw = decompressor.decompress(payload)
+        else:
+            raise TextCodecError(f"Unknown text codec {codec}")
+        if max_chars is not None:
+            # Without final=True a character cut in half is dropped
+            return codecs.getincrementaldecoder("utf-8")().decode(raw)[:max_chars]
+        return raw.decode("utf-8")
+
+    # ---------------- MIGRATION ----------------
+    def recompress(self, chunk_size=500, log=print):
+        """Store every OCR text with the current codec and dictionary, one
+        chunk per transaction. Rows already stored that way are skipped,
+        so an interrupted run can simply be started again."""
+        from models import OCRText
+
+        current = (CODECS[self.codec], self._active_dictionary()) if self.codec else None
+        stats = {"rows": 0, "rewritten": 0, "bytes_before": 0, "bytes_after": 0}
+        last = 0
+        while True:
+            rows = db.session.execute(
+                db.select(OCRText.ocr_id, OCRText.extracted_text, OCRText.text_data)
+                .where(OCRText.ocr_id > last)
+                .order_by(OCRText.ocr_id)
+                .limit(chunk_size)
+            ).all()
+            if not rows:
+                break
+
+            updates = []
+            for row in rows:
+                stored = row.text_data[:_HEADER.size] if row.text_data is not None else None
+                if stored is not None and current is not None and _HEADER.unpack(stored) == current:
+                    continue
+                text = self.decode(row.extracted_text, row.text_data)
+                extracted_text, text_data = self.encode(text)
+                if (extracted_text, text_data) == (row.extracted_text, row.text_data):
+                    continue
+                # The text itself is unchanged, so its search index entry stays valid
+                updates.append({"ocr_id": row.ocr_id, "extracted_text": extracted_text, "text_data": text_data})
+                stats["bytes_before"] += _stored_size(row.extracted_text, row.text_data)
+                stats["bytes_after"] += _stored_size(extracted_text, text_data)
+
+            if updates:
+                db.session.execute(db.update(OCRText), updates)
+            db.session.commit()
+
+            stats["rows"] += len(rows)
+            stats["rewritten"] += len(updates)
+            last = rows[-1].ocr_id
+            log(f"🗜️  Checked {stats['rows']} texts, rewrote {stats['rewritten']}")
+        return stats
+
+    def usage(self):
+        """Row counts and stored bytes of plain and compressed texts."""
+        from models import OCRText
+
+        row = db.session.execute(
+            db.select(
+                db.func.count(OCRText.ocr_id),
+                db.func.count(OCRText.text_data),
+                db.func.coalesce(db.func.sum(db.func.length(OCRText.extracted_text)), 0),
+                db.func.coalesce(db.func.sum(db.func.length(OCRText.text_data)), 0)
+            )
+        ).one()
+        return {
+            "codec": self.codec or "none",
+            "dictionary": self._active_dictionary() if self.codec else 0,
+            "rows": row[0],
+            "compressed_rows": row[1],
+            "plain_chars": int(row[2]),
+            "compressed_bytes": int(row[3])
+        }
+
+    # ---------------- CLI ----------------
+    def _init_cli(self, app):
+        @app.cli.group("text")
+        def text_group():
+            """Compression of stored OCR text."""
+
+        @text_group.command("train")
+        @click.option("--samples", type=int, default=lambda: app.config.get("TEXT_DICTIONARY_SAMPLES", 2000),
+                      help="Train on this many of the most recent texts")
+        def train_command(samples):
+            """Build a compression dictionary from stored text."""
+            from models import OCRText
+
+            rows = db.session.execute(
+                db.select(OCRText.extracted_text, OCRText.text_data)
+                .order_by(OCRText.ocr_id.desc())
+                .limit(samples)
+            ).all()
+            try:
+                dictionary = self.train([self.decode(*row) for row in rows])
+            except TextCodecError as e:
+                raise click.ClickException(str(e))
+            db.session.commit()
+            print(f"📖 Dictionary {dictionary.dict_id}: {len(dictionary.data)} bytes from {len(rows)} texts ({self.codec})")
+            print("   Other processes use it after a restart; `flask text recompress` applies it to stored text")
+
+        @text_group.command("recompress")
+        @click.option("--chunk-size", type=int, default=lambda: app.config.get("TEXT_RECOMPRESS_CHUNK_SIZE", 500))
+        def recompress_command(chunk_size):
+            """Rewrite stored text with the current codec and dictionary."""
+            try:
+                stats = self.recompress(chunk_size)
+            except TextCodecError as e:
+                raise click.ClickException(str(e))
+            print(f"✅ Rewrote {stats['rewritten']} of {stats['rows']} texts: "
+                  f"{stats['bytes_before']} -> {stats['bytes_after']} bytes")
+
+        @text_group.command("stats")
+        def stats_command():
+            """Show how much stored text is compressed."""
+            print(json.dumps(self.usage(), indent=2))